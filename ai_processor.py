@@ -1,36 +1,258 @@
-from transformers import pipeline
+import argparse
+import asyncio
+import logging
+import math
+import time
 from collections import Counter
 import re
-from typing import Dict, List
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from db import Repository
+from models import AIInsight
+from stats import epoch_seconds
+from windows import DAY_SECONDS
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SENTIMENT_MODEL = "cardiffnlp/twitter-roberta-base-sentiment-latest"
+
+# Keywords per theme; each matches as a whole word plus common inflections
+THEME_KEYWORDS = {
+    'punctual': ['time', 'punctual', 'late', 'early', 'schedule'],
+    'skilled': ['skill', 'expert', 'professional', 'quality', 'experienced'],
+    'polite': ['polite', 'rude', 'behavior', 'behaviour', 'attitude', 'respectful'],
+    'clean': ['clean', 'mess', 'tidy', 'organized'],
+    'price': ['cheap', 'expensive', 'reasonable', 'cost', 'price', 'pricing', 'money']
+}
+_INFLECTIONS = ['', 's', 'es', 'd', 'ed', 'ing', 'ly', 'ity', 'ness', 'liness', 'ful']
+_WORD = re.compile(r"[a-z]+")
+
+def _compile_themes(keywords: Dict[str, List[str]]) -> Dict[str, str]:
+    """Every accepted word form -> its theme."""
+    words = {}
+    for theme, stems in keywords.items():
+        for stem in stems:
+            for suffix in _INFLECTIONS:
+                words.setdefault(stem + suffix, theme)
+    return words
+
+# Built once per process: one tokenizer pass per text plus a hash lookup per
+# word, so only whole words match ("sometimes" is not "time")
+THEME_WORDS = _compile_themes(THEME_KEYWORDS)
+_THEME_ORDER = {theme: i for i, theme in enumerate(THEME_KEYWORDS)}
+
+def theme_counts(text: str) -> Dict[str, int]:
+    """Keyword hits per theme, in THEME_KEYWORDS order."""
+    counts = {}
+    for theme in map(THEME_WORDS.get, _WORD.findall(text.lower())):
+        if theme:
+            counts[theme] = counts.get(theme, 0) + 1
+    if len(counts) > 1:
+        counts = dict(sorted(counts.items(), key=lambda item: _THEME_ORDER[item[0]]))
+    return counts
+
+def theme_counts_batch(texts: List[str]) -> List[Dict[str, int]]:
+    """theme_counts for many texts in one call."""
+    return [theme_counts(text) for text in texts]
+
+class SentimentModel:
+    """Pluggable sentiment backend: one call scores a whole batch of texts."""
+
+    def predict(self, texts: List[str]) -> List[Dict]:
+        """Return one {'label': positive|neutral|negative, 'score': float} per text."""
+        raise NotImplementedError
+
+class TransformersSentimentModel(SentimentModel):
+    """Hugging Face pipeline, imported and loaded on first use."""
+
+    def __init__(self, model_name: str = DEFAULT_SENTIMENT_MODEL, batch_size: int = 32):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self._pipeline = None
+
+    @property
+    def pipeline(self):
+        if self._pipeline is None:
+            # Heavy import, deferred until a prediction is actually needed
+            from transformers import pipeline
+            self._pipeline = pipeline("sentiment-analysis", model=self.model_name)
+        return self._pipeline
+
+    def predict(self, texts: List[str]) -> List[Dict]:
+        results = self.pipeline(texts, batch_size=self.batch_size, truncation=True)
+        return [{'label': r['label'].lower(), 'score': float(r['score'])} for r in results]
+
+class LexiconSentimentModel(SentimentModel):
+    """Tiny word-list model for tests and benchmarks without transformers."""
+
+    POSITIVE = {'excellent', 'great', 'good', 'amazing', 'best', 'perfect', 'perfectly', 'polite',
+                'skilled', 'professional', 'punctual', 'reasonable', 'recommend', 'thorough', 'reliable'}
+    NEGATIVE = {'bad', 'late', 'rude', 'expensive', 'poor', 'worst', 'mess', 'rushes', 'slow', 'improve'}
+
+    def predict(self, texts: List[str]) -> List[Dict]:
+        predictions = []
+        for text in texts:
+            words = re.findall(r"[a-z]+", text.lower())
+            balance = sum(w in self.POSITIVE for w in words) - sum(w in self.NEGATIVE for w in words)
+            label = 'positive' if balance > 0 else 'negative' if balance < 0 else 'neutral'
+            predictions.append({'label': label, 'score': min(1.0, 0.5 + 0.1 * abs(balance))})
+        return predictions
 
 class AIProcessor:
-    def __init__(self):
-        # Initialize Hugging Face models (these will download on first run)
-        self.sentiment_analyzer = pipeline("sentiment-analysis", 
-                                         model="cardiffnlp/twitter-roberta-base-sentiment-latest")
-        
+    def __init__(self, db: Optional[Repository] = None, model: Optional[SentimentModel] = None,
+                 batch_size: int = 256, half_life_days: float = 30.0):
+        # The model is only loaded when the first batch needs it
+        self.model = model or TransformersSentimentModel()
+        self.worker = InsightsWorker(db, self, batch_size, half_life_days) if db is not None else None
+
+    @property
+    def sentiment_analyzer(self) -> SentimentModel:
+        return self.model
+
     async def update_provider_insights(self, provider_id: str):
-        """Update AI insights for a provider based on their reviews."""
-        # This would fetch reviews and process them
-        # For now, placeholder implementation
-        pass
-    
+        """Update AI insights for a provider based on their pending reviews."""
+        if self.worker is None:
+            raise RuntimeError("AIProcessor needs a repository to update insights")
+        while await self.worker.run_batch(provider_id):
+            pass
+
     def extract_keywords(self, review_text: str) -> List[str]:
         """Extract key themes from review text."""
-        # Simple keyword extraction
-        keywords = {
-            'punctual': ['time', 'punctual', 'late', 'early', 'schedule'],
-            'skilled': ['skill', 'expert', 'professional', 'quality', 'experienced'],
-            'polite': ['polite', 'rude', 'behavior', 'attitude', 'respectful'],
-            'clean': ['clean', 'mess', 'tidy', 'organized'],
-            'price': ['cheap', 'expensive', 'reasonable', 'cost', 'price', 'money']
+        return list(theme_counts(review_text))
+
+    def extract_keywords_batch(self, review_texts: List[str]) -> List[List[str]]:
+        """Themes of many reviews in one call."""
+        return [list(counts) for counts in theme_counts_batch(review_texts)]
+
+class InsightsWorker:
+    """Turns pending reviews into ai_insights rows, many providers per batch.
+
+    Each batch is one model call over reviews from any number of providers,
+    followed by a single bulk upsert of the affected providers' insights.
+    top_praise and top_concerns accumulate sentiment-weighted theme
+    mentions. emerging_mentions weighs each mention by the age of its
+    review, halving every half_life_days, so recent themes stand out.
+    Pending reviews are taken oldest first, and the stored mentions are
+    decayed to the time of the newest review in them (mentions_as_of),
+    so the result depends only on the reviews, not on the batching.
+    """
+
+    def __init__(self, db: Repository, processor: AIProcessor, batch_size: int = 256,
+                 half_life_days: float = 30.0):
+        self.db = db
+        self.processor = processor
+        self.batch_size = batch_size
+        self.half_life_days = half_life_days
+        self._decay_rate = math.log(2) / (half_life_days * DAY_SECONDS)
+        self.reviews_processed = 0
+        self.batches = 0
+        self.busy_seconds = 0.0
+        self.last_batch_seconds = 0.0
+
+    async def run_batch(self, provider_id: Optional[str] = None) -> int:
+        """Process one batch of pending reviews; returns how many were processed."""
+        start = time.perf_counter()
+        reviews = await self.db.pending_insight_reviews(self.batch_size, provider_id)
+        if not reviews:
+            return 0
+
+        # One inference call and one theme scan for the whole batch, off the event loop
+        texts = [r['review_text'] or '' for r in reviews]
+        predictions = await asyncio.to_thread(self.processor.model.predict, texts)
+        themes = self.processor.extract_keywords_batch(texts)
+
+        updates: Dict[str, Dict[str, Counter]] = {}
+        for review, prediction, review_themes in zip(reviews, predictions, themes):
+            entry = updates.setdefault(review['provider_id'], {
+                'praise': Counter(), 'concerns': Counter(), 'mentions': []
+            })
+            at = epoch_seconds(review.get('timestamp'))
+            for theme in review_themes:
+                entry['mentions'].append((theme, at))
+                if prediction['label'] == 'positive':
+                    entry['praise'][theme] += prediction['score']
+                elif prediction['label'] == 'negative':
+                    entry['concerns'][theme] += prediction['score']
+
+        existing = {row['provider_id']: row for row in await self.db.get_insights_many(list(updates))}
+        rows = []
+        for pid, entry in updates.items():
+            old = existing.get(pid, {})
+            mentions, as_of = self._decayed_mentions(old, entry['mentions'])
+            insight = AIInsight(
+                provider_id=pid,
+                top_praise=_merge(old.get('top_praise'), entry['praise']),
+                top_concerns=_merge(old.get('top_concerns'), entry['concerns']),
+                emerging_mentions=mentions,
+                mentions_as_of=datetime.fromtimestamp(as_of, timezone.utc)
+            )
+            rows.append(insight.model_dump(mode='json'))
+
+        await self.db.upsert_insights(rows)
+        await self.db.mark_insights_processed([r['id'] for r in reviews])
+
+        self.last_batch_seconds = time.perf_counter() - start
+        self.busy_seconds += self.last_batch_seconds
+        self.reviews_processed += len(reviews)
+        self.batches += 1
+        return len(reviews)
+
+    def _decayed_mentions(self, old: Dict, mentions: List[Tuple[str, int]]) -> Tuple[Dict[str, float], int]:
+        """Stored mentions plus new (theme, review time) ones, decayed to the newest review time.
+
+        Rows stored before mentions_as_of existed are taken as current.
+        """
+        old_as_of = epoch_seconds(old['mentions_as_of']) if old.get('mentions_as_of') else None
+        as_of = max([at for _, at in mentions] + ([old_as_of] if old_as_of is not None else []))
+        factor = math.exp(-self._decay_rate * (as_of - old_as_of)) if old_as_of is not None else 1.0
+        decayed = Counter({theme: value * factor for theme, value in (old.get('emerging_mentions') or {}).items()})
+        for theme, at in mentions:
+            decayed[theme] += math.exp(-self._decay_rate * (as_of - at))
+        # Rounded finely, so rounding once per batch does not make the result depend on the batching
+        return {theme: round(value, 6) for theme, value in decayed.items()}, as_of
+
+    async def run(self, interval: float = 30.0, once: bool = False):
+        """Drain pending reviews, then poll every interval seconds."""
+        while True:
+            while await self.run_batch():
+                logger.info("Processed batch: %s", self.stats())
+            if once:
+                return
+            await asyncio.sleep(interval)
+
+    def stats(self) -> Dict:
+        return {
+            'reviews_processed': self.reviews_processed,
+            'batches': self.batches,
+            'reviews_per_sec': round(self.reviews_processed / self.busy_seconds, 1) if self.busy_seconds else 0.0,
+            'avg_batch_ms': round(self.busy_seconds / self.batches * 1000, 1) if self.batches else 0.0,
+            'last_batch_ms': round(self.last_batch_seconds * 1000, 1)
         }
-        
-        found_themes = []
-        text_lower = review_text.lower()
-        
-        for theme, words in keywords.items():
-            if any(word in text_lower for word in words):
-                found_themes.append(theme)
-        
-        return found_themes
+
+def _merge(old: Optional[Dict[str, float]], new: Counter) -> Dict[str, float]:
+    merged = dict(old or {})
+    for theme, value in new.items():
+        merged[theme] = merged.get(theme, 0.0) + value
+    return {theme: round(value, 3) for theme, value in merged.items()}
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+
+    from db import create_database
+
+    parser = argparse.ArgumentParser(description="Background worker filling the ai_insights table.")
+    parser.add_argument("--batch-size", type=int, default=256, help="reviews per inference call")
+    parser.add_argument("--interval", type=float, default=30.0, help="seconds between polls when idle")
+    parser.add_argument("--once", action="store_true", help="drain pending reviews and exit")
+    parser.add_argument("--model", default=DEFAULT_SENTIMENT_MODEL)
+    parser.add_argument("--half-life-days", type=float, default=30.0,
+                        help="age at which a mention counts half in emerging_mentions")
+    args = parser.parse_args()
+
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+    processor = AIProcessor(create_database(), TransformersSentimentModel(args.model), args.batch_size,
+                            args.half_life_days)
+    asyncio.run(processor.worker.run(args.interval, once=args.once))
+    print(f"✅ Insights up to date: {processor.worker.stats()}")
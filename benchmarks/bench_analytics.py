@@ -0,0 +1,129 @@
+"""Rating analytics: columnar snapshot vs a Python loop over review dicts.
+
+Loads synthetic reviews into a RatingStore page by page (as the app
+streams them from the reviews table), then times /analytics' computation
+for the whole snapshot, one facet and the last 30 days. The same
+leaderboards and histograms computed by looping over review dicts are
+timed on a sample and checked against the store's answer.
+
+    python -m benchmarks.bench_analytics --reviews 2000000 --providers 20000
+"""
+import argparse
+import random
+import statistics
+import time
+from datetime import datetime, timedelta, timezone
+
+from benchmarks.local_backend import LOCATIONS, SERVICE_TYPES
+from ratings import RatingStore
+from stats import RATING_KEYS, aggregate_reviews, score
+
+NOW = datetime(2025, 6, 1, tzinfo=timezone.utc)
+
+
+def make_providers(count: int, rng: random.Random):
+    return [{
+        'id': f"provider-{n:06d}",
+        'name': f"Provider {n}",
+        'service_type': rng.choice(SERVICE_TYPES),
+        'location': rng.choice(LOCATIONS)
+    } for n in range(count)]
+
+
+def make_reviews(providers, count: int, rng: random.Random, page_size: int = 1000):
+    """Pages of review rows as the reviews table returns them."""
+    # Providers differ in quality so leaderboards are not noise
+    quality = {p['id']: rng.uniform(2.0, 4.8) for p in providers}
+    for start in range(0, count, page_size):
+        page = []
+        for _ in range(min(page_size, count - start)):
+            provider = rng.choice(providers)
+            base = quality[provider['id']]
+            page.append({
+                'provider_id': provider['id'],
+                'ratings': {key: min(5, max(1, round(rng.gauss(base, 0.8)))) for key in RATING_KEYS},
+                'timestamp': (NOW - timedelta(minutes=rng.randint(0, 525600))).isoformat()
+            })
+        yield page
+
+
+def python_analytics(providers, reviews, top: int):
+    """Leaderboards and histograms the way the app aggregated before: one review dict at a time."""
+    by_provider = {}
+    histograms = {key: [0] * 5 for key in RATING_KEYS}
+    for review in reviews:
+        by_provider.setdefault(review['provider_id'], []).append(review)
+        for key, value in review['ratings'].items():
+            histograms[key][value - 1] += 1
+    leaderboards = {}
+    for provider in providers:
+        provider_reviews = by_provider.get(provider['id'])
+        if provider_reviews:
+            leaderboards.setdefault((provider['service_type'], provider['location']), []).append(
+                (-score(aggregate_reviews(provider_reviews)), provider['id'])
+            )
+    return {facet: [pid for _, pid in sorted(rows)[:top]] for facet, rows in leaderboards.items()}, histograms
+
+
+def timed(fn, repeat: int):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+    return result, statistics.median(timings)
+
+
+def run(reviews: int, providers: int, sample: int, top: int, repeat: int, seed: int = 42):
+    rng = random.Random(seed)
+    provider_rows = make_providers(providers, rng)
+
+    store = RatingStore()
+    store.add_providers(provider_rows)
+    sample_reviews = []
+    load_seconds = 0.0
+    for page in make_reviews(provider_rows, reviews, rng):
+        if len(sample_reviews) < sample:
+            sample_reviews.extend(page)
+        start = time.perf_counter()
+        store.add_reviews(page)
+        load_seconds += time.perf_counter() - start
+    store.mark_built()
+
+    since = int((NOW - timedelta(days=30)).timestamp())
+    facet = (SERVICE_TYPES[0], LOCATIONS[0])
+    result, all_seconds = timed(lambda: store.analytics(top=top, max_facets=100), repeat)
+    _, facet_seconds = timed(lambda: store.analytics(*facet, top=top), repeat)
+    _, recent_seconds = timed(lambda: store.analytics(since=since, top=top, max_facets=100), repeat)
+
+    # Same answer from the dict loop on a sample, both computed over the sample only
+    sample_store = RatingStore()
+    sample_store.add_providers(provider_rows)
+    sample_store.add_reviews(sample_reviews)
+    expected, python_seconds = timed(lambda: python_analytics(provider_rows, sample_reviews, top), 1)
+    got = sample_store.analytics(top=top, max_facets=100)
+    leaders, histograms = expected
+    for board in got['leaderboards']:
+        assert [p['id'] for p in board['providers']] == leaders[(board['service_type'], board['location'])]
+    for key in RATING_KEYS:
+        assert [got['dimensions'][key]['histogram'][str(stars)] for stars in range(1, 6)] == histograms[key]
+
+    print(f"{reviews} reviews, {providers} providers, {len(store.facets)} facets, "
+          f"{store.size * (4 + 4 + 8 + 8) / 1e6:.0f} MB of columns")
+    print(f"streaming load:        {reviews / load_seconds:12,.0f} reviews/s")
+    print(f"analytics, all:        {all_seconds * 1000:9.1f} ms ({result['reviews']} reviews)")
+    print(f"analytics, one facet:  {facet_seconds * 1000:9.1f} ms")
+    print(f"analytics, 30 days:    {recent_seconds * 1000:9.1f} ms")
+    print(f"python dict loop:      {python_seconds * 1000:9.1f} ms for {len(sample_reviews)} reviews, "
+          f"~{python_seconds * reviews / len(sample_reviews) * 1000:.0f} ms for all (same answers)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--reviews", type=int, default=2000000)
+    parser.add_argument("--providers", type=int, default=20000)
+    parser.add_argument("--sample", type=int, default=200000, help="reviews for the dict loop baseline")
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    run(args.reviews, args.providers, args.sample, args.top, args.repeat)
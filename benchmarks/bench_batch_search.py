@@ -0,0 +1,63 @@
+"""Several /search_services calls vs one /batch_search call.
+
+    python -m benchmarks.bench_batch_search --latency 0.005 --queries 3 --rounds 20
+"""
+import argparse
+import asyncio
+import os
+import time
+
+os.environ.setdefault("SUPABASE_URL", "http://localhost")
+os.environ.setdefault("SUPABASE_ANON_KEY", "benchmark")
+
+import main  # noqa: E402
+from benchmarks.local_backend import LOCATIONS, SERVICE_TYPES, LocalSupabase, populate  # noqa: E402
+from cache import TTLCache  # noqa: E402
+from db import Database  # noqa: E402
+
+# Measure the database path, not the search results cache
+main.search_cache = TTLCache(ttl=0)
+
+
+async def run(latency: float, queries: int, rounds: int, contacts: int):
+    backend = LocalSupabase(latency=latency)
+    phones = populate(backend, 10, 20)
+    main.db = main.search_db = Database(backend)
+    user_contacts = phones[:contacts]
+    await main.get_contact_index()
+
+    batches = [[main.SearchQuery(service_type=SERVICE_TYPES[(r + i) % len(SERVICE_TYPES)],
+                                 location=LOCATIONS[r % len(LOCATIONS)]) for i in range(queries)]
+               for r in range(rounds)]
+
+    backend.reset_counters()
+    start = time.perf_counter()
+    for batch in batches:
+        for query in batch:
+            await main.search_local_services(main.SearchRequest(
+                service_type=query.service_type, location=query.location, user_contacts=user_contacts
+            ))
+    separate_ms = (time.perf_counter() - start) / rounds * 1000
+    separate_trips = backend.round_trips / rounds
+
+    backend.reset_counters()
+    start = time.perf_counter()
+    for batch in batches:
+        response = await main.batch_search(main.BatchSearchRequest(queries=batch, user_contacts=user_contacts))
+        assert 'error' not in response, response
+    batch_ms = (time.perf_counter() - start) / rounds * 1000
+    batch_trips = backend.round_trips / rounds
+
+    print(f"{queries} queries per call, {contacts} contacts, simulated RTT: {latency * 1000:.1f} ms")
+    print(f"separate searches: {separate_trips:.1f} round trips, {separate_ms:.2f} ms")
+    print(f"batch search:      {batch_trips:.1f} round trips, {batch_ms:.2f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--latency", type=float, default=0.005, help="simulated RTT in seconds")
+    parser.add_argument("--queries", type=int, default=3)
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--contacts", type=int, default=200)
+    args = parser.parse_args()
+    asyncio.run(run(args.latency, args.queries, args.rounds, args.contacts))
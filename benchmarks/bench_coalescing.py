@@ -0,0 +1,94 @@
+"""Bursts of identical requests: DB round trips with and without single-flight.
+
+Simulates a provider link or search shared in a group chat: N identical
+requests arrive at once, each from a different user with their own
+contact list. The search cache is cleared before every burst so each one
+starts cold. Responses with and without coalescing are compared to check
+that contact reviews are still filtered per user.
+
+    python -m benchmarks.bench_coalescing --bursts 1,10,50,100,200 --latency 0.005
+"""
+import argparse
+import asyncio
+import logging
+import os
+import random
+import time
+from typing import Dict, List
+
+os.environ.setdefault("SUPABASE_URL", "http://localhost")
+os.environ.setdefault("SUPABASE_ANON_KEY", "benchmark")
+
+import httpx  # noqa: E402
+
+import main  # noqa: E402
+from benchmarks.local_backend import LocalSupabase, populate  # noqa: E402
+from db import Database  # noqa: E402
+
+
+def requests_for(endpoint: str, provider: Dict, reviewers: List[str], phones: List[str],
+                 count: int, rng: random.Random) -> List[tuple]:
+    """count (method, path, body) of one endpoint, each with a different contact list."""
+    requests = []
+    for n in range(count):
+        contacts = rng.sample(phones, 20) + [reviewers[n % len(reviewers)]]
+        if endpoint == 'provider':
+            requests.append(('POST', f"/provider/{provider['id']}", {'contacts': contacts}))
+        else:
+            requests.append(('POST', '/whatsapp_search', {
+                'service_type': provider['service_type'],
+                'location': provider['location'],
+                'user_contacts': contacts
+            }))
+    return requests
+
+
+async def burst(client: httpx.AsyncClient, backend: LocalSupabase, requests: List[tuple]):
+    """Send all requests at once; (round trips, wall seconds, responses)."""
+    main.search_cache.clear()
+    backend.reset_counters()
+    start = time.perf_counter()
+    responses = await asyncio.gather(*(client.request(method, path, json=body) for method, path, body in requests))
+    return backend.round_trips, time.perf_counter() - start, [response.json() for response in responses]
+
+
+async def run(bursts: List[int], latency: float, seed: int = 42):
+    logging.getLogger("puch.requests").setLevel(logging.ERROR)  # Uncoalesced bursts are slow by design
+    backend = LocalSupabase(latency=latency)
+    phones = populate(backend, 10, 30, seed=seed)
+    main.db = main.search_db = Database(backend)
+    rng = random.Random(seed)
+    provider = rng.choice(backend.tables['providers'])
+    reviewers = sorted({r['reviewer_phone'] for r in backend.tables['reviews'] if r['provider_id'] == provider['id']})
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with main.app.router.lifespan_context(main.app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            # Build the contact and facet indexes outside the measured bursts
+            await client.post('/whatsapp_search', json=requests_for('search', provider, reviewers, phones, 1, rng)[0][2])
+
+            print(f"simulated RTT {latency * 1000:.1f} ms, one provider with {len(reviewers)} reviewers")
+            print(f"{'endpoint':<17}{'burst':>6}{'trips off':>11}{'trips on':>10}{'ms off':>9}{'ms on':>8}{'coalesced':>11}")
+            for endpoint in ['provider', 'whatsapp_search']:
+                for size in bursts:
+                    requests = requests_for(endpoint, provider, reviewers, phones, size, random.Random(size))
+                    results = {}
+                    for enabled in (False, True):
+                        main.search_flights.enabled = main.provider_flights.enabled = enabled
+                        before = main.search_flights.coalesced + main.provider_flights.coalesced
+                        trips, seconds, responses = await burst(client, backend, requests)
+                        coalesced = main.search_flights.coalesced + main.provider_flights.coalesced - before
+                        results[enabled] = (trips, seconds, responses, coalesced)
+                    assert results[False][2] == results[True][2], "coalesced responses differ"
+                    (trips_off, seconds_off, _, _), (trips_on, seconds_on, _, coalesced) = results[False], results[True]
+                    print(f"{endpoint:<17}{size:>6}{trips_off:>11}{trips_on:>10}{seconds_off * 1000:>9.1f}"
+                          f"{seconds_on * 1000:>8.1f}{coalesced:>11}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--bursts", default="1,10,50,100,200", help="comma separated burst sizes")
+    parser.add_argument("--latency", type=float, default=0.005, help="simulated RTT in seconds")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    asyncio.run(run([int(size) for size in args.bursts.split(',')], args.latency, args.seed))
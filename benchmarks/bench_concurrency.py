@@ -0,0 +1,60 @@
+"""Concurrent /search_services requests against the local backend.
+
+With a single worker thread the searches queue up behind each other as
+they did when handlers called the blocking client on the event loop; with
+a pool they overlap and N parallel searches finish in about one search's
+worth of round trips.
+
+    python -m benchmarks.bench_concurrency --latency 0.02 --concurrency 16
+"""
+import argparse
+import asyncio
+import os
+import time
+
+os.environ.setdefault("SUPABASE_URL", "http://localhost")
+os.environ.setdefault("SUPABASE_ANON_KEY", "benchmark")
+
+import main  # noqa: E402
+from benchmarks.local_backend import LOCATIONS, SERVICE_TYPES, LocalSupabase, populate  # noqa: E402
+from cache import TTLCache  # noqa: E402
+from db import Database  # noqa: E402
+
+# Measure the database path, not the search results cache
+main.search_cache = TTLCache(ttl=0)
+
+
+async def parallel_searches(concurrency: int):
+    requests = [
+        main.SearchRequest(service_type=SERVICE_TYPES[i % len(SERVICE_TYPES)],
+                           location=LOCATIONS[i % len(LOCATIONS)])
+        for i in range(concurrency)
+    ]
+    start = time.perf_counter()
+    responses = await asyncio.gather(*(main.search_local_services(r) for r in requests))
+    elapsed = time.perf_counter() - start
+    for response in responses:
+        assert 'error' not in response, response
+    return elapsed
+
+
+def run(latency: float, concurrency: int):
+    backend = LocalSupabase(latency=latency)
+    populate(backend, providers_per_facet=3, reviews_per_provider=10)
+    # One search is two sequential round trips (providers, then reviews)
+    search_rtt = 2 * latency
+
+    print(f"{concurrency} parallel searches, simulated RTT: {latency * 1000:.1f} ms")
+    for workers in (1, concurrency):
+        main.db = main.search_db = Database(backend, max_workers=workers)
+        elapsed = asyncio.run(parallel_searches(concurrency))
+        print(f"pool size {workers:>3}: {elapsed * 1000:8.1f} ms "
+              f"({elapsed / search_rtt:.1f}x a single search)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--latency", type=float, default=0.02, help="simulated RTT in seconds")
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args()
+    run(args.latency, args.concurrency)
@@ -0,0 +1,71 @@
+"""Contact matching: list membership vs the reviewer phone index.
+
+    python -m benchmarks.bench_contacts --contacts 5000 --reviews 10000
+"""
+import argparse
+import base64
+import hashlib
+import random
+import time
+
+from contacts import MIN_DIGEST_BYTES, ContactIndex, hash_phone, normalize_phone
+
+
+def run(contacts: int, reviews: int, providers: int, repeat: int, seed: int = 42):
+    rng = random.Random(seed)
+    reviewer_pool = [f"+91{9000000000 + n}" for n in range(reviews // 2)]
+    provider_ids = [f"provider-{n}" for n in range(providers)]
+    rows = [{'provider_id': rng.choice(provider_ids), 'reviewer_phone': rng.choice(reviewer_pool)}
+            for _ in range(reviews)]
+    # Half the contacts have written reviews; numbers arrive in local format
+    user_contacts = [p[3:] for p in rng.sample(reviewer_pool, contacts // 2)]
+    user_contacts += [f"{8000000000 + n}" for n in range(contacts - len(user_contacts))]
+    hashed = [hash_phone(normalize_phone(c)) for c in user_contacts]
+    # Truncated to MIN_DIGEST_BYTES and base64url encoded: 11 chars instead of 64
+    short = [base64.urlsafe_b64encode(hashlib.sha256(normalize_phone(c).encode()).digest()[:MIN_DIGEST_BYTES])
+             .decode().rstrip('=') for c in user_contacts]
+
+    # Old approach: `reviewer_phone in user_contacts` against a list, per review
+    # (it also misses every match here because the formats differ)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        legacy = {}
+        for row in rows:
+            if row['reviewer_phone'] in user_contacts:
+                legacy.setdefault(row['provider_id'], set()).add(row['reviewer_phone'])
+    legacy_ms = (time.perf_counter() - start) / repeat * 1000
+
+    index = ContactIndex()
+    start = time.perf_counter()
+    index.build(rows)
+    build_ms = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        matches = index.match(index.resolve(user_contacts))
+    index_ms = (time.perf_counter() - start) / repeat * 1000
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        hashed_matches = index.match(index.resolve(hashed_contacts=hashed))
+    hashed_ms = (time.perf_counter() - start) / repeat * 1000
+    assert hashed_matches == matches
+    assert index.match(index.resolve(hashed_contacts=short)) == matches
+
+    print(f"{contacts} contacts x {reviews} reviews ({providers} providers)")
+    print(f"list membership:     {legacy_ms:9.2f} ms/request, {len(legacy)} providers matched")
+    print(f"index build:         {build_ms:9.2f} ms (once)")
+    print(f"index, raw contacts: {index_ms:9.2f} ms/request, {len(matches)} providers matched")
+    print(f"index, hashed:       {hashed_ms:9.2f} ms/request")
+    print(f"body size:           raw {sum(map(len, user_contacts))} chars, hex {sum(map(len, hashed))}, "
+          f"truncated base64 {sum(map(len, short))}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--contacts", type=int, default=5000)
+    parser.add_argument("--reviews", type=int, default=10000)
+    parser.add_argument("--providers", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    run(args.contacts, args.reviews, args.providers, args.repeat)
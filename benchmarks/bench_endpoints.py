@@ -0,0 +1,247 @@
+"""Load test of the API endpoints, in-process against the local backend.
+
+Requests go through the real FastAPI app (routing, validation,
+serialization) via httpx's ASGI transport. A mixed read/write workload
+is sent open-loop at the target rate: each request is scheduled at its
+arrival time and its latency is measured from that moment, so a backed
+up server shows in the tail instead of silently lowering the load.
+
+DB round trips per request are measured per endpoint in a separate
+sequential pass, since the concurrent run cannot attribute them.
+
+    python -m benchmarks.bench_endpoints --rps 200 --duration 10 --latency 0.005 --out results.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import time
+from typing import Dict, List
+
+os.environ.setdefault("SUPABASE_URL", "http://localhost")
+os.environ.setdefault("SUPABASE_ANON_KEY", "benchmark")
+
+import httpx  # noqa: E402
+
+import main  # noqa: E402
+from benchmarks.local_backend import LOCATIONS, SERVICE_TYPES, LocalSupabase, populate  # noqa: E402
+from db import Database  # noqa: E402
+
+# Relative weights of the default workload
+DEFAULT_MIX = {
+    'search_services': 40,
+    'whatsapp_search': 10,
+    'provider': 25,
+    'submit_review': 15,
+    'services': 10
+}
+
+
+class Workload:
+    """Builds random requests for each endpoint from the populated data."""
+
+    def __init__(self, backend: LocalSupabase, phones: List[str], contacts: int, seed: int):
+        self.rng = random.Random(seed)
+        self.provider_ids = [p['id'] for p in backend.tables['providers']]
+        self.phones = phones
+        self.contacts = contacts
+
+    def user_contacts(self) -> List[str]:
+        return self.rng.sample(self.phones, min(self.contacts, len(self.phones)))
+
+    def search_body(self) -> Dict:
+        return {
+            'service_type': self.rng.choice(SERVICE_TYPES),
+            'location': self.rng.choice(LOCATIONS),
+            'user_contacts': self.user_contacts()
+        }
+
+    def request(self, endpoint: str):
+        """(method, path, json body) of one request."""
+        if endpoint == 'search_services':
+            return 'POST', '/search_services', self.search_body()
+        if endpoint == 'whatsapp_search':
+            return 'POST', '/whatsapp_search', self.search_body()
+        if endpoint == 'provider':
+            return 'POST', f"/provider/{self.rng.choice(self.provider_ids)}", {'contacts': self.user_contacts()}
+        if endpoint == 'submit_review':
+            return 'POST', '/submit_review', {
+                'provider_id': self.rng.choice(self.provider_ids),
+                'reviewer_phone': self.rng.choice(self.phones),
+                'punctuality': self.rng.randint(1, 5),
+                'skill_quality': self.rng.randint(1, 5),
+                'politeness': self.rng.randint(1, 5),
+                'pricing': self.rng.randint(1, 5),
+                'review_text': "Came on time, fair price."
+            }
+        if endpoint == 'services':
+            return 'GET', '/services', None
+        raise ValueError(f"Unknown endpoint: {endpoint}")
+
+
+def percentile(values: List[float], p: float) -> float:
+    """Nearest-rank percentile of already sorted values."""
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, max(0, round(p / 100 * len(values)) - 1))]
+
+
+def summarize(latencies: List[float], errors: int, elapsed: float) -> Dict:
+    latencies = sorted(latencies)
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'throughput_rps': round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        'mean_ms': round(sum(latencies) / len(latencies) * 1000, 2) if latencies else 0.0,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+        'max_ms': round(latencies[-1] * 1000, 2) if latencies else 0.0
+    }
+
+
+async def send(client: httpx.AsyncClient, method: str, path: str, body) -> bool:
+    """Send one request; False on an HTTP error or an error body."""
+    response = await client.request(method, path, json=body)
+    if response.status_code >= 400:
+        return False
+    data = response.json()
+    return not (isinstance(data, dict) and 'error' in data)
+
+
+async def measure_round_trips(client: httpx.AsyncClient, backend: LocalSupabase, workload: Workload,
+                              endpoints: List[str], samples: int) -> Dict[str, float]:
+    """Average DB round trips per request of each endpoint, one request at a time."""
+    trips = {}
+    for endpoint in endpoints:
+        backend.reset_counters()
+        for _ in range(samples):
+            await send(client, *workload.request(endpoint))
+        trips[endpoint] = round(backend.round_trips / samples, 2)
+    return trips
+
+
+async def load(client: httpx.AsyncClient, workload: Workload, mix: Dict[str, int],
+               rps: float, duration: float, seed: int):
+    """Open-loop arrivals (Poisson, mean rate rps) for duration seconds."""
+    rng = random.Random(seed)
+    endpoints, weights = list(mix), list(mix.values())
+    latencies: Dict[str, List[float]] = {endpoint: [] for endpoint in endpoints}
+    errors = {endpoint: 0 for endpoint in endpoints}
+
+    async def one(endpoint: str, scheduled: float):
+        try:
+            ok = await send(client, *workload.request(endpoint))
+        except Exception:
+            ok = False
+        latencies[endpoint].append(time.perf_counter() - scheduled)
+        if not ok:
+            errors[endpoint] += 1
+
+    tasks = []
+    start = time.perf_counter()
+    arrival = start
+    while arrival - start < duration:
+        delay = arrival - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        endpoint = rng.choices(endpoints, weights)[0]
+        tasks.append(asyncio.create_task(one(endpoint, arrival)))
+        arrival += rng.expovariate(rps)
+    await asyncio.gather(*tasks)
+    return latencies, errors, time.perf_counter() - start
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+
+async def run(rps: float, duration: float, latency: float, providers_per_facet: int,
+              reviews_per_provider: int, contacts: int, mix: Dict[str, int], seed: int = 42) -> Dict:
+    backend = LocalSupabase(latency=latency)
+    phones = populate(backend, providers_per_facet, reviews_per_provider, seed=seed)
+    main.db = main.search_db = Database(backend)
+    workload = Workload(backend, phones, contacts, seed)
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with main.app.router.lifespan_context(main.app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            # Warm the in-memory indexes so they are not charged to the first requests
+            await send(client, 'GET', '/services', None)
+            await send(client, *workload.request('search_services'))
+
+            round_trips = await measure_round_trips(client, backend, workload, list(mix), samples=20)
+            backend.reset_counters()
+            latencies, errors, elapsed = await load(client, workload, mix, rps, duration, seed)
+
+    total = sum(len(values) for values in latencies.values())
+    return {
+        'commit': git_commit(),
+        'config': {
+            'target_rps': rps,
+            'duration_s': duration,
+            'db_latency_ms': latency * 1000,
+            'providers': len(backend.tables['providers']),
+            'reviews': len(backend.tables['reviews']),
+            'contacts_per_request': contacts,
+            'mix': mix,
+            'seed': seed
+        },
+        'endpoints': {
+            endpoint: {**summarize(latencies[endpoint], errors[endpoint], elapsed),
+                       'db_round_trips_per_request': round_trips[endpoint]}
+            for endpoint in mix
+        },
+        'overall': {
+            **summarize([v for values in latencies.values() for v in values], sum(errors.values()), elapsed),
+            'db_round_trips_per_request': round(backend.round_trips / total, 2) if total else 0.0
+        }
+    }
+
+
+def print_report(results: Dict):
+    config = results['config']
+    print(f"{config['providers']} providers, {config['reviews']} reviews, simulated RTT "
+          f"{config['db_latency_ms']:.1f} ms, target {config['target_rps']} rps for {config['duration_s']} s")
+    print(f"{'endpoint':<18}{'reqs':>7}{'err':>5}{'rps':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'trips':>7}")
+    for name, row in [*results['endpoints'].items(), ('overall', results['overall'])]:
+        print(f"{name:<18}{row['requests']:>7}{row['errors']:>5}{row['throughput_rps']:>8}"
+              f"{row['p50_ms']:>9}{row['p95_ms']:>9}{row['p99_ms']:>9}{row['db_round_trips_per_request']:>7}")
+
+
+def parse_mix(text: str) -> Dict[str, int]:
+    """'search_services=40,provider=25' -> weights."""
+    mix = {}
+    for part in text.split(','):
+        endpoint, _, weight = part.partition('=')
+        mix[endpoint.strip()] = int(weight)
+    return mix
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rps", type=float, default=200, help="target request rate")
+    parser.add_argument("--duration", type=float, default=10, help="seconds of load")
+    parser.add_argument("--latency", type=float, default=0.005, help="simulated RTT in seconds")
+    parser.add_argument("--providers-per-facet", type=int, default=10)
+    parser.add_argument("--reviews-per-provider", type=int, default=20)
+    parser.add_argument("--contacts", type=int, default=50, help="contacts sent per request")
+    parser.add_argument("--mix", type=parse_mix, default=DEFAULT_MIX,
+                        help="endpoint weights, e.g. search_services=40,provider=25,submit_review=15")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", help="write the results as JSON to this file")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args.rps, args.duration, args.latency, args.providers_per_facet,
+                              args.reviews_per_provider, args.contacts, args.mix, args.seed))
+    print_report(results)
+    if args.out:
+        with open(args.out, 'w') as out:
+            json.dump(results, out, indent=2)
+        print(f"Wrote {args.out}")
@@ -0,0 +1,82 @@
+"""Proximity queries: grid index vs a linear scan over every provider.
+
+    python -m benchmarks.bench_geo --providers 100000 --queries 1000 --radius 5
+"""
+import argparse
+import random
+import time
+
+from benchmarks.local_backend import CITY_CENTERS, SERVICE_TYPES
+from geo import GridIndex, haversine_km
+
+
+def percentile(values, p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p / 100 * len(values)))]
+
+
+def run(providers: int, queries: int, radius: float, limit: int, cell: float, seed: int = 42):
+    rng = random.Random(seed)
+    centers = list(CITY_CENTERS.values())
+    rows = []
+    for n in range(providers):
+        lat, lon = rng.choice(centers)
+        rows.append({
+            'id': f"provider-{n}",
+            'service_type': rng.choice(SERVICE_TYPES),
+            'latitude': lat + rng.gauss(0, 0.12),
+            'longitude': lon + rng.gauss(0, 0.12)
+        })
+    points = []
+    for _ in range(queries):
+        lat, lon = rng.choice(centers)
+        points.append((rng.choice(SERVICE_TYPES), lat + rng.gauss(0, 0.1), lon + rng.gauss(0, 0.1)))
+
+    index = GridIndex(cell)
+    start = time.perf_counter()
+    index.build(rows)
+    build_ms = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    for n in range(1000):
+        index.add_provider({**rows[n], 'latitude': rows[n]['latitude'] + 0.01})
+    add_us = (time.perf_counter() - start) / 1000 * 1e6
+    for n in range(1000):
+        index.add_provider(rows[n])
+
+    timings, found = [], 0
+    for service_type, lat, lon in points:
+        start = time.perf_counter()
+        nearest, total = index.nearby(service_type, lat, lon, radius, limit)
+        timings.append(time.perf_counter() - start)
+        found += total
+
+    # Linear scan on a sample of the queries, also checking the index's answers
+    scan_timings = []
+    for service_type, lat, lon in points[:50]:
+        start = time.perf_counter()
+        expected = sorted(
+            (haversine_km(lat, lon, r['latitude'], r['longitude']), r['id']) for r in rows
+            if r['service_type'] == service_type
+        )
+        expected = [(d, pid) for d, pid in expected if d <= radius]
+        scan_timings.append(time.perf_counter() - start)
+        nearest, total = index.nearby(service_type, lat, lon, radius, limit)
+        assert total == len(expected) and [pid for pid, _ in nearest] == [pid for _, pid in expected[:limit]]
+
+    print(f"{providers} providers, radius {radius} km, cell {cell} deg, {found / queries:.0f} matches/query")
+    print(f"index build:    {build_ms:9.1f} ms (once), {add_us:.1f} us per incremental update")
+    print(f"grid index:     p50 {percentile(timings, 50) * 1e6:8.1f} us, p99 {percentile(timings, 99) * 1e6:8.1f} us")
+    print(f"linear scan:    p50 {percentile(scan_timings, 50) * 1e6:8.1f} us, "
+          f"p99 {percentile(scan_timings, 99) * 1e6:8.1f} us")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--providers", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--radius", type=float, default=5.0, help="km")
+    parser.add_argument("--limit", type=int, default=3)
+    parser.add_argument("--cell", type=float, default=0.05, help="grid cell size in degrees")
+    args = parser.parse_args()
+    run(args.providers, args.queries, args.radius, args.limit, args.cell)
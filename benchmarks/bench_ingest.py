@@ -0,0 +1,235 @@
+"""Write-behind review queue: failure paths and flush latency under load.
+
+Runs each check against the in-memory Supabase stand-in and SQLite:
+
+- replay: reviews journaled before a crash are written after a restart
+- torn journal: a partly written last line is set aside and the rest replayed
+- dedupe: replaying an already flushed journal stores no review twice and
+  counts no review twice in the provider's stats
+- reject: a review for an unknown provider is dropped on its own while the
+  rest of its batch is stored, instead of the batch being retried forever
+- backpressure: submit raises ReviewQueueFull once max_pending are waiting
+- stats retry: a failed provider stats update is carried into the next flush
+
+Then submits bursts of reviews for a while against a simulated RTT and
+reports flush latency and queue depth.
+
+    python -m benchmarks.bench_ingest --reviews 20000 --latency 0.005
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import shutil
+import tempfile
+import time
+import uuid
+from typing import Dict
+
+from benchmarks.local_backend import LocalSupabase
+from db import Database, Repository
+from ingest import ReviewIngestQueue, ReviewQueueFull
+from sqlite_db import SQLiteDatabase
+from stats import RATING_KEYS
+
+
+def review_for(provider_id: str, rng: random.Random) -> Dict:
+    return {
+        'provider_id': provider_id,
+        'reviewer_phone': f"+9191{rng.randrange(10 ** 8):08d}",
+        'ratings': {key: rng.randint(1, 5) for key in RATING_KEYS},
+        'review_text': "Queued review"
+    }
+
+
+async def stored_reviews(db: Repository) -> int:
+    return sum([len(page) async for page in db.scan('reviews', 'id')])
+
+
+async def total_reviews(db: Repository, provider_id: str) -> int:
+    return (await db.get_provider(provider_id, 'total_reviews'))['total_reviews']
+
+
+def crash(queue: ReviewIngestQueue):
+    """Stop the flusher and drop the queue without flushing, as a killed process would."""
+    queue._task.cancel()
+    queue._journal.close()
+
+
+async def check_replay_and_dedupe(db: Repository, provider_id: str, tmp: str, rng: random.Random):
+    journal = os.path.join(tmp, 'replay.ndjson')
+    queue = ReviewIngestQueue(db, journal, flush_interval=3600)
+    await queue.start()
+    for _ in range(50):
+        queue.submit(review_for(provider_id, rng))
+    crash(queue)
+    shutil.copy(journal, journal + '.copy')
+
+    restarted = ReviewIngestQueue(db, journal, flush_interval=3600)
+    await restarted.start()
+    assert restarted.depth == 50, restarted.depth
+    await restarted.stop()
+    assert await stored_reviews(db) == 50 and await total_reviews(db, provider_id) == 50, "replay"
+
+    # The same journal again, as after a crash between insert and journal rewrite
+    shutil.copy(journal + '.copy', journal)
+    replayed = ReviewIngestQueue(db, journal, flush_interval=3600)
+    await replayed.start()
+    await replayed.stop()
+    assert await stored_reviews(db) == 50 and await total_reviews(db, provider_id) == 50, "dedupe"
+
+
+async def check_torn_journal(db: Repository, provider_id: str, tmp: str, rng: random.Random):
+    journal = os.path.join(tmp, 'torn.ndjson')
+    with open(journal, 'w') as out:
+        out.write(json.dumps({'id': str(uuid.uuid4()), **review_for(provider_id, rng)}) + '\n')
+        out.write(json.dumps({'id': str(uuid.uuid4()), **review_for(provider_id, rng)})[:40])  # Crash mid-write
+    queue = ReviewIngestQueue(db, journal, flush_interval=3600)
+    await queue.start()
+    assert queue.depth == 1, queue.depth
+    queue.submit(review_for(provider_id, rng))
+    await queue.stop()
+    assert await stored_reviews(db) == 2, "intact and new reviews stored"
+    with open(journal + '.rejected') as rejected:
+        assert len(rejected.readlines()) == 1, "torn line quarantined"
+
+
+async def check_reject(db: Repository, provider_id: str, tmp: str, rng: random.Random):
+    queue = ReviewIngestQueue(db, os.path.join(tmp, 'reject.ndjson'), flush_interval=0.01)
+    await queue.start()
+    before = await stored_reviews(db)
+    queue.submit(review_for(str(uuid.uuid4()), rng))
+    for _ in range(20):
+        queue.submit(review_for(provider_id, rng))
+    for _ in range(200):
+        if not queue.depth:
+            break
+        await asyncio.sleep(0.01)
+    await queue.stop()
+    assert queue.depth == 0 and queue.rejected_reviews == 1, queue.stats()
+    assert await stored_reviews(db) == before + 20, "valid reviews of the batch stored"
+
+
+async def check_backpressure(db: Repository, provider_id: str, tmp: str, rng: random.Random):
+    queue = ReviewIngestQueue(db, os.path.join(tmp, 'full.ndjson'), batch_size=100, flush_interval=3600,
+                              max_pending=10)
+    await queue.start()
+    for _ in range(10):
+        queue.submit(review_for(provider_id, rng))
+    try:
+        queue.submit(review_for(provider_id, rng))
+        raise AssertionError("11th review accepted")
+    except ReviewQueueFull:
+        pass
+    await queue.stop()
+
+
+async def check_stats_retry(db: Repository, provider_id: str, tmp: str, rng: random.Random):
+    before = await total_reviews(db, provider_id)
+    increment = db.increment_provider_stats
+    failures = [RuntimeError("stats update failed")]
+
+    async def flaky_increment(pid, delta):
+        if failures:
+            raise failures.pop()
+        return await increment(pid, delta)
+
+    db.increment_provider_stats = flaky_increment
+    try:
+        queue = ReviewIngestQueue(db, os.path.join(tmp, 'stats.ndjson'), flush_interval=3600)
+        await queue.start()
+        for _ in range(10):
+            queue.submit(review_for(provider_id, rng))
+        await queue.flush()
+        assert queue.stats()['providers_awaiting_stats'] == 1 and await total_reviews(db, provider_id) == before
+        await queue.flush()
+        assert queue.stats()['providers_awaiting_stats'] == 0
+        assert await total_reviews(db, provider_id) == before + 10, "stats carried into the next flush"
+        await queue.stop()
+    finally:
+        del db.increment_provider_stats
+
+
+CHECKS = [
+    ('replay + dedupe', check_replay_and_dedupe),
+    ('torn journal', check_torn_journal),
+    ('reject bad row', check_reject),
+    ('backpressure', check_backpressure),
+    ('stats retry', check_stats_retry),
+]
+
+
+BACKENDS = ['supabase', 'sqlite']
+
+
+def make_db(backend: str, tmp: str, latency: float) -> Repository:
+    if backend == 'sqlite':
+        return SQLiteDatabase(os.path.join(tmp, 'ingest.db'))
+    return Database(LocalSupabase(latency=latency))
+
+
+async def run_checks(seed: int):
+    for name, check in CHECKS:
+        for backend in BACKENDS:
+            with tempfile.TemporaryDirectory() as tmp:
+                db = make_db(backend, tmp, 0.0)
+                provider = await db.insert_provider({'name': 'Queue Test', 'service_type': 'plumber', 'location': 'pune'})
+                await check(db, provider['id'], tmp, random.Random(seed))
+            print(f"{name:<18}{backend:<10}ok")
+
+
+async def run_load(reviews: int, burst: int, interval: float, latency: float, batch_size: int, seed: int):
+    rng = random.Random(seed)
+    print(f"\n{reviews} reviews in bursts of {burst} every {interval * 1000:.0f} ms, batch {batch_size}, "
+          f"simulated RTT {latency * 1000:.1f} ms")
+    print(f"{'backend':<10}{'submit us':>10}{'flushes':>9}{'avg ms':>8}{'max depth':>11}{'drain s':>9}")
+    for backend in BACKENDS:
+        with tempfile.TemporaryDirectory() as tmp:
+            db = make_db(backend, tmp, latency)
+            providers = [(await db.insert_provider({
+                'name': f"Provider {n}", 'service_type': 'plumber', 'location': 'pune'
+            }))['id'] for n in range(50)]
+            queue = ReviewIngestQueue(db, os.path.join(tmp, f"{backend}.ndjson"), batch_size=batch_size,
+                                      flush_interval=0.05, max_pending=reviews)
+            await queue.start()
+            submit_seconds = 0.0
+            max_depth = 0
+            for start in range(0, reviews, burst):
+                began = time.perf_counter()
+                for _ in range(min(burst, reviews - start)):
+                    queue.submit(review_for(rng.choice(providers), rng))
+                submit_seconds += time.perf_counter() - began
+                max_depth = max(max_depth, queue.depth)
+                await asyncio.sleep(interval)
+            drain_start = time.perf_counter()
+            while queue.depth:
+                await asyncio.sleep(0.01)
+            drain = time.perf_counter() - drain_start
+            await queue.stop()
+            stats = queue.stats()
+            counted = 0
+            for provider_id in providers:
+                counted += await total_reviews(db, provider_id)
+            assert stats['flushed_reviews'] == counted == await stored_reviews(db) == reviews, (stats, counted)
+            print(f"{backend:<10}{submit_seconds / reviews * 1e6:>10.1f}{stats['flushes']:>9}"
+                  f"{stats['avg_flush_ms']:>8.1f}{max_depth:>11}{drain:>9.2f}")
+
+
+async def run(reviews: int, burst: int, interval: float, latency: float, batch_size: int, seed: int = 42):
+    logging.getLogger("ingest").setLevel(logging.CRITICAL)  # The checks fail writes on purpose
+    await run_checks(seed)
+    await run_load(reviews, burst, interval, latency, batch_size, seed)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--reviews", type=int, default=20000)
+    parser.add_argument("--burst", type=int, default=200, help="reviews submitted at once")
+    parser.add_argument("--interval", type=float, default=0.01, help="seconds between bursts")
+    parser.add_argument("--latency", type=float, default=0.005, help="simulated RTT in seconds")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    asyncio.run(run(args.reviews, args.burst, args.interval, args.latency, args.batch_size, args.seed))
@@ -0,0 +1,39 @@
+"""Insights worker throughput with the local stub sentiment model.
+
+    python -m benchmarks.bench_insights --batch-size 256 --latency 0.005
+"""
+import argparse
+import asyncio
+import time
+
+from ai_processor import AIProcessor, LexiconSentimentModel
+from benchmarks.local_backend import LocalSupabase, populate
+from db import Database
+
+
+def run(batch_size: int, latency: float, providers_per_facet: int, reviews_per_provider: int):
+    backend = LocalSupabase(latency=latency)
+    populate(backend, providers_per_facet, reviews_per_provider)
+    processor = AIProcessor(Database(backend), LexiconSentimentModel(), batch_size)
+
+    start = time.perf_counter()
+    asyncio.run(processor.worker.run(once=True))
+    elapsed = time.perf_counter() - start
+
+    stats = processor.worker.stats()
+    print(f"{stats['reviews_processed']} reviews in {stats['batches']} batches of {batch_size}, "
+          f"simulated RTT {latency * 1000:.1f} ms")
+    print(f"throughput:    {stats['reviews_processed'] / elapsed:.0f} reviews/sec")
+    print(f"batch latency: {stats['avg_batch_ms']} ms avg")
+    print(f"round trips:   {backend.round_trips} ({backend.round_trips / stats['batches']:.1f} per batch)")
+    print(f"insight rows:  {len(backend.tables['ai_insights'])}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--latency", type=float, default=0.005, help="simulated RTT in seconds")
+    parser.add_argument("--providers-per-facet", type=int, default=4)
+    parser.add_argument("--reviews-per-provider", type=int, default=20)
+    args = parser.parse_args()
+    run(args.batch_size, args.latency, args.providers_per_facet, args.reviews_per_provider)
@@ -0,0 +1,76 @@
+"""Theme extraction: substring scan vs the compiled word-boundary matcher.
+
+Runs on the seed_data review templates and reports both speed and the
+themes whose detection changed.
+
+    python -m benchmarks.bench_keywords --reviews 100000
+"""
+import argparse
+import time
+
+from ai_processor import AIProcessor, LexiconSentimentModel
+from seed_data import REVIEW_TEMPLATES
+
+# Adversarial texts for the old substring test
+EXTRA_TEXTS = [
+    "Sometimes rushes but overall fine.",
+    "Did a costume for my daughter's school play.",
+    "Very timely and the pricing was fair.",
+]
+
+
+LEGACY_KEYWORDS = {
+    'punctual': ['time', 'punctual', 'late', 'early', 'schedule'],
+    'skilled': ['skill', 'expert', 'professional', 'quality', 'experienced'],
+    'polite': ['polite', 'rude', 'behavior', 'attitude', 'respectful'],
+    'clean': ['clean', 'mess', 'tidy', 'organized'],
+    'price': ['cheap', 'expensive', 'reasonable', 'cost', 'price', 'money']
+}
+
+
+def legacy_extract_keywords(review_text: str):
+    """The previous implementation: substring test per keyword."""
+    found_themes = []
+    text_lower = review_text.lower()
+    for theme, words in LEGACY_KEYWORDS.items():
+        if any(word in text_lower for word in words):
+            found_themes.append(theme)
+    return found_themes
+
+
+def run(reviews: int):
+    processor = AIProcessor(model=LexiconSentimentModel())
+    samples = [text for templates in REVIEW_TEMPLATES.values() for text in templates] + EXTRA_TEXTS
+    texts = [samples[i % len(samples)] for i in range(reviews)]
+
+    print("Accuracy changes (old -> new):")
+    for text in samples:
+        old, new = legacy_extract_keywords(text), processor.extract_keywords(text)
+        if old != new:
+            print(f"  {text!r}\n    {old} -> {new}")
+
+    start = time.perf_counter()
+    for text in texts:
+        legacy_extract_keywords(text)
+    legacy = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for text in texts:
+        processor.extract_keywords(text)
+    single = time.perf_counter() - start
+
+    start = time.perf_counter()
+    processor.extract_keywords_batch(texts)
+    batch = time.perf_counter() - start
+
+    print(f"\n{reviews} reviews")
+    print(f"substring scan:      {reviews / legacy:>10.0f} reviews/sec")
+    print(f"compiled, per text:  {reviews / single:>10.0f} reviews/sec ({legacy / single:.1f}x)")
+    print(f"compiled, batch API: {reviews / batch:>10.0f} reviews/sec ({legacy / batch:.1f}x)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--reviews", type=int, default=100000)
+    args = parser.parse_args()
+    run(args.reviews)
@@ -0,0 +1,118 @@
+"""Recent rating aggregates: incremental upkeep vs recomputing from timestamps.
+
+Builds RecentRatings from synthetic reviews spread over the last year,
+then times what the app does per written review (add) and per day
+rollover (expire), against recomputing the 30/90-day windows and the
+decayed average of one provider and of every provider from the raw
+reviews. Every provider's aggregates are checked against the
+recomputation before and after simulated rollovers.
+
+    python -m benchmarks.bench_recent --reviews 500000 --providers 5000 --days 7
+"""
+import argparse
+import math
+import random
+import time
+from datetime import datetime, timezone
+
+from stats import RATING_KEYS, epoch_seconds, review_average
+from windows import DAY_SECONDS, RecentRatings
+
+
+def make_reviews(count: int, providers: int, now: float, rng: random.Random):
+    return [{
+        'provider_id': f"provider-{rng.randrange(providers):06d}",
+        'ratings': {key: rng.randint(1, 5) for key in RATING_KEYS},
+        'timestamp': datetime.fromtimestamp(now - rng.uniform(0, 365 * DAY_SECONDS), timezone.utc).isoformat()
+    } for _ in range(count)]
+
+
+def recompute(reviews, now: float, windows_days, half_life_days: float):
+    """provider -> ({days: (reviews, rating sum)}, (decayed weight, decayed sum)) from every review."""
+    today = int(now // DAY_SECONDS)
+    rate = math.log(2) / (half_life_days * DAY_SECONDS)
+    result = {}
+    for review in reviews:
+        at = epoch_seconds(review['timestamp'])
+        rating = review_average(review['ratings'])
+        windows, decayed = result.setdefault(review['provider_id'], ({days: [0, 0.0] for days in windows_days}, [0.0, 0.0]))
+        age_days = today - int(at // DAY_SECONDS)
+        for days in windows_days:
+            if age_days < days:
+                windows[days][0] += 1
+                windows[days][1] += rating
+        weight = math.exp(-rate * (now - at))
+        decayed[0] += weight
+        decayed[1] += rating * weight
+    return result
+
+
+def check(recent: RecentRatings, expected, now: float):
+    for provider_id, (windows, (weight, rating_sum)) in expected.items():
+        for days, (count, window_sum) in windows.items():
+            got_count, got_sum = recent._totals[days].get(provider_id, (0, 0.0))
+            assert got_count == count and math.isclose(got_sum, window_sum, abs_tol=1e-6), (provider_id, days)
+        got_weight, got_sum = recent.decayed(provider_id, now)
+        assert math.isclose(got_weight, weight, rel_tol=1e-9, abs_tol=1e-12), provider_id
+        assert math.isclose(got_sum, rating_sum, rel_tol=1e-9, abs_tol=1e-12), provider_id
+
+
+def run(reviews: int, providers: int, days: int, seed: int = 42):
+    rng = random.Random(seed)
+    now = time.time()
+    rows = make_reviews(reviews, providers, now, rng)
+
+    recent = RecentRatings()
+    start = time.perf_counter()
+    recent.build(rows)
+    build_seconds = time.perf_counter() - start
+    check(recent, recompute(rows, now, recent.windows_days, recent.half_life_days), now)
+
+    # One review written now: incremental add vs re-reading the provider's reviews
+    new_rows = make_reviews(10000, providers, now, random.Random(seed + 1))
+    for row in new_rows:
+        row['timestamp'] = datetime.fromtimestamp(now, timezone.utc).isoformat()
+    start = time.perf_counter()
+    for row in new_rows:
+        recent.add_review(row)
+    add_seconds = (time.perf_counter() - start) / len(new_rows)
+    rows.extend(new_rows)
+
+    provider_id = new_rows[0]['provider_id']
+    provider_rows = [row for row in rows if row['provider_id'] == provider_id]
+    start = time.perf_counter()
+    recompute(provider_rows, now, recent.windows_days, recent.half_life_days)
+    provider_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    recompute(rows, now, recent.windows_days, recent.half_life_days)
+    full_seconds = time.perf_counter() - start
+
+    # Day rollovers: expire only touches the buckets leaving a window
+    expire_seconds = []
+    for day in range(1, days + 1):
+        later = now + day * DAY_SECONDS
+        start = time.perf_counter()
+        recent.expire(later)
+        expire_seconds.append(time.perf_counter() - start)
+    later = now + days * DAY_SECONDS
+    check(recent, recompute(rows, later, recent.windows_days, recent.half_life_days), later)
+
+    print(f"{len(rows)} reviews over 365 days, {providers} providers, windows {recent.windows_days} days, "
+          f"half-life {recent.half_life_days:g} days")
+    print(f"build:                    {build_seconds * 1000:9.1f} ms ({len(rows) / build_seconds:,.0f} reviews/s)")
+    print(f"add one review:           {add_seconds * 1e6:9.2f} us")
+    print(f"recompute one provider:   {provider_seconds * 1e6:9.2f} us ({len(provider_rows)} reviews, after a scan for them)")
+    print(f"recompute all providers:  {full_seconds * 1000:9.1f} ms")
+    print(f"expire per day rollover:  {max(expire_seconds) * 1000:9.2f} ms max over {days} days "
+          f"({len(recent._buckets)} day buckets kept)")
+    print("windows and decayed averages match the recomputation before and after the rollovers")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--reviews", type=int, default=500000)
+    parser.add_argument("--providers", type=int, default=5000)
+    parser.add_argument("--days", type=int, default=7, help="day rollovers to simulate")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    run(args.reviews, args.providers, args.days, args.seed)
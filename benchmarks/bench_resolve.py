@@ -0,0 +1,116 @@
+"""Resolving misspelled facets: trigram index vs difflib over every value.
+
+Queries are known service types and locations with one random typo
+(dropped, doubled, swapped or replaced letter) and random case and
+surrounding whitespace, the way they arrive from WhatsApp. Other real
+words close to a known value must not be substituted for it.
+
+    python -m benchmarks.bench_resolve --locations 2000 --queries 5000
+"""
+import argparse
+import difflib
+import random
+import string
+import time
+
+from benchmarks.local_backend import LOCATIONS, SERVICE_TYPES
+from facets import FacetIndex
+
+EXTRA_SERVICE_TYPES = ['ac repair', 'pest control', 'mechanic', 'tutor', 'beautician', 'driver',
+                       'cook', 'tailor', 'locksmith', 'mason', 'gardener', 'interior designer']
+SYLLABLES = ['an', 'dh', 'er', 'i', 'ko', 'ra', 'ma', 'nag', 'pur', 'wa', 'di', 'gaon', 'ban', 'ja',
+             'ya', 'la', 'hal', 'li', 'san', 'tha', 'ne', 'vi', 'kal', 'bad', 'ga', 'ro', 'shi', 'ta']
+# Neither a known value nor a typo of one
+UNRELATED_SERVICE_TYPES = ['printer', 'appliance repair', 'plumbing', 'electronics', 'cooking', 'mason work']
+UNRELATED_LOCATIONS = ['navi mumbai', 'new delhi', 'pune camp', 'old hyderabad']
+
+
+def percentile(values, p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p / 100 * len(values)))]
+
+
+def place_names(rng: random.Random, count: int):
+    names = set(LOCATIONS)
+    while len(names) < count:
+        words = [''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))) for _ in range(rng.randint(1, 2))]
+        names.add(' '.join(words))
+    return sorted(names)
+
+
+def misspell(rng: random.Random, value: str) -> str:
+    """value with one typo, random case and stray whitespace."""
+    chars = list(value)
+    i = rng.randrange(len(chars))
+    edit = rng.choice(['drop', 'double', 'swap', 'replace'])
+    if edit == 'drop' and len(chars) > 3:
+        del chars[i]
+    elif edit == 'double':
+        chars.insert(i, chars[i])
+    elif edit == 'swap' and i + 1 < len(chars):
+        chars[i], chars[i + 1] = chars[i + 1], chars[i]
+    else:
+        chars[i] = rng.choice(string.ascii_lowercase)
+    text = ''.join(chars)
+    text = rng.choice([text, text.title(), text.upper()])
+    return rng.choice(['', ' ']) + text + rng.choice(['', ' ', '  '])
+
+
+def run(locations: int, queries: int, seed: int = 42):
+    rng = random.Random(seed)
+    service_types = SERVICE_TYPES + EXTRA_SERVICE_TYPES
+    places = place_names(rng, locations)
+    rows = [{'id': f"provider-{n}", 'service_type': rng.choice(service_types), 'location': place}
+            for n, place in enumerate(places)]
+    rows += [{'id': f"provider-st-{n}", 'service_type': service_type, 'location': places[0]}
+             for n, service_type in enumerate(service_types)]
+
+    index = FacetIndex()
+    start = time.perf_counter()
+    index.build(rows)
+    build_ms = (time.perf_counter() - start) * 1000
+
+    cases = []
+    for _ in range(queries):
+        service_type, location = rng.choice(service_types), rng.choice(places)
+        cases.append((misspell(rng, service_type), misspell(rng, location), service_type, location))
+
+    def normalize(text: str) -> str:
+        return ' '.join(text.lower().split())
+
+    timings, correct = [], 0
+    for service_type, location, expected_service_type, expected_location in cases:
+        start = time.perf_counter()
+        resolved = index.resolve(normalize(service_type), normalize(location))
+        timings.append(time.perf_counter() - start)
+        correct += resolved == (expected_service_type, expected_location)
+
+    substituted = [text for text in UNRELATED_SERVICE_TYPES if index.service_types.best_match(text)]
+    substituted += [text for text in UNRELATED_LOCATIONS if index.locations.best_match(text)]
+
+    # difflib compares against every known value, on a sample of the queries
+    scan_timings, scan_correct = [], 0
+    sample = cases[:min(len(cases), 200)]
+    for service_type, location, expected_service_type, expected_location in sample:
+        start = time.perf_counter()
+        matched_service_type = difflib.get_close_matches(normalize(service_type), service_types, 1, 0.6)
+        matched_location = difflib.get_close_matches(normalize(location), places, 1, 0.6)
+        scan_timings.append(time.perf_counter() - start)
+        scan_correct += (matched_service_type[:1], matched_location[:1]) == ([expected_service_type], [expected_location])
+
+    print(f"{len(service_types)} service types, {len(places)} locations, {queries} misspelled queries")
+    print(f"index build:    {build_ms:9.1f} ms (once)")
+    print(f"trigram index:  p50 {percentile(timings, 50) * 1e6:8.1f} us, p99 {percentile(timings, 99) * 1e6:8.1f} us, "
+          f"{correct / len(cases):.1%} resolved correctly")
+    print(f"difflib scan:   p50 {percentile(scan_timings, 50) * 1e6:8.1f} us, "
+          f"p99 {percentile(scan_timings, 99) * 1e6:8.1f} us, {scan_correct / len(sample):.1%} resolved correctly")
+    print(f"unrelated words substituted: {len(substituted)} of "
+          f"{len(UNRELATED_SERVICE_TYPES) + len(UNRELATED_LOCATIONS)} {substituted or ''}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--locations", type=int, default=2000)
+    parser.add_argument("--queries", type=int, default=5000)
+    args = parser.parse_args()
+    run(args.locations, args.queries)
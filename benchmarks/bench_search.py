@@ -0,0 +1,76 @@
+"""Round trips and latency of /search_services against the local backend.
+
+Compares the old path (every provider of the facet, then one reviews query
+per top provider: 1 + N round trips) with ``main.search_local_services``
+(top k by stored score and the facet count in one query: 1 round trip,
+plus the facet index scan once; no reviews are read, as strengths and
+concerns come from the stored aggregates, and rows read are independent
+of the facet size).
+
+    python -m benchmarks.bench_search --latency 0.005 --searches 50
+"""
+import argparse
+import asyncio
+import os
+import time
+
+os.environ.setdefault("SUPABASE_URL", "http://localhost")
+os.environ.setdefault("SUPABASE_ANON_KEY", "benchmark")
+
+import main  # noqa: E402
+from benchmarks.local_backend import LOCATIONS, SERVICE_TYPES, LocalSupabase, populate  # noqa: E402
+from cache import TTLCache  # noqa: E402
+from db import Database  # noqa: E402
+
+# Measure the database path, not the search results cache
+main.search_cache = TTLCache(ttl=0)
+
+
+def legacy_search(backend, service_type: str, location: str):
+    """The previous search path: one reviews query per top provider."""
+    result = backend.table('providers').select('*').eq('service_type', service_type).eq(
+        'location', location).order('avg_rating', desc=True).execute()
+    for provider in result.data[:3]:
+        backend.table('reviews').select('*').eq('provider_id', provider['id']).execute()
+
+
+def run(latency: float, searches: int, providers_per_facet: int, reviews_per_provider: int):
+    backend = LocalSupabase(latency=latency)
+    populate(backend, providers_per_facet, reviews_per_provider)
+    main.db = main.search_db = Database(backend)
+    queries = [(SERVICE_TYPES[i % len(SERVICE_TYPES)], LOCATIONS[i % len(LOCATIONS)])
+               for i in range(searches)]
+
+    backend.reset_counters()
+    start = time.perf_counter()
+    for service_type, location in queries:
+        legacy_search(backend, service_type, location)
+    legacy_elapsed = time.perf_counter() - start
+    legacy_trips = backend.round_trips
+    legacy_rows = backend.rows_read
+
+    backend.reset_counters()
+    start = time.perf_counter()
+    for service_type, location in queries:
+        request = main.SearchRequest(service_type=service_type, location=location)
+        response = asyncio.run(main.search_local_services(request))
+        assert 'error' not in response, response
+    top_k_elapsed = time.perf_counter() - start
+    top_k_trips = backend.round_trips
+    top_k_rows = backend.rows_read
+
+    print(f"searches: {searches}, {providers_per_facet} providers/facet, simulated RTT: {latency * 1000:.1f} ms")
+    print(f"full facet, per-provider reviews: {legacy_trips / searches:.1f} round trips/search, "
+          f"{legacy_rows / searches:.0f} rows/search, {legacy_elapsed / searches * 1000:.2f} ms/search")
+    print(f"top k by stored score:            {top_k_trips / searches:.1f} round trips/search, "
+          f"{top_k_rows / searches:.0f} rows/search, {top_k_elapsed / searches * 1000:.2f} ms/search")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--latency", type=float, default=0.005, help="simulated RTT in seconds")
+    parser.add_argument("--searches", type=int, default=50)
+    parser.add_argument("--providers-per-facet", type=int, default=10)
+    parser.add_argument("--reviews-per-provider", type=int, default=20)
+    args = parser.parse_args()
+    run(args.latency, args.searches, args.providers_per_facet, args.reviews_per_provider)
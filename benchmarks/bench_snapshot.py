@@ -0,0 +1,90 @@
+"""Bulk export/import: throughput and peak memory at growing table sizes.
+
+Exports the reviews table of a SQLite database filled with the benchmark
+data as NDJSON (plain and gzip) to a temporary file, then imports it into
+a fresh SQLite database.
+Peak Python memory of the streaming export is compared with reading the
+whole table into a list first, as a single ``select('*')`` would. The
+streaming peak stays at about one page as the table grows, while the
+full read grows with the table. The imported database is checked against
+the source.
+
+    python -m benchmarks.bench_snapshot --reviews-per-provider 10,40,160
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+from typing import List
+
+from benchmarks.local_backend import LocalSupabase, populate
+from db import Database
+from snapshot import export_file, import_file
+from sqlite_db import SQLiteDatabase, sync_replica
+
+
+async def full_read(db, path: str):
+    """The whole table in memory, then written out."""
+    rows = []
+    async for page in db.scan('reviews', '*'):
+        rows.extend(page)
+    with open(path, 'w') as out:
+        for row in rows:
+            out.write(json.dumps(row, default=str) + '\n')
+
+
+async def peak_mb(coroutine) -> float:
+    tracemalloc.reset_peak()
+    baseline = tracemalloc.get_traced_memory()[0]
+    await coroutine
+    return (tracemalloc.get_traced_memory()[1] - baseline) / 1e6
+
+
+async def run(sizes: List[int], providers_per_facet: int, page_size: int, batch_size: int):
+    print(f"{'reviews':>9}{'export r/s':>12}{'gzip r/s':>11}{'import r/s':>12}"
+          f"{'stream MB':>11}{'full MB':>9}{'gzip size':>11}")
+    tracemalloc.start()
+    for reviews_per_provider in sizes:
+        backend = LocalSupabase(latency=0)
+        populate(backend, providers_per_facet, reviews_per_provider)
+        with tempfile.TemporaryDirectory() as tmp:
+            # The in-memory backend filters the whole table per page; SQLite seeks on its id index
+            source = SQLiteDatabase(os.path.join(tmp, 'source.db'))
+            await sync_replica(Database(backend), source)
+            plain, packed = os.path.join(tmp, 'reviews.ndjson'), os.path.join(tmp, 'reviews.ndjson.gz')
+            stream_mb = await peak_mb(export_file(source, 'reviews', plain, page_size, False))
+            full_mb = await peak_mb(full_read(source, os.path.join(tmp, 'full.ndjson')))
+
+            tracemalloc.stop()  # Tracing would slow down the timed runs
+            exported = await export_file(source, 'reviews', plain, page_size, False)
+            packed_stats = await export_file(source, 'reviews', packed, page_size, True)
+            target = SQLiteDatabase(os.path.join(tmp, 'target.db'))
+            providers = os.path.join(tmp, 'providers.ndjson')
+            await export_file(source, 'providers', providers, page_size, False)
+            await import_file(target, 'providers', providers, batch_size)
+            imported = await import_file(target, 'reviews', packed, batch_size)
+            tracemalloc.start()
+
+            count = sum([len(page) async for page in target.scan('reviews', 'id')])
+            assert count == exported['rows'] == imported['rows'] == len(backend.tables['reviews'])
+            assert not imported['rejected'] and not imported['duplicates']
+            size_mb = os.path.getsize(packed) / 1e6
+        print(f"{exported['rows']:>9}{exported['rows_per_sec']:>12,}{packed_stats['rows_per_sec']:>11,}"
+              f"{imported['rows_per_sec']:>12,}{stream_mb:>11.1f}{full_mb:>9.1f}{size_mb:>9.1f}MB")
+    tracemalloc.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--reviews-per-provider", default="10,40,160", help="comma separated table sizes")
+    parser.add_argument("--providers-per-facet", type=int, default=20)
+    parser.add_argument("--page-size", type=int, default=1000)
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+    start = time.perf_counter()
+    asyncio.run(run([int(n) for n in args.reviews_per_provider.split(',')],
+                    args.providers_per_facet, args.page_size, args.batch_size))
+    print(f"total {time.perf_counter() - start:.1f} s")
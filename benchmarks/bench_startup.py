@@ -0,0 +1,110 @@
+"""Cold start: import time of the app and time until it answers.
+
+Every run starts a fresh interpreter. Import time is measured around
+``import main``. Time to first response spawns uvicorn and polls / (liveness)
+and /ready (readiness) from the moment the process is started, against a
+SQLite database filled with the benchmark data.
+
+    python -m benchmarks.bench_startup --runs 5 --warmup
+"""
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.local_backend import LocalSupabase, populate
+from db import Database
+from sqlite_db import SQLiteDatabase, sync_replica
+
+IMPORT_SNIPPET = "import time; start = time.perf_counter(); import main; print(time.perf_counter() - start)"
+
+
+def build_database(path: str, providers_per_facet: int, reviews_per_provider: int):
+    backend = LocalSupabase(latency=0)
+    populate(backend, providers_per_facet, reviews_per_provider)
+    asyncio.run(sync_replica(Database(backend), SQLiteDatabase(path)))
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def import_seconds(env) -> float:
+    output = subprocess.run([sys.executable, '-c', IMPORT_SNIPPET], env=env, capture_output=True,
+                            text=True, check=True).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def response_seconds(env, timeout: float = 60.0):
+    """Seconds from spawning the server until / and until /ready answer 200."""
+    port = free_port()
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'main:app', '--port', str(port), '--log-level', 'warning'],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    live = ready = None
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=1.0) as client:
+            while ready is None and time.perf_counter() - start < timeout:
+                try:
+                    if live is None and client.get('/').status_code == 200:
+                        live = time.perf_counter() - start
+                    if live is not None and client.get('/ready').status_code == 200:
+                        ready = time.perf_counter() - start
+                except httpx.TransportError:
+                    pass
+                if ready is None:
+                    time.sleep(0.005)
+    finally:
+        server.terminate()
+        server.wait()
+    return live, ready
+
+
+def run(runs: int, warmup: bool, providers_per_facet: int, reviews_per_provider: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.db')
+        build_database(path, providers_per_facet, reviews_per_provider)
+        env = {
+            **os.environ,
+            'DB_BACKEND': 'sqlite',
+            'SQLITE_PATH': path,
+            'WARMUP': '1' if warmup else '0',
+            'SUPABASE_URL': 'http://localhost',
+            'SUPABASE_ANON_KEY': 'benchmark',
+            'PYTHONPATH': os.getcwd()
+        }
+        imports = [import_seconds(env) for _ in range(runs)]
+        responses = [response_seconds(env) for _ in range(runs)]
+
+    live = [r[0] for r in responses if r[0] is not None]
+    ready = [r[1] for r in responses if r[1] is not None]
+    print(f"{runs} cold starts, warm-up {'on' if warmup else 'off'}, "
+          f"{providers_per_facet} providers/facet, {reviews_per_provider} reviews/provider")
+    print(f"import main:           median {statistics.median(imports) * 1000:7.1f} ms, max {max(imports) * 1000:7.1f} ms")
+    if live:
+        print(f"first response (/):    median {statistics.median(live) * 1000:7.1f} ms, max {max(live) * 1000:7.1f} ms")
+    if ready:
+        print(f"ready (/ready):        median {statistics.median(ready) * 1000:7.1f} ms, max {max(ready) * 1000:7.1f} ms")
+    if len(ready) < runs:
+        print(f"{runs - len(ready)} runs did not get ready in time")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--warmup", action="store_true", help="start with WARMUP=1")
+    parser.add_argument("--providers-per-facet", type=int, default=40)
+    parser.add_argument("--reviews-per-provider", type=int, default=20)
+    args = parser.parse_args()
+    run(args.runs, args.warmup, args.providers_per_facet, args.reviews_per_provider)
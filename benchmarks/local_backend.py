@@ -0,0 +1,369 @@
+"""In-memory stand-in for the supabase client used by the benchmarks.
+
+Implements the subset of the postgrest query builder the app uses, counts
+every ``execute()`` as one database round trip and can sleep for a
+configurable simulated RTT so latency effects show up in the numbers.
+"""
+import random
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+from stats import AGGREGATE_COLUMNS, aggregate_reviews, avg_rating, provider_stats, score
+
+
+_OPERATORS = {
+    'eq': lambda a, b: a == b,
+    'neq': lambda a, b: a != b,
+    'gt': lambda a, b: a > b,
+    'gte': lambda a, b: a >= b,
+    'lt': lambda a, b: a < b,
+    'lte': lambda a, b: a <= b,
+}
+
+
+def _split_conditions(text: str) -> List[str]:
+    """Split a postgrest logic expression on top-level commas."""
+    parts, depth, quoted, current = [], 0, False, ''
+    for char in text:
+        if char == '"':
+            quoted = not quoted
+        elif not quoted and char == '(':
+            depth += 1
+        elif not quoted and char == ')':
+            depth -= 1
+        elif not quoted and char == ',' and depth == 0:
+            parts.append(current)
+            current = ''
+            continue
+        current += char
+    parts.append(current)
+    return parts
+
+
+def _parse_logic(operator: str, text: str) -> Callable[[Dict], bool]:
+    """Compile an ``or=(...)``/``and(...)`` postgrest filter to a row predicate."""
+    predicates = []
+    for condition in _split_conditions(text):
+        if condition.startswith(('and(', 'or(')):
+            name, inner = condition.split('(', 1)
+            predicates.append(_parse_logic(name, inner[:-1]))
+            continue
+        column, op, value = condition.split('.', 2)
+        value = value.strip('"')
+        predicates.append(
+            lambda row, c=column, o=_OPERATORS[op], v=value: row.get(c) is not None and o(str(row[c]), v)
+        )
+    combine = any if operator == 'or' else all
+    return lambda row: combine(p(row) for p in predicates)
+
+
+class _Response:
+    def __init__(self, data: List[Dict], count: Optional[int] = None):
+        self.data = data
+        self.count = count
+
+
+class _Query:
+    def __init__(self, backend: "LocalSupabase", table: str):
+        self.backend = backend
+        self.table = table
+        self.action = 'select'
+        self.columns: Optional[List[str]] = None
+        self.count: Optional[str] = None
+        self.filters: List[Callable[[Dict], bool]] = []
+        self.ordering: List[tuple] = []
+        self.row_limit: Optional[int] = None
+        self.row_offset = 0
+        self.payload: Any = None
+
+    # Query shape
+    def select(self, *columns: str, count: Optional[str] = None, head: Optional[bool] = None):
+        names = [c.strip() for column in columns for c in column.split(',') if c.strip()]
+        self.columns = None if not names or names == ['*'] else names
+        self.count = count
+        return self
+
+    def insert(self, json, **kwargs):
+        self.action = 'insert'
+        self.payload = json
+        return self
+
+    def upsert(self, json, on_conflict: str = '', ignore_duplicates: bool = False, **kwargs):
+        self.action = 'upsert'
+        self.payload = (json, on_conflict or 'id', ignore_duplicates)
+        return self
+
+    def update(self, json, **kwargs):
+        self.action = 'update'
+        self.payload = json
+        return self
+
+    def delete(self, **kwargs):
+        self.action = 'delete'
+        return self
+
+    # Filters
+    def eq(self, column: str, value):
+        self.filters.append(lambda row: row.get(column) == value)
+        return self
+
+    def neq(self, column: str, value):
+        self.filters.append(lambda row: row.get(column) != value)
+        return self
+
+    def in_(self, column: str, values):
+        values = set(values)
+        self.filters.append(lambda row: row.get(column) in values)
+        return self
+
+    def gt(self, column: str, value):
+        self.filters.append(lambda row: row.get(column) is not None and row[column] > value)
+        return self
+
+    def gte(self, column: str, value):
+        self.filters.append(lambda row: row.get(column) is not None and row[column] >= value)
+        return self
+
+    def lt(self, column: str, value):
+        self.filters.append(lambda row: row.get(column) is not None and row[column] < value)
+        return self
+
+    def lte(self, column: str, value):
+        self.filters.append(lambda row: row.get(column) is not None and row[column] <= value)
+        return self
+
+    def or_(self, filters: str, **kwargs):
+        self.filters.append(_parse_logic('or', filters))
+        return self
+
+    def order(self, column: str, *, desc: bool = False, **kwargs):
+        self.ordering.append((column, desc))
+        return self
+
+    def limit(self, size: int, **kwargs):
+        self.row_limit = size
+        return self
+
+    def range(self, start: int, end: int, **kwargs):
+        self.row_offset = start
+        self.row_limit = end - start + 1
+        return self
+
+    def execute(self) -> _Response:
+        return self.backend._execute(self)
+
+
+class _Rpc:
+    def __init__(self, backend: "LocalSupabase", name: str, params: Dict):
+        self.backend = backend
+        self.name = name
+        self.params = params
+
+    def execute(self) -> _Response:
+        return self.backend._execute_rpc(self)
+
+
+class LocalSupabase:
+    """Thread-safe in-memory tables behind a supabase-like API."""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.tables: Dict[str, List[Dict]] = {'providers': [], 'reviews': []}
+        self.round_trips = 0
+        self.rows_read = 0
+        self._lock = threading.Lock()
+
+    def table(self, name: str) -> _Query:
+        return _Query(self, name)
+
+    def rpc(self, name: str, params: Dict) -> _Rpc:
+        return _Rpc(self, name, params)
+
+    def reset_counters(self):
+        with self._lock:
+            self.round_trips = 0
+            self.rows_read = 0
+
+    def _execute(self, query: _Query) -> _Response:
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.round_trips += 1
+            rows = self.tables.setdefault(query.table, [])
+            if query.action in ('insert', 'upsert') and query.table == 'reviews':
+                self._check_providers(query.payload if query.action == 'insert' else query.payload[0])
+            if query.action == 'insert':
+                return _Response(self._insert(rows, query.table, query.payload))
+            if query.action == 'upsert':
+                return _Response(self._upsert(rows, query.table, *query.payload))
+
+            matched = [row for row in rows if all(f(row) for f in query.filters)]
+            if query.action == 'update':
+                for row in matched:
+                    row.update(query.payload)
+                    self._touch(query.table, row)
+                return _Response([dict(row) for row in matched])
+            if query.action == 'delete':
+                self.tables[query.table] = [row for row in rows if row not in matched]
+                return _Response([dict(row) for row in matched])
+
+            for column, desc in reversed(query.ordering):
+                matched.sort(key=lambda row: (row.get(column) is None, row.get(column)), reverse=desc)
+            total = len(matched)
+            end = None if query.row_limit is None else query.row_offset + query.row_limit
+            matched = matched[query.row_offset:end]
+            if query.columns:
+                matched = [{c: row.get(c) for c in query.columns} for row in matched]
+            else:
+                matched = [dict(row) for row in matched]
+            self.rows_read += len(matched)
+            return _Response(matched, total if query.count else None)
+
+    def _execute_rpc(self, call: _Rpc) -> _Response:
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.round_trips += 1
+            return _Response(getattr(self, f"_rpc_{call.name}")(**call.params))
+
+    def _rpc_increment_provider_stats(self, p_provider_id: str, **deltas) -> List[Dict]:
+        updated = []
+        for row in self.tables['providers']:
+            if row['id'] == p_provider_id:
+                for column in AGGREGATE_COLUMNS:
+                    row[column] = row.get(column, 0) + deltas[f"p_{column}"]
+                row['avg_rating'] = avg_rating(row)
+                row['score'] = score(row)
+                self._touch('providers', row)
+                updated.append(dict(row))
+        return updated
+
+    def _rpc_top_providers(self, p_service_types: List[str], p_locations: List[str],
+                           p_limit: int) -> List[Dict]:
+        facets = {}
+        for row in self.tables['providers']:
+            facets.setdefault((row['service_type'], row['location']), []).append(row)
+        top = []
+        for facet in dict.fromkeys(zip(p_service_types, p_locations)):
+            rows = sorted(facets.get(facet, []), key=lambda row: (-row['score'], row['id']))
+            top.extend({**row, 'facet_total': len(rows)} for row in rows[:p_limit])
+        self.rows_read += len(top)
+        return top
+
+    def _check_providers(self, payload):
+        """Reject the whole statement, as Postgres' foreign key would, if a review's provider is unknown."""
+        known = {row['id'] for row in self.tables['providers']}
+        for data in (payload if isinstance(payload, list) else [payload]):
+            if data.get('provider_id') not in known:
+                from postgrest.exceptions import APIError
+                raise APIError({
+                    'code': '23503',
+                    'message': 'insert or update on table "reviews" violates foreign key constraint',
+                    'details': f"Key (provider_id)=({data.get('provider_id')}) is not present in table \"providers\"."
+                })
+
+    def _insert(self, rows: List[Dict], table: str, payload) -> List[Dict]:
+        new_rows = payload if isinstance(payload, list) else [payload]
+        inserted = []
+        for data in new_rows:
+            row = self._with_defaults(table, dict(data))
+            rows.append(row)
+            inserted.append(dict(row))
+        return inserted
+
+    def _upsert(self, rows: List[Dict], table: str, payload, on_conflict: str,
+                ignore_duplicates: bool) -> List[Dict]:
+        index = {row.get(on_conflict): row for row in rows}
+        upserted = []
+        for data in (payload if isinstance(payload, list) else [payload]):
+            existing = index.get(data.get(on_conflict))
+            if existing is not None:
+                if not ignore_duplicates:
+                    existing.update(data)
+                    self._touch(table, existing)
+                    upserted.append(dict(existing))
+            else:
+                row = self._with_defaults(table, dict(data))
+                rows.append(row)
+                index[row.get(on_conflict)] = row
+                upserted.append(dict(row))
+        return upserted
+
+    def _with_defaults(self, table: str, row: Dict) -> Dict:
+        row.setdefault('id', str(uuid.uuid4()))
+        if table == 'reviews':
+            row.setdefault('timestamp', datetime.now(timezone.utc).isoformat())
+            row.setdefault('insights_processed', False)
+        if table == 'providers':
+            row.setdefault('avg_rating', 0.0)
+            for column in AGGREGATE_COLUMNS:
+                row.setdefault(column, 0)
+            row.setdefault('score', score(row))
+            row.setdefault('updated_at', datetime.now(timezone.utc).isoformat())
+        return row
+
+    def _touch(self, table: str, row: Dict):
+        """Stamp an updated provider, as migration 008's trigger does."""
+        if table == 'providers':
+            row['updated_at'] = datetime.now(timezone.utc).isoformat()
+
+
+SERVICE_TYPES = ['electrician', 'plumber', 'cleaning', 'carpenter', 'painter']
+LOCATIONS = ['mumbai', 'delhi', 'bangalore', 'pune', 'hyderabad']
+CITY_CENTERS = {
+    'mumbai': (19.076, 72.8777),
+    'delhi': (28.6139, 77.209),
+    'bangalore': (12.9716, 77.5946),
+    'pune': (18.5204, 73.8567),
+    'hyderabad': (17.385, 78.4867)
+}
+
+
+def populate(backend: LocalSupabase, providers_per_facet: int = 10,
+             reviews_per_provider: int = 20, reviewers: int = 1000, seed: int = 42):
+    """Fill the backend with deterministic providers and reviews."""
+    rng = random.Random(seed)
+    # Separate stream so adding coordinates left the other generated values unchanged
+    geo_rng = random.Random(seed + 1)
+    phones = [f"+9191{n:08d}" for n in range(reviewers)]
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    providers = backend.tables['providers']
+    reviews = backend.tables['reviews']
+    for service_type in SERVICE_TYPES:
+        for location in LOCATIONS:
+            for n in range(providers_per_facet):
+                provider_id = str(uuid.UUID(int=rng.getrandbits(128)))
+                provider_reviews = []
+                for _ in range(reviews_per_provider):
+                    ratings = {
+                        'punctuality': rng.randint(1, 5),
+                        'skill_quality': rng.randint(1, 5),
+                        'politeness': rng.randint(1, 5),
+                        'pricing': rng.randint(1, 5)
+                    }
+                    provider_reviews.append({
+                        'id': str(uuid.UUID(int=rng.getrandbits(128))),
+                        'provider_id': provider_id,
+                        'reviewer_phone': rng.choice(phones),
+                        'ratings': ratings,
+                        'review_text': "Good work, came on time.",
+                        'timestamp': (start + timedelta(minutes=rng.randint(0, 500000))).isoformat(),
+                        'insights_processed': False
+                    })
+                providers.append({
+                    'id': provider_id,
+                    'name': f"{service_type.title()} {location.title()} {n}",
+                    'service_type': service_type,
+                    'location': location,
+                    'phone_number': f"+9198{rng.randint(0, 99999999):08d}",
+                    # Scattered up to ~20 km around the city centre
+                    'latitude': CITY_CENTERS[location][0] + geo_rng.uniform(-0.18, 0.18),
+                    'longitude': CITY_CENTERS[location][1] + geo_rng.uniform(-0.18, 0.18),
+                    **provider_stats(aggregate_reviews(provider_reviews)),
+                    'updated_at': start.isoformat()
+                })
+                reviews.extend(provider_reviews)
+    return phones
@@ -0,0 +1,218 @@
+"""In-process read-through cache with TTL and LRU eviction, request coalescing and batching."""
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, List
+
+_MISSING = object()
+
+
+class TTLCache:
+    """LRU cache whose entries expire after ``ttl`` seconds.
+
+    With ``stale_ttl`` set, an expired entry is still served for that many
+    extra seconds while a single background task reloads it
+    (stale-while-revalidate).
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60.0, stale_ttl: float = 0.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._refreshing = set()
+        # Bumped on every invalidation so loads started before it are not stored
+        self._generation = 0
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def set(self, key: Hashable, value: Any):
+        self._entries[key] = (value, time.monotonic() + self.ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key: Hashable):
+        self._generation += 1
+        self._entries.pop(key, None)
+
+    def clear(self):
+        self._generation += 1
+        self._entries.clear()
+
+    async def get_or_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """Return the cached value for key, calling loader on a miss."""
+        value = self._lookup(key, loader)
+        if value is not _MISSING:
+            return value
+        self.misses += 1
+        return await self._load(key, loader)
+
+    async def get_or_load_many(self, keys: Iterable[Hashable],
+                               loader: Callable[[List[Hashable]], Awaitable[Dict[Hashable, Any]]]) -> Dict[Hashable, Any]:
+        """Cached values for many keys; all misses are loaded by a single loader(missing) call."""
+        values = {}
+        missing = []
+        for key in dict.fromkeys(keys):
+            value = self._lookup(key, self._single(loader, key))
+            if value is _MISSING:
+                missing.append(key)
+            else:
+                values[key] = value
+        if missing:
+            self.misses += len(missing)
+            generation = self._generation
+            loaded = await loader(missing)
+            if generation == self._generation:
+                for key in missing:
+                    self.set(key, loaded[key])
+            values.update(loaded)
+        return values
+
+    @staticmethod
+    def _single(loader: Callable[[List[Hashable]], Awaitable[Dict[Hashable, Any]]], key: Hashable):
+        async def load_one():
+            return (await loader([key]))[key]
+        return load_one
+
+    def _lookup(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """Fresh or still servable stale value of key, or _MISSING."""
+        entry = self._entries.get(key)
+        if entry is not None:
+            value, expires = entry
+            now = time.monotonic()
+            if now < expires:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return value
+            if now < expires + self.stale_ttl:
+                self.stale_hits += 1
+                self._entries.move_to_end(key)
+                if key not in self._refreshing:
+                    self._refreshing.add(key)
+                    asyncio.get_running_loop().create_task(self._refresh(key, loader))
+                return value
+            del self._entries[key]
+        return _MISSING
+
+    async def _load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        generation = self._generation
+        value = await loader()
+        if generation == self._generation:
+            self.set(key, value)
+        return value
+
+    async def _refresh(self, key: Hashable, loader: Callable[[], Awaitable[Any]]):
+        try:
+            await self._load(key, loader)
+        except Exception:
+            # Keep serving the stale entry until it runs out
+            pass
+        finally:
+            self._refreshing.discard(key)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'size': len(self._entries),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'stale_hits': self.stale_hits,
+            'misses': self.misses,
+            'evictions': self.evictions
+        }
+
+
+class SingleFlight:
+    """Concurrent calls for the same key share one in-flight execution.
+
+    The first caller for a key starts the call; callers arriving before it
+    finishes await the same result instead of repeating it. Nothing is kept
+    once the call finishes, so unlike a cache it never serves an old value.
+    The call runs as its own task, so a caller that goes away does not
+    cancel it for the others.
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self.executed = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Result of fn(), or of the call already in flight for key."""
+        if not self.enabled:
+            self.executed += 1
+            return await fn()
+        task = self._inflight.get(key)
+        if task is None:
+            self.executed += 1
+            task = self._inflight[key] = asyncio.get_running_loop().create_task(fn())
+            task.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def _forget(self, key: Hashable, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'in_flight': len(self._inflight),
+            'executed': self.executed,
+            'coalesced': self.coalesced
+        }
+
+
+class Batcher:
+    """Concurrent loads made in the same event-loop turn share one batched call.
+
+    Each caller adds one item and awaits its own result. The first item of
+    a turn schedules ``fn(items)``, which must return one result per item
+    in order, for once the callers of that turn have added theirs. Like
+    SingleFlight, the batched call runs as its own task.
+    """
+
+    def __init__(self, fn: Callable[[List[Any]], Awaitable[List[Any]]], enabled: bool = True):
+        self.fn = fn
+        self.enabled = enabled
+        self._pending: List[tuple] = []
+        self.batches = 0
+        self.items = 0
+
+    async def load(self, item: Any) -> Any:
+        """Result of fn for item, batched with the other items of this turn."""
+        self.items += 1
+        if not self.enabled:
+            self.batches += 1
+            return (await self.fn([item]))[0]
+        loop = asyncio.get_running_loop()
+        if not self._pending:
+            loop.create_task(self._dispatch())
+        future = loop.create_future()
+        self._pending.append((item, future))
+        return await asyncio.shield(future)
+
+    async def _dispatch(self):
+        await asyncio.sleep(0)  # Let the callers woken in this turn add their items
+        batch, self._pending = self._pending, []
+        self.batches += 1
+        try:
+            results = await self.fn([item for item, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    def stats(self) -> Dict[str, int]:
+        return {'batches': self.batches, 'items': self.items}
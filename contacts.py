@@ -0,0 +1,143 @@
+"""Reviewer phone index used to find reviews from a user's contacts.
+
+Clients may send SHA-256 digests of E.164 numbers instead of the numbers
+themselves, so a user's address book is not sent or logged in the clear.
+Phone numbers are few enough to brute-force, so this hides numbers from
+casual view rather than anonymizing them. The digests are for privacy,
+not size: a full hex digest (64 chars) is longer than the number it
+replaces. Clients that care about request size can send a digest
+truncated to at least MIN_DIGEST_BYTES, hex or base64.
+"""
+import base64
+import binascii
+import hashlib
+import re
+import time
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+DEFAULT_COUNTRY_CODE = '91'
+
+_NON_DIGITS = re.compile(r'\D')
+
+# Shortest accepted digest prefix; the index is keyed on this many bytes
+MIN_DIGEST_BYTES = 8
+
+
+def normalize_phone(phone: str, country_code: str = DEFAULT_COUNTRY_CODE) -> Optional[str]:
+    """E.164 form of a phone number, assuming ``country_code`` for local numbers."""
+    if not phone:
+        return None
+    phone = phone.strip()
+    digits = _NON_DIGITS.sub('', phone)
+    if phone.startswith('+'):
+        pass
+    elif digits.startswith('00'):
+        digits = digits[2:]
+    elif len(digits) == 11 and digits.startswith('0'):
+        digits = country_code + digits[1:]
+    elif len(digits) == 10:
+        digits = country_code + digits
+    if len(digits) < 8 or len(digits) > 15:
+        return None
+    return '+' + digits
+
+
+def hash_phone(e164: str) -> str:
+    """SHA-256 hex digest clients send instead of the raw E.164 number."""
+    return hashlib.sha256(e164.encode()).hexdigest()
+
+
+def decode_digest(digest: str) -> Optional[bytes]:
+    """Bytes of a full or truncated digest sent as hex or (url-safe) base64, or None if invalid.
+
+    Strings that parse as hex are read as hex, anything else as base64.
+    """
+    try:
+        raw = bytes.fromhex(digest)
+    except ValueError:
+        try:
+            raw = base64.urlsafe_b64decode(digest.replace('+', '-').replace('/', '_') + '=' * (-len(digest) % 4))
+        except (ValueError, binascii.Error):
+            return None
+    return raw if MIN_DIGEST_BYTES <= len(raw) <= 32 else None
+
+
+class ContactIndex:
+    """Maps each normalized reviewer phone to the providers they reviewed.
+
+    A request resolves its contact list against the index once, so finding
+    which candidate providers have contact reviews costs O(contacts)
+    instead of O(reviews x contacts).
+    """
+
+    def __init__(self):
+        self._providers: Dict[str, Set[str]] = {}
+        # Digest prefix -> (full digest, phone)
+        self._by_hash: Dict[bytes, Tuple[bytes, str]] = {}
+        # Stored spellings of a phone that differ from its E.164 form
+        self._aliases: Dict[str, Set[str]] = {}
+        self.built_at: Optional[float] = None
+
+    @property
+    def built(self) -> bool:
+        return self.built_at is not None
+
+    def __len__(self):
+        return len(self._providers)
+
+    def build(self, reviews: Iterable[Dict]):
+        """Replace the index with the given (provider_id, reviewer_phone) rows."""
+        self._providers = {}
+        self._by_hash = {}
+        self._aliases = {}
+        for review in reviews:
+            self.add_review(review['provider_id'], review['reviewer_phone'])
+        self.built_at = time.monotonic()
+
+    def add_review(self, provider_id: str, reviewer_phone: str):
+        phone = normalize_phone(reviewer_phone)
+        if phone is None:
+            return
+        providers = self._providers.get(phone)
+        if providers is None:
+            providers = self._providers[phone] = set()
+            digest = hashlib.sha256(phone.encode()).digest()
+            self._by_hash[digest[:MIN_DIGEST_BYTES]] = (digest, phone)
+        providers.add(provider_id)
+        if reviewer_phone != phone:
+            self._aliases.setdefault(phone, set()).add(reviewer_phone)
+
+    def resolve(self, contacts: Iterable[str] = (), hashed_contacts: Iterable[str] = ()) -> Set[str]:
+        """Normalized phones among the given contacts that have written reviews."""
+        found = set()
+        for contact in contacts:
+            phone = normalize_phone(contact)
+            if phone in self._providers:
+                found.add(phone)
+        for digest in hashed_contacts:
+            raw = decode_digest(digest)
+            if raw is None:
+                continue
+            entry = self._by_hash.get(raw[:MIN_DIGEST_BYTES])
+            # Longer digests must match in full, not only on the indexed prefix
+            if entry is not None and entry[0].startswith(raw):
+                found.add(entry[1])
+        return found
+
+    def stored_phones(self, phones: Iterable[str]) -> Set[str]:
+        """Every spelling of the given phones as stored in reviews.reviewer_phone."""
+        stored = set()
+        for phone in phones:
+            stored.add(phone)
+            stored.update(self._aliases.get(phone, ()))
+        return stored
+
+    def match(self, phones: Set[str], provider_ids: Optional[Iterable[str]] = None) -> Dict[str, Set[str]]:
+        """Provider id -> contact phones that reviewed it, optionally limited to provider_ids."""
+        wanted = None if provider_ids is None else set(provider_ids)
+        matches: Dict[str, Set[str]] = {}
+        for phone in phones:
+            for provider_id in self._providers.get(phone, ()):
+                if wanted is None or provider_id in wanted:
+                    matches.setdefault(provider_id, set()).add(phone)
+        return matches
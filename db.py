@@ -0,0 +1,454 @@
+"""Async data access layer.
+
+``Repository`` is the storage interface for providers and reviews; the
+API and the scripts only talk to it. ``Database`` implements it on
+Supabase and ``sqlite_db.SQLiteDatabase`` on an embedded SQLite file.
+``DB_BACKEND`` selects which one ``create_database`` returns.
+
+Both clients are blocking, so every query runs on a bounded thread pool
+instead of the event loop. One slow query then only occupies a pool
+thread and the other in-flight requests keep being served.
+
+Creating a repository is cheap: the supabase client (and the import of
+supabase and httpx) is deferred to ``connect`` or the first query, so it
+is not paid for on import or before the app can answer health checks.
+"""
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+from metrics import record_db_call
+from stats import rpc_params
+
+
+def db_pool_size() -> int:
+    """Number of queries that may run concurrently (and pooled HTTP connections).
+
+    Like the other DB settings it is read when used, not on import, so a
+    .env loaded after importing this module still applies.
+    """
+    return int(os.getenv("DB_POOL_SIZE", "16"))
+
+
+def create_supabase_client(url: str, key: str, pool_size: Optional[int] = None):
+    """Create a supabase client backed by a pooled keep-alive HTTP client."""
+    pool_size = pool_size or db_pool_size()
+    import httpx
+    from supabase import create_client
+    from supabase.lib.client_options import SyncClientOptions
+
+    http_client = httpx.Client(
+        limits=httpx.Limits(
+            max_connections=pool_size,
+            max_keepalive_connections=pool_size,
+            keepalive_expiry=60
+        ),
+        timeout=float(os.getenv("DB_TIMEOUT", "30")),
+        follow_redirects=True
+    )
+    return create_client(url, key, options=SyncClientOptions(httpx_client=http_client))
+
+
+def newest_by_reviewers(rows: List[Dict], reviewer_phones: Dict[str, List[str]],
+                        limit: Optional[int]) -> Dict[str, List[Dict]]:
+    """Group newest-first review rows by provider, keeping each provider's own phones, up to limit.
+
+    Rows of providers missing from reviewer_phones are skipped.
+    """
+    grouped: Dict[str, List[Dict]] = {provider_id: [] for provider_id in reviewer_phones}
+    wanted = {provider_id: set(phones) for provider_id, phones in reviewer_phones.items()}
+    for row in rows:
+        phones = wanted.get(row['provider_id'])
+        if phones is None or row['reviewer_phone'] not in phones:
+            continue
+        provider_reviews = grouped[row['provider_id']]
+        if limit is None or len(provider_reviews) < limit:
+            provider_reviews.append(row)
+    return grouped
+
+
+def create_database(backend: Optional[str] = None) -> "Repository":
+    """The repository selected by DB_BACKEND ("supabase" or "sqlite"), configured from the environment."""
+    backend = backend or os.getenv("DB_BACKEND", "supabase")
+    if backend == 'sqlite':
+        from sqlite_db import SQLiteDatabase
+        return SQLiteDatabase(os.getenv("SQLITE_PATH", "puch.db"))
+    if backend == 'supabase':
+        return Database(client_factory=partial(
+            create_supabase_client, os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_ANON_KEY")
+        ))
+    raise ValueError(f"Unknown DB_BACKEND: {backend}")
+
+
+class Repository:
+    """Storage interface for providers, reviews and AI insights.
+
+    ``columns`` arguments are comma separated column lists as in a
+    PostgREST select; rows are returned as plain dicts with ``ratings``
+    decoded.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers or db_pool_size(), thread_name_prefix="db")
+
+    async def run(self, fn, *args, **kwargs):
+        """Run one blocking DB round trip on the pool, charged to the current request."""
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        result = await loop.run_in_executor(self.executor, partial(fn, *args, **kwargs))
+        data = getattr(result, 'data', result)
+        record_db_call(time.perf_counter() - start, len(data) if isinstance(data, list) else int(bool(data)))
+        return result
+
+    async def connect(self):
+        """Set up the client ahead of the first query; a no-op where there is nothing to set up."""
+
+    def rejected_row_errors(self) -> tuple:
+        """Errors meaning the database refused a row (e.g. unknown provider_id).
+
+        Writers drop such rows; anything else is taken as a connectivity
+        error and the write retried.
+        """
+        return ()
+
+    def scan(self, table: str, columns: str = '*', page_size: int = 1000) -> AsyncIterator[List[Dict]]:
+        """Yield a whole table page by page using keyset pagination on id."""
+        raise NotImplementedError
+
+    def scan_since(self, table: str, column: str, since: Optional[str], columns: str = '*',
+                   page_size: int = 1000) -> AsyncIterator[List[Dict]]:
+        """Yield the rows whose column is at or after since (every row if None), in (column, id) order.
+
+        columns must include column and id.
+        """
+        raise NotImplementedError
+
+    # Providers
+    async def search_providers(self, service_type: str, location: str) -> List[Dict]:
+        """Providers of one facet, best rated first."""
+        raise NotImplementedError
+
+    async def top_providers(self, service_type: str, location: str, limit: int) -> Tuple[List[Dict], int]:
+        """The best scored providers of one facet and the facet's total, in one round trip."""
+        raise NotImplementedError
+
+    async def top_providers_many(self, facets: List[Tuple[str, str]],
+                                 limit: int) -> Dict[Tuple[str, str], Tuple[List[Dict], int]]:
+        """top_providers for several facets in one round trip."""
+        raise NotImplementedError
+
+    async def get_provider(self, provider_id: str, columns: str = '*') -> Optional[Dict]:
+        raise NotImplementedError
+
+    async def get_providers(self, provider_ids: List[str], columns: str = '*') -> List[Dict]:
+        """Several providers by id in one round trip, in no particular order."""
+        raise NotImplementedError
+
+    async def insert_provider(self, provider_data: Dict) -> Optional[Dict]:
+        raise NotImplementedError
+
+    async def upsert_providers(self, providers: List[Dict]) -> List[Dict]:
+        """Insert or fully overwrite providers by id."""
+        raise NotImplementedError
+
+    async def update_provider(self, provider_id: str, values: Dict) -> List[Dict]:
+        raise NotImplementedError
+
+    async def increment_provider_stats(self, provider_id: str, delta: Dict) -> Optional[Dict]:
+        """Atomically add a rating delta to a provider's running aggregates."""
+        raise NotImplementedError
+
+    # Reviews
+    async def reviews_for_provider(self, provider_id: str, columns: str = '*') -> List[Dict]:
+        raise NotImplementedError
+
+    async def reviews_for_providers(self, provider_ids: List[str], columns: str = '*') -> List[Dict]:
+        """Reviews of several providers in one round trip."""
+        raise NotImplementedError
+
+    async def recent_reviews(self, provider_id: str, limit: int, columns: str = '*',
+                             before: Optional[tuple] = None) -> List[Dict]:
+        """Newest reviews first, optionally strictly before a (timestamp, id) cursor."""
+        raise NotImplementedError
+
+    async def reviews_by_reviewers(self, provider_id: str, reviewer_phones: List[str], limit: int,
+                                   columns: str = '*') -> List[Dict]:
+        """A provider's newest reviews written by any of the given phones."""
+        raise NotImplementedError
+
+    async def reviews_by_reviewers_many(self, reviewer_phones: Dict[str, List[str]], limit: Optional[int],
+                                        columns: str = '*') -> Dict[str, List[Dict]]:
+        """reviews_by_reviewers for several providers in one round trip, keyed by provider id.
+
+        ``reviewer_phones`` maps each provider id to its phones; columns
+        must include provider_id and reviewer_phone. A limit of None
+        returns every matching review.
+        """
+        raise NotImplementedError
+
+    async def insert_reviews(self, reviews: List[Dict]) -> List[Dict]:
+        """Bulk insert reviews with client-side ids; returns only newly inserted rows."""
+        raise NotImplementedError
+
+    async def insert_review(self, review_data: Dict) -> Optional[Dict]:
+        raise NotImplementedError
+
+    # AI insights
+    async def get_insights(self, provider_id: str) -> Optional[Dict]:
+        raise NotImplementedError
+
+    async def get_insights_many(self, provider_ids: List[str]) -> List[Dict]:
+        """ai_insights rows of several providers in one round trip."""
+        raise NotImplementedError
+
+    async def upsert_insights(self, insights: List[Dict]) -> List[Dict]:
+        """Insert or overwrite ai_insights rows by provider_id."""
+        raise NotImplementedError
+
+    async def pending_insight_reviews(self, limit: int, provider_id: Optional[str] = None) -> List[Dict]:
+        """Reviews not yet folded into ai_insights, oldest first: id, provider_id, review_text and timestamp."""
+        raise NotImplementedError
+
+    async def mark_insights_processed(self, review_ids: List[str]):
+        raise NotImplementedError
+
+
+class Database(Repository):
+    """Supabase repository, running queries on a bounded thread pool.
+
+    Takes a client, or a factory called on first use to create it.
+    """
+
+    def __init__(self, client=None, max_workers: Optional[int] = None,
+                 client_factory: Optional[Callable] = None):
+        super().__init__(max_workers)
+        if client is None and client_factory is None:
+            raise ValueError("Either client or client_factory is required")
+        self._client = client
+        self._client_factory = client_factory
+        self._client_lock = threading.Lock()
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    self._client = self._client_factory()
+        return self._client
+
+    async def connect(self):
+        """Create the client on the pool rather than on the event loop."""
+        if self._client is None:
+            await asyncio.get_running_loop().run_in_executor(self.executor, lambda: self.client)
+
+    def rejected_row_errors(self) -> tuple:
+        from postgrest.exceptions import APIError  # Slow to import, only needed once a write fails
+        return (APIError,)
+
+    async def execute(self, query):
+        """Execute a built postgrest query on the pool."""
+        return await self.run(query.execute)
+
+    async def scan(self, table: str, columns: str = '*', page_size: int = 1000) -> AsyncIterator[List[Dict]]:
+        """Yield a whole table page by page using keyset pagination on id."""
+        last_id = None
+        while True:
+            query = self.client.table(table).select(columns).order('id').limit(page_size)
+            if last_id is not None:
+                query = query.gt('id', last_id)
+            page = (await self.execute(query)).data
+            if page:
+                yield page
+            if len(page) < page_size:
+                break
+            last_id = page[-1]['id']
+
+    async def scan_since(self, table: str, column: str, since: Optional[str], columns: str = '*',
+                         page_size: int = 1000) -> AsyncIterator[List[Dict]]:
+        """Yield the rows whose column is at or after since (every row if None), in (column, id) order."""
+        last = None
+        while True:
+            query = self.client.table(table).select(columns).order(column).order('id').limit(page_size)
+            if last is not None:
+                value, last_id = last
+                query = query.or_(f'{column}.gt."{value}",and({column}.eq."{value}",id.gt."{last_id}")')
+            elif since is not None:
+                query = query.gte(column, since)
+            page = (await self.execute(query)).data
+            if page:
+                yield page
+            if len(page) < page_size:
+                break
+            last = page[-1][column], page[-1]['id']
+
+    # Providers
+    async def search_providers(self, service_type: str, location: str) -> List[Dict]:
+        result = await self.execute(
+            self.client.table('providers').select('*').eq(
+                'service_type', service_type
+            ).eq('location', location).order('avg_rating', desc=True)
+        )
+        return result.data
+
+    async def top_providers(self, service_type: str, location: str, limit: int) -> Tuple[List[Dict], int]:
+        result = await self.execute(
+            self.client.table('providers').select('*', count='exact').eq(
+                'service_type', service_type
+            ).eq('location', location).order('score', desc=True).order('id').limit(limit)
+        )
+        return result.data, result.count or 0
+
+    async def top_providers_many(self, facets: List[Tuple[str, str]],
+                                 limit: int) -> Dict[Tuple[str, str], Tuple[List[Dict], int]]:
+        facets = list(dict.fromkeys(facets))
+        top = {facet: ([], 0) for facet in facets}
+        if not facets:
+            return top
+        result = await self.execute(self.client.rpc('top_providers', {
+            'p_service_types': [service_type for service_type, _ in facets],
+            'p_locations': [location for _, location in facets],
+            'p_limit': limit
+        }))
+        for row in result.data:
+            facet = (row['service_type'], row['location'])
+            top[facet][0].append(row)
+            top[facet] = (top[facet][0], row.pop('facet_total'))
+        return top
+
+    async def get_provider(self, provider_id: str, columns: str = '*') -> Optional[Dict]:
+        result = await self.execute(
+            self.client.table('providers').select(columns).eq('id', provider_id)
+        )
+        return result.data[0] if result.data else None
+
+    async def get_providers(self, provider_ids: List[str], columns: str = '*') -> List[Dict]:
+        if not provider_ids:
+            return []
+        result = await self.execute(
+            self.client.table('providers').select(columns).in_('id', provider_ids)
+        )
+        return result.data
+
+    async def insert_provider(self, provider_data: Dict) -> Optional[Dict]:
+        result = await self.execute(self.client.table('providers').insert(provider_data))
+        return result.data[0] if result.data else None
+
+    async def upsert_providers(self, providers: List[Dict]) -> List[Dict]:
+        if not providers:
+            return []
+        result = await self.execute(self.client.table('providers').upsert(providers, on_conflict='id'))
+        return result.data
+
+    async def update_provider(self, provider_id: str, values: Dict) -> List[Dict]:
+        result = await self.execute(
+            self.client.table('providers').update(values).eq('id', provider_id)
+        )
+        return result.data
+
+    async def increment_provider_stats(self, provider_id: str, delta: Dict) -> Optional[Dict]:
+        """Atomically add a rating delta to a provider's running aggregates."""
+        result = await self.execute(
+            self.client.rpc('increment_provider_stats', rpc_params(provider_id, delta))
+        )
+        return result.data[0] if result.data else None
+
+    # Reviews
+    async def reviews_for_provider(self, provider_id: str, columns: str = '*') -> List[Dict]:
+        result = await self.execute(
+            self.client.table('reviews').select(columns).eq('provider_id', provider_id)
+        )
+        return result.data
+
+    async def reviews_for_providers(self, provider_ids: List[str], columns: str = '*') -> List[Dict]:
+        """Reviews of several providers in one round trip."""
+        if not provider_ids:
+            return []
+        result = await self.execute(
+            self.client.table('reviews').select(columns).in_('provider_id', provider_ids)
+        )
+        return result.data
+
+    async def recent_reviews(self, provider_id: str, limit: int, columns: str = '*',
+                             before: Optional[tuple] = None) -> List[Dict]:
+        """Newest reviews first, optionally strictly before a (timestamp, id) cursor."""
+        query = self.client.table('reviews').select(columns).eq('provider_id', provider_id)
+        if before is not None:
+            timestamp, review_id = before
+            query = query.or_(
+                f'timestamp.lt."{timestamp}",and(timestamp.eq."{timestamp}",id.lt."{review_id}")'
+            )
+        query = query.order('timestamp', desc=True).order('id', desc=True).limit(limit)
+        return (await self.execute(query)).data
+
+    async def reviews_by_reviewers(self, provider_id: str, reviewer_phones: List[str], limit: int,
+                                   columns: str = '*') -> List[Dict]:
+        """A provider's newest reviews written by any of the given phones."""
+        if not reviewer_phones:
+            return []
+        result = await self.execute(
+            self.client.table('reviews').select(columns).eq('provider_id', provider_id).in_(
+                'reviewer_phone', reviewer_phones
+            ).order('timestamp', desc=True).limit(limit)
+        )
+        return result.data
+
+    async def reviews_by_reviewers_many(self, reviewer_phones: Dict[str, List[str]], limit: Optional[int],
+                                        columns: str = '*') -> Dict[str, List[Dict]]:
+        if not reviewer_phones:
+            return {}
+        phones = sorted({phone for provider_phones in reviewer_phones.values() for phone in provider_phones})
+        result = await self.execute(
+            self.client.table('reviews').select(columns).in_('provider_id', list(reviewer_phones)).in_(
+                'reviewer_phone', phones
+            ).order('timestamp', desc=True)
+        )
+        return newest_by_reviewers(result.data, reviewer_phones, limit)
+
+    async def insert_reviews(self, reviews: List[Dict]) -> List[Dict]:
+        """Bulk insert reviews with client-side ids; returns only newly inserted rows."""
+        result = await self.execute(
+            self.client.table('reviews').upsert(reviews, on_conflict='id', ignore_duplicates=True)
+        )
+        return result.data
+
+    async def insert_review(self, review_data: Dict) -> Optional[Dict]:
+        result = await self.execute(self.client.table('reviews').insert(review_data))
+        return result.data[0] if result.data else None
+
+    # AI insights
+    async def get_insights(self, provider_id: str) -> Optional[Dict]:
+        result = await self.execute(
+            self.client.table('ai_insights').select('*').eq('provider_id', provider_id)
+        )
+        return result.data[0] if result.data else None
+
+    async def get_insights_many(self, provider_ids: List[str]) -> List[Dict]:
+        if not provider_ids:
+            return []
+        result = await self.execute(self.client.table('ai_insights').select('*').in_('provider_id', provider_ids))
+        return result.data
+
+    async def upsert_insights(self, insights: List[Dict]) -> List[Dict]:
+        if not insights:
+            return []
+        result = await self.execute(self.client.table('ai_insights').upsert(insights, on_conflict='provider_id'))
+        return result.data
+
+    async def pending_insight_reviews(self, limit: int, provider_id: Optional[str] = None) -> List[Dict]:
+        query = self.client.table('reviews').select('id, provider_id, review_text, timestamp').eq(
+            'insights_processed', False
+        )
+        if provider_id is not None:
+            query = query.eq('provider_id', provider_id)
+        result = await self.execute(query.order('timestamp').order('id').limit(limit))
+        return result.data
+
+    async def mark_insights_processed(self, review_ids: List[str]):
+        if review_ids:
+            await self.execute(
+                self.client.table('reviews').update({'insights_processed': True}).in_('id', review_ids)
+            )
@@ -0,0 +1,185 @@
+"""In-memory index of provider facets (service type x location)."""
+import heapq
+import time
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+FacetKey = Tuple[str, str]
+
+# The closest values by trigrams are compared letter by letter; one is only
+# substituted for the input within a typo budget of one edit, plus one per
+# LETTERS_PER_TYPO letters of the value (see typo_distance)
+RERANK_CANDIDATES = 5
+LETTERS_PER_TYPO = 8
+
+
+def trigrams(text: str) -> Set[str]:
+    """Character trigrams of a normalized string, padded so word starts and ends count."""
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def typo_distance(a: str, b: str, limit: int) -> int:
+    """Edits turning a into b: a missing, extra or swapped letter costs 1, a wrong letter 2.
+
+    A wrong letter costs as much as two edits so that a different word one
+    letter away ("printer" and "painter") is not taken for a typo of it.
+    Anything over limit is reported as limit + 1, which lets only the cells
+    within limit of the diagonal be computed.
+    """
+    over = limit + 1
+    before, previous = None, [min(j, over) for j in range(len(b) + 1)]
+    for i in range(1, len(a) + 1):
+        current = [over] * (len(b) + 1)
+        if i <= limit:
+            current[0] = i
+        for j in range(max(1, i - limit), min(len(b), i + limit) + 1):
+            cost = min(previous[j] + 1, current[j - 1] + 1,
+                       previous[j - 1] + (0 if a[i - 1] == b[j - 1] else 2))
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                cost = min(cost, before[j - 2] + 1)
+            current[j] = min(cost, over)
+        # A swap reads two rows back, so both must be over the limit
+        if min(current) == over and min(previous) == over:
+            return over
+        before, previous = previous, current
+    return previous[-1]
+
+
+class TrigramIndex:
+    """Typo-tolerant lookup among a small set of canonical values.
+
+    Values are indexed by their character trigrams. A query only scores
+    the values sharing at least one trigram with it, by the Jaccard
+    similarity of the two trigram sets, so "plumbr" resolves to "plumber"
+    without comparing against every value. Only the few best candidates
+    are compared letter by letter, and only one within the typo budget is
+    returned: "navi mumbai" or "printer" stay as typed.
+    """
+
+    def __init__(self):
+        self._postings: Dict[str, List[str]] = {}
+        self._sizes: Dict[str, int] = {}
+
+    def __contains__(self, value: str) -> bool:
+        return value in self._sizes
+
+    def __len__(self):
+        return len(self._sizes)
+
+    def add(self, value: str):
+        if value in self._sizes:
+            return
+        grams = trigrams(value)
+        self._sizes[value] = len(grams)
+        for gram in grams:
+            self._postings.setdefault(gram, []).append(value)
+
+    def best_match(self, text: str) -> Optional[str]:
+        """The closest value within the typo budget, or None."""
+        if text in self._sizes:
+            return text
+        if not text:
+            return None
+        grams = trigrams(text)
+        shared: Dict[str, int] = {}
+        for gram in grams:
+            for value in self._postings.get(gram, ()):
+                shared[value] = shared.get(value, 0) + 1
+        candidates = [(-count / (len(grams) + self._sizes[value] - count), value) for value, count in shared.items()]
+        # Trigrams ignore letter order and a swap in a short word breaks most
+        # of them, so they only shortlist, most similar first. Ties in typo
+        # distance go to the earlier candidate; none can beat one edit.
+        best, best_distance = None, None
+        for _, value in heapq.nsmallest(RERANK_CANDIDATES, candidates):
+            budget = 1 + len(value) // LETTERS_PER_TYPO
+            if abs(len(text) - len(value)) > budget:
+                continue
+            distance = typo_distance(text, value, budget)
+            if distance <= budget and (best is None or distance < best_distance):
+                best, best_distance = value, distance
+                if distance == 1:
+                    break
+        return best
+
+
+class FacetIndex:
+    """Provider ids grouped by (service_type, location).
+
+    Built once from a scan of the providers table and then kept current
+    with ``add_provider``, so facet listings and per-facet counts are
+    answered from memory in O(facets). The distinct service types and
+    locations are also kept in trigram indexes to resolve misspelled
+    search input to a known facet.
+    """
+
+    def __init__(self):
+        self.service_types = TrigramIndex()
+        self.locations = TrigramIndex()
+        self._members: Dict[FacetKey, Set[str]] = {}
+        self._ids: Set[str] = set()
+        self._snapshot: Optional[Dict] = None
+        self.built_at: Optional[float] = None
+
+    @property
+    def built(self) -> bool:
+        return self.built_at is not None
+
+    def build(self, providers: Iterable[Dict]):
+        """Replace the index with the given provider rows."""
+        members: Dict[FacetKey, Set[str]] = {}
+        ids: Set[str] = set()
+        for provider in providers:
+            members.setdefault((provider['service_type'], provider['location']), set()).add(provider['id'])
+            ids.add(provider['id'])
+        service_types, locations = TrigramIndex(), TrigramIndex()
+        for service_type, location in members:
+            service_types.add(service_type)
+            locations.add(location)
+        self._members = members
+        self._ids = ids
+        self.service_types = service_types
+        self.locations = locations
+        self._snapshot = None
+        self.built_at = time.monotonic()
+
+    def add_provider(self, provider: Dict):
+        key = (provider['service_type'], provider['location'])
+        self._members.setdefault(key, set()).add(provider['id'])
+        self._ids.add(provider['id'])
+        self.service_types.add(provider['service_type'])
+        self.locations.add(provider['location'])
+        self._snapshot = None
+
+    def resolve(self, service_type: str, location: str) -> FacetKey:
+        """Closest known service type and location to normalized input; unknown input is kept as is."""
+        return (
+            self.service_types.best_match(service_type) or service_type,
+            self.locations.best_match(location) or location
+        )
+
+    def has_provider(self, provider_id: str) -> bool:
+        return provider_id in self._ids
+
+    def provider_ids(self, service_type: str, location: str) -> Set[str]:
+        return self._members.get((service_type, location), set())
+
+    def count(self, service_type: str, location: str) -> int:
+        return len(self._members.get((service_type, location), ()))
+
+    def keys(self) -> List[FacetKey]:
+        return list(self._members)
+
+    def snapshot(self) -> Dict:
+        """Distinct service types, locations and per-facet provider counts."""
+        if self._snapshot is None:
+            counts: Dict[str, Dict[str, int]] = {}
+            for (service_type, location), ids in self._members.items():
+                if ids:
+                    counts.setdefault(service_type, {})[location] = len(ids)
+            self._snapshot = {
+                'service_types': sorted(counts),
+                'locations': sorted({location for by_location in counts.values() for location in by_location}),
+                'total_providers': sum(len(ids) for ids in self._members.values()),
+                'counts': counts
+            }
+        return self._snapshot
@@ -0,0 +1,109 @@
+"""In-memory spatial index of provider coordinates."""
+import heapq
+import math
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+EARTH_RADIUS_KM = 6371.0088
+
+Cell = Tuple[int, int]
+# (provider id, lat, lon, x, y, z) with x, y, z the point on the unit sphere
+Entry = Tuple[str, float, float, float, float, float]
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Great-circle distance between two points in kilometres."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def unit_vector(lat: float, lon: float) -> Tuple[float, float, float]:
+    phi, lam = math.radians(lat), math.radians(lon)
+    return math.cos(phi) * math.cos(lam), math.cos(phi) * math.sin(lam), math.sin(phi)
+
+
+class GridIndex:
+    """Provider coordinates bucketed in a uniform lat/lon grid, per service type.
+
+    A radius query only visits the cells overlapping the radius' bounding
+    box, so its cost depends on how many providers are nearby rather than
+    on the total number of providers. Each point is stored with its unit
+    vector, so the radius test is a dot product and trigonometry is only
+    needed for the distances of the returned providers. Providers without
+    coordinates are not indexed.
+    """
+
+    def __init__(self, cell_degrees: float = 0.05):
+        self.cell_degrees = cell_degrees
+        self._cells: Dict[str, Dict[Cell, List[Entry]]] = {}
+        # provider id -> (service_type, cell), to move a provider that changed
+        self._where: Dict[str, Tuple[str, Cell]] = {}
+        self.built_at: Optional[float] = None
+
+    @property
+    def built(self) -> bool:
+        return self.built_at is not None
+
+    def __len__(self):
+        return len(self._where)
+
+    def _cell(self, lat: float, lon: float) -> Cell:
+        return math.floor(lat / self.cell_degrees), math.floor(lon / self.cell_degrees)
+
+    def build(self, providers: Iterable[Dict]):
+        """Replace the index with the given (id, service_type, latitude, longitude) rows."""
+        self._cells = {}
+        self._where = {}
+        for provider in providers:
+            self.add_provider(provider)
+        self.built_at = time.monotonic()
+
+    def add_provider(self, provider: Dict):
+        lat, lon = provider.get('latitude'), provider.get('longitude')
+        if provider['id'] in self._where:
+            self.remove_provider(provider['id'])
+        if lat is None or lon is None:
+            return
+        cell = self._cell(lat, lon)
+        self._cells.setdefault(provider['service_type'], {}).setdefault(cell, []).append(
+            (provider['id'], lat, lon, *unit_vector(lat, lon))
+        )
+        self._where[provider['id']] = (provider['service_type'], cell)
+
+    def remove_provider(self, provider_id: str):
+        service_type, cell = self._where.pop(provider_id)
+        bucket = self._cells[service_type][cell]
+        bucket[:] = [entry for entry in bucket if entry[0] != provider_id]
+
+    def nearby(self, service_type: str, lat: float, lon: float, radius_km: float,
+               limit: Optional[int] = None) -> Tuple[List[Tuple[str, float]], int]:
+        """(provider id, distance km) nearest first, up to limit, and how many are within radius_km."""
+        cells = self._cells.get(service_type)
+        if not cells:
+            return [], 0
+        # Bounding box of the spherical cap around the point
+        angle = min(radius_km / EARTH_RADIUS_KM, math.pi)
+        dlat = math.degrees(angle)
+        ratio = math.sin(angle) / max(math.cos(math.radians(lat)), 1e-12)
+        dlon = math.degrees(math.asin(ratio)) if ratio < 1 and angle < math.pi / 2 else 180.0
+        min_x, min_y = self._cell(lat - dlat, lon - dlon)
+        max_x, max_y = self._cell(lat + dlat, lon + dlon)
+
+        # Within radius_km <=> the dot product of the unit vectors is at least cos(angle)
+        qx, qy, qz = unit_vector(lat, lon)
+        min_dot = math.cos(angle)
+        found = []
+        for cx in range(min_x, max_x + 1):
+            for cy in range(min_y, max_y + 1):
+                for entry in cells.get((cx, cy), ()):
+                    dot = qx * entry[3] + qy * entry[4] + qz * entry[5]
+                    if dot >= min_dot:
+                        found.append((dot, entry))
+        # Largest dot product = nearest
+        top = sorted(found, key=lambda item: -item[0]) if limit is None else heapq.nlargest(
+            limit, found, key=lambda item: item[0]
+        )
+        return [(entry[0], haversine_km(lat, lon, entry[1], entry[2])) for _, entry in top], len(found)
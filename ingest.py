@@ -0,0 +1,225 @@
+"""Write-behind review ingestion.
+
+Reviews are appended to a local journal file and acknowledged right away;
+a background flusher inserts them in batches and applies one coalesced
+stats update per provider per flush. Reviews carry client-generated ids
+and are inserted with ``ignore_duplicates``, so replaying the journal
+after a crash neither duplicates reviews nor double-counts their stats.
+Stats updates that fail are retried on the next flush; if the process
+dies first, ``update_stats.py --rebuild`` repairs the drift.
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from stats import add_review, empty_delta
+
+logger = logging.getLogger(__name__)
+
+
+class ReviewQueueFull(Exception):
+    """Raised when the queue is at capacity; the client should retry later."""
+
+
+class ReviewIngestQueue:
+    def __init__(self, db, journal_path: str, batch_size: int = 500, flush_interval: float = 1.0,
+                 max_pending: int = 10000, fsync: bool = False,
+                 on_flush: Optional[Callable[[List[Dict], List[Dict]], Awaitable[None]]] = None):
+        self.db = db
+        self.journal_path = journal_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.fsync = fsync
+        self.on_flush = on_flush
+        self._pending: List[Dict] = []
+        # Stats deltas of inserted reviews whose provider update has not succeeded yet
+        self._unapplied: Dict[str, Dict] = {}
+        self._journal = None
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self._flush_lock = asyncio.Lock()
+        # Metrics
+        self.flushes = 0
+        self.flushed_reviews = 0
+        self.rejected_reviews = 0
+        self.last_flush_seconds = 0.0
+        self.total_flush_seconds = 0.0
+        self.last_error: Optional[str] = None
+
+    @property
+    def depth(self) -> int:
+        return len(self._pending)
+
+    async def start(self):
+        """Replay the journal left by a previous run and start the flusher."""
+        torn = self._read_journal()
+        self._journal = open(self.journal_path, 'a')
+        if torn:
+            # Drop the torn lines so new reviews are not appended to a partial one
+            self._rewrite_journal()
+        self._wake = asyncio.Event()
+        self._stopping = False
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def _read_journal(self) -> int:
+        """Load the journal left by a previous run into pending; returns the unparseable lines.
+
+        A crash in the middle of submit() leaves a partly written last line.
+        Such lines are moved to the .rejected file rather than failing startup.
+        """
+        if not os.path.exists(self.journal_path):
+            return 0
+        torn = 0
+        with open(self.journal_path) as journal:
+            for number, line in enumerate(journal, 1):
+                if not line.strip():
+                    continue
+                try:
+                    self._pending.append(json.loads(line))
+                except ValueError:
+                    torn += 1
+                    logger.error("Skipping unreadable journal line %d: %r", number, line[:200])
+                    with open(self.journal_path + '.rejected', 'a') as rejected:
+                        rejected.write(line.rstrip('\n') + '\n')
+        if self._pending:
+            logger.info("Replaying %d journaled reviews", len(self._pending))
+        return torn
+
+    async def stop(self):
+        """Flush what is pending and stop the flusher."""
+        if self._task is not None:
+            # Let a running flush finish rather than cancelling it: cancelled
+            # after its insert, the batch's stats updates and on_flush are lost
+            self._stopping = True
+            self._wake.set()
+            await self._task
+            self._task = None
+        while self._pending and await self.flush():
+            pass
+        if self._unapplied:
+            await self.flush()
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+
+    def submit(self, review_data: Dict) -> Dict:
+        """Journal a validated review and queue it; returns the stored row."""
+        if len(self._pending) >= self.max_pending:
+            raise ReviewQueueFull(f"Review queue is full ({self.max_pending} pending)")
+        review = {
+            'id': str(uuid.uuid4()),
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            **review_data
+        }
+        self._journal.write(json.dumps(review) + '\n')
+        self._journal.flush()
+        if self.fsync:
+            os.fsync(self._journal.fileno())
+        self._pending.append(review)
+        if len(self._pending) >= self.batch_size:
+            self._wake.set()
+        return review
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            if self._stopping:
+                return  # stop() flushes the rest
+            # Keep going while full batches are backed up
+            if self._pending or self._unapplied:
+                while await self.flush() and len(self._pending) >= self.batch_size and not self._stopping:
+                    pass
+
+    async def flush(self) -> bool:
+        """Write one batch; returns False if the database write failed."""
+        async with self._flush_lock:
+            batch = self._pending[:self.batch_size]
+            if not batch and not self._unapplied:
+                return True
+            start = time.perf_counter()
+            try:
+                inserted = await self._insert(batch) if batch else []
+            except Exception as e:
+                self.last_error = str(e)
+                logger.warning("Review flush failed, will retry: %s", e)
+                return False
+
+            del self._pending[:len(batch)]
+            self._rewrite_journal()
+
+            # One coalesced stats update per provider; failed ones carry over
+            for review in inserted:
+                add_review(self._unapplied.setdefault(review['provider_id'], empty_delta()), review['ratings'])
+            items = list(self._unapplied.items())
+            results = await asyncio.gather(*(
+                self.db.increment_provider_stats(provider_id, delta) for provider_id, delta in items
+            ), return_exceptions=True)
+            providers = []
+            self.last_error = None
+            for (provider_id, _), result in zip(items, results):
+                if isinstance(result, Exception):
+                    self.last_error = str(result)
+                    logger.warning("Stats update for provider %s failed, will retry: %s", provider_id, result)
+                    continue
+                del self._unapplied[provider_id]
+                if result:
+                    providers.append(result)
+
+            self.last_flush_seconds = time.perf_counter() - start
+            self.total_flush_seconds += self.last_flush_seconds
+            self.flushes += 1
+            self.flushed_reviews += len(inserted)
+
+        if self.on_flush is not None:
+            await self.on_flush(inserted, providers)
+        return True
+
+    async def _insert(self, batch: List[Dict]) -> List[Dict]:
+        """Insert a batch; if the database rejects it, insert row by row and drop bad rows."""
+        try:
+            return await self.db.insert_reviews(batch)
+        except self.db.rejected_row_errors() as e:
+            logger.warning("Batch insert rejected (%s), retrying row by row", e)
+        inserted = []
+        for review in batch:
+            try:
+                inserted.extend(await self.db.insert_reviews([review]))
+            except self.db.rejected_row_errors() as e:
+                self.rejected_reviews += 1
+                logger.error("Dropping review %s: %s", review['id'], e)
+                with open(self.journal_path + '.rejected', 'a') as rejected:
+                    rejected.write(json.dumps(review) + '\n')
+        return inserted
+
+    def _rewrite_journal(self):
+        """Replace the journal with the still pending reviews."""
+        tmp_path = self.journal_path + '.tmp'
+        with open(tmp_path, 'w') as tmp:
+            tmp.writelines(json.dumps(review) + '\n' for review in self._pending)
+        self._journal.close()
+        os.replace(tmp_path, self.journal_path)
+        self._journal = open(self.journal_path, 'a')
+
+    def stats(self) -> Dict:
+        return {
+            'depth': self.depth,
+            'max_pending': self.max_pending,
+            'flushes': self.flushes,
+            'flushed_reviews': self.flushed_reviews,
+            'rejected_reviews': self.rejected_reviews,
+            'providers_awaiting_stats': len(self._unapplied),
+            'last_flush_ms': round(self.last_flush_seconds * 1000, 1),
+            'avg_flush_ms': round(self.total_flush_seconds / self.flushes * 1000, 1) if self.flushes else 0.0,
+            'last_error': self.last_error
+        }
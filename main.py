@@ -1,27 +1,204 @@
+import asyncio
+import base64
+import hmac
+import logging
 import os
-from fastapi import FastAPI
-from supabase import create_client
-from typing import List, Dict, Optional
+import time
+import uuid
+from contextlib import asynccontextmanager
+from datetime import datetime
+from fastapi import FastAPI, Header
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from typing import Callable, List, Dict, Optional, Tuple
 import json
 from dotenv import load_dotenv
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
-# Load environment variables
+# Load environment variables before the project modules, some of which read
+# settings on import (e.g. metrics.SLOW_REQUEST_SECONDS)
 load_dotenv()
 
+from cache import Batcher, SingleFlight, TTLCache  # noqa: E402
+from contacts import ContactIndex  # noqa: E402
+from db import create_database, newest_by_reviewers  # noqa: E402
+from facets import FacetIndex  # noqa: E402
+from geo import GridIndex  # noqa: E402
+from ingest import ReviewIngestQueue, ReviewQueueFull  # noqa: E402
+from metrics import MetricsMiddleware, expose, record_error, stage  # noqa: E402
+from snapshot import TABLE_MODELS, export_ndjson  # noqa: E402
+from stats import AGGREGATE_COLUMNS, dimension_averages, review_delta  # noqa: E402
+from windows import RANKINGS, RecentRatings  # noqa: E402
+
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
+logging.getLogger("httpx").setLevel(logging.WARNING)  # One line per DB call otherwise
+logger = logging.getLogger("puch")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start background services; the app serves / while getting ready."""
+    await start_review_queue()
+    preparing = asyncio.create_task(prepare())
+    try:
+        yield
+    finally:
+        preparing.cancel()
+        if replica_refresher is not None:
+            replica_refresher.cancel()
+        for task in index_refreshes.values():
+            task.cancel()
+        await stop_review_queue()
+
 # Initialize FastAPI
-app = FastAPI(title="Gaali Guide AI", version="1.0.0")
+app = FastAPI(title="Gaali Guide AI", version="1.0.0", lifespan=lifespan)
+app.add_middleware(MetricsMiddleware)
+
+# Storage backend, selected by DB_BACKEND (supabase or sqlite). The client is
+# only created by prepare() or the first query, not on import
+db = create_database()
+
+# Search paths may read from a local SQLite replica of providers and reviews
+# (SEARCH_REPLICA=sqlite), once it has been synced; writes go to db and are
+# mirrored into it. Every REPLICA_REFRESH_SECONDS it copies what other
+# processes changed since the last sync (see sqlite_db.ReplicaSync)
+SEARCH_REPLICA = os.getenv("SEARCH_REPLICA", "")
+REPLICA_REFRESH_SECONDS = float(os.getenv("REPLICA_REFRESH_SECONDS", "300"))
+search_db = db
+replica = None
+replica_sync = None
+replica_refresher: Optional[asyncio.Task] = None
+# Index rebuilds running in the background, by name
+index_refreshes: Dict[str, asyncio.Task] = {}
+if SEARCH_REPLICA == "sqlite":
+    from sqlite_db import ReplicaSync, SQLiteDatabase
+    replica = SQLiteDatabase(os.getenv("REPLICA_PATH", "replica.db"))
+    replica_sync = ReplicaSync(db, replica, overlap=float(os.getenv("REPLICA_SYNC_OVERLAP_SECONDS", "600")))
+
+# Readiness (/ready) is separate from liveness (/): the app is ready once the
+# DB client exists, the replica is synced and, with WARMUP=1, the in-memory
+# indexes and the search results of the WARMUP_FACETS largest facets are loaded
+WARMUP = os.getenv("WARMUP", "0") == "1"
+WARMUP_FACETS = int(os.getenv("WARMUP_FACETS", "100"))
+STARTUP_RETRY_SECONDS = float(os.getenv("STARTUP_RETRY_SECONDS", "5"))
+readiness: Dict = {'ready': False, 'error': None, 'seconds': None}
+_process_start = time.monotonic()
+
+# Search results cache, keyed on normalized (service_type, location)
+search_cache = TTLCache(
+    maxsize=int(os.getenv("SEARCH_CACHE_SIZE", "1024")),
+    ttl=float(os.getenv("SEARCH_CACHE_TTL", "60")),
+    stale_ttl=float(os.getenv("SEARCH_CACHE_STALE_TTL", "30"))
+)
+
+# Identical searches and provider lookups arriving together (e.g. a link shared
+# in a group chat) share one DB fetch; contacts are still matched per request
+SINGLEFLIGHT = os.getenv("SINGLEFLIGHT", "1") == "1"
+search_flights = SingleFlight(SINGLEFLIGHT)
+provider_flights = SingleFlight(SINGLEFLIGHT)
+# Contact review lookups of searches waiting together go out as one query
+contact_review_batches = Batcher(lambda requests: fetch_contact_reviews(requests), SINGLEFLIGHT)
+
+# Distinct service types and locations, rebuilt periodically to pick up
+# providers inserted outside the API (e.g. seed_data.py). Search input is
+# resolved against it, so "plumbr" or "Mumbai " finds "plumber" in "mumbai"
+# while "printer" or "navi mumbai" are searched as typed
+facet_index = FacetIndex()
+FACETS_REFRESH_SECONDS = float(os.getenv("FACETS_REFRESH_SECONDS", "300"))
+_facets_lock = asyncio.Lock()
+
+# Reviewer phone -> reviewed providers, for "reviews from your contacts"
+contact_index = ContactIndex()
+CONTACT_INDEX_REFRESH_SECONDS = float(os.getenv("CONTACT_INDEX_REFRESH_SECONDS", "3600"))
+_contacts_lock = asyncio.Lock()
+
+# Provider coordinates bucketed per service type for proximity search
+geo_index = GridIndex(float(os.getenv("GEO_CELL_DEGREES", "0.05")))
+GEO_INDEX_REFRESH_SECONDS = float(os.getenv("GEO_INDEX_REFRESH_SECONDS", "300"))
+MAX_RADIUS_KM = float(os.getenv("MAX_RADIUS_KM", "50"))
+_geo_lock = asyncio.Lock()
+
+# Columnar snapshot of every review's ratings for /analytics, built in the
+# background on first use (importing NumPy only then), appended to as reviews
+# are written and rebuilt every RATING_STORE_REFRESH_SECONDS
+rating_store = None
+RATING_STORE_REFRESH_SECONDS = float(os.getenv("RATING_STORE_REFRESH_SECONDS", "3600"))
+MAX_LEADERBOARD_SIZE = 50
+MAX_LEADERBOARD_FACETS = 100
+# Providers and reviews by id written while the snapshot is rebuilt
+_ratings_written: Optional[Dict[str, Dict[str, Dict]]] = None
+
+# Per-provider review counts and rating sums over the last 30 and 90 days
+# plus a decayed average, updated as reviews are written and expired by
+# day. Only ever built in the background (see rebuild_recent_ratings), so
+# requests read whatever copy is current and never scan the reviews table
+DECAY_HALF_LIFE_DAYS = float(os.getenv("DECAY_HALF_LIFE_DAYS", "30"))
+recent_ratings = RecentRatings(half_life_days=DECAY_HALF_LIFE_DAYS)
+RECENT_RATINGS_REFRESH_SECONDS = float(os.getenv("RECENT_RATINGS_REFRESH_SECONDS", "3600"))
+# Reviews written while a rebuild scans, by id, replayed into it unless the scan saw them
+_recent_written: Optional[Dict[str, Dict]] = None
+
+# Bulk NDJSON export of providers and reviews (which include reviewer phone
+# numbers): only served with "Authorization: Bearer $EXPORT_TOKEN", and
+# disabled when EXPORT_TOKEN is unset
+EXPORT_TOKEN = os.getenv("EXPORT_TOKEN", "")
+MAX_EXPORT_PAGE_SIZE = 5000
+
+# Review ingestion: "sync" writes before responding, "queued" journals the
+# review, responds immediately and writes it behind in batches
+REVIEW_INGEST_MODE = os.getenv("REVIEW_INGEST_MODE", "sync")
+review_queue: Optional[ReviewIngestQueue] = None
+
+# Providers returned per search, ranked by the stored confidence-weighted score
+# unless the request asks for a recent ranking (rank_by)
+SEARCH_TOP_K = 3
 
-# Supabase setup
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_ANON_KEY")
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+# Most (service_type, location) queries accepted by /batch_search
+MAX_BATCH_QUERIES = int(os.getenv("MAX_BATCH_QUERIES", "10"))
+
+# Provider detail bounds
+MAX_REVIEW_PAGE_SIZE = 50
+MAX_CONTACT_REVIEWS = 10
+# Contact reviews shown per provider in search results
+MAX_SEARCH_CONTACT_REVIEWS = 2
+PROVIDER_DETAIL_COLUMNS = ', '.join(
+    ['id', 'name', 'service_type', 'location', 'phone_number', 'avg_rating'] + AGGREGATE_COLUMNS
+)
 
 # Pydantic Models
-class SearchRequest(BaseModel):
+class HashedContacts(BaseModel):
+    """Contacts sent as SHA-256 of their E.164 numbers, for privacy; see contacts.py."""
+    hashed_contacts: Optional[List[str]] = []
+
+class SearchRequest(HashedContacts):
+    service_type: str
+    location: str = ""
+    user_contacts: Optional[List[str]] = []
+    # With coordinates, providers within radius_km are returned nearest first
+    # and location is only used as a label
+    latitude: Optional[float] = Field(None, ge=-90, le=90)
+    longitude: Optional[float] = Field(None, ge=-180, le=180)
+    radius_km: float = Field(5.0, gt=0)
+    # "score" (all time), "30d", "90d" or "decayed"; ignored for nearby searches
+    rank_by: str = "score"
+
+class SearchQuery(BaseModel):
     service_type: str
     location: str
+
+class BatchSearchRequest(HashedContacts):
+    queries: List[SearchQuery]
     user_contacts: Optional[List[str]] = []
+    whatsapp: bool = False  # Also return each result as a WhatsApp message
+
+class ContactsRequest(HashedContacts):
+    contacts: Optional[List[str]] = []
+
+class ProviderRequest(BaseModel):
+    name: str
+    service_type: str
+    location: str
+    phone_number: Optional[str] = None
+    latitude: Optional[float] = Field(None, ge=-90, le=90)
+    longitude: Optional[float] = Field(None, ge=-180, le=180)
 
 class ReviewRequest(BaseModel):
     provider_id: str
@@ -32,80 +209,353 @@ class ReviewRequest(BaseModel):
     pricing: int
     review_text: str
 
+async def start_review_queue():
+    global review_queue
+    if REVIEW_INGEST_MODE == "queued":
+        review_queue = ReviewIngestQueue(
+            db,
+            os.getenv("INGEST_JOURNAL", "review_queue.ndjson"),
+            batch_size=int(os.getenv("INGEST_BATCH_SIZE", "500")),
+            flush_interval=float(os.getenv("INGEST_FLUSH_INTERVAL", "1.0")),
+            max_pending=int(os.getenv("INGEST_MAX_PENDING", "10000")),
+            fsync=os.getenv("INGEST_FSYNC", "0") == "1",
+            on_flush=on_reviews_written
+        )
+        await review_queue.start()
+
+async def prepare():
+    """Get ready for traffic, retrying every STARTUP_RETRY_SECONDS until it succeeds."""
+    global search_db, replica_refresher
+    while True:
+        try:
+            await db.connect()
+            if replica is not None and search_db is not replica:
+                await replica_sync.sync()
+                search_db = replica
+                replica_refresher = asyncio.get_running_loop().create_task(refresh_replica())
+            if WARMUP:
+                await warm_up()
+            else:
+                # Build the indexes behind /ready so requests rarely wait for a first scan
+                refresh_in_background('indexes', build_indexes)
+            break
+        except Exception as e:
+            logger.exception("Startup failed, retrying in %s s", STARTUP_RETRY_SECONDS)
+            readiness['error'] = f"{type(e).__name__}: {e}"
+            await asyncio.sleep(STARTUP_RETRY_SECONDS)
+    readiness.update(ready=True, error=None, seconds=round(time.monotonic() - _process_start, 3))
+    logger.info("Ready after %.3f s", readiness['seconds'])
+
+async def build_indexes():
+    await asyncio.gather(
+        get_facet_index(), get_contact_index(), get_geo_index(),
+        refresh_in_background('recent_ratings', rebuild_recent_ratings)
+    )
+
+async def warm_up():
+    """Build the in-memory indexes and cache the results of the largest facets."""
+    await build_indexes()
+    facets = await get_facet_index()
+    keys = sorted(facets.keys(), key=lambda key: facets.count(*key), reverse=True)[:WARMUP_FACETS]
+    for start in range(0, len(keys), MAX_BATCH_QUERIES):
+        await search_cache.get_or_load_many(keys[start:start + MAX_BATCH_QUERIES], load_search_results_many)
+    logger.info("Warmed up %d facets", len(keys))
+
+async def refresh_replica():
+    """Re-sync the replica to pick up writes made outside this process."""
+    while True:
+        await asyncio.sleep(REPLICA_REFRESH_SECONDS)
+        try:
+            await replica_sync.sync()
+        except Exception:
+            logger.exception("Error refreshing search replica")
+
+async def stop_review_queue():
+    if review_queue is not None:
+        await review_queue.stop()
+
 @app.get("/")
 async def root():
     return {"message": "Gaali Guide AI is running!", "status": "healthy"}
 
+@app.get("/ready")
+async def ready():
+    """Readiness: 503 until prepare() has finished, so traffic waits for warm-up."""
+    if not readiness['ready']:
+        return JSONResponse(status_code=503, content={"status": "starting", "error": readiness['error']})
+    return {"status": "ready", "warmed_up": WARMUP, "startup_seconds": readiness['seconds']}
+
+def normalize(text: str) -> str:
+    """Canonical form of a service type or location."""
+    return ' '.join(text.lower().split())
+
+async def load_search_results(service_type: str, location: str) -> Dict:
+    """Contact-independent part of a search, shared by all users."""
+    # Only the best scored providers and the facet's size come back from the store
+    with stage('providers_query'):
+        top_providers, total_found = await search_db.top_providers(service_type, location, SEARCH_TOP_K)
+    
+    with stage('aggregate'):
+        return summarize_search(total_found, top_providers)
+
+def summarize_search(total_found: int, top_providers: List[Dict]) -> Dict:
+    """Strengths of the top providers from their stored aggregates, so no reviews are read."""
+    providers = []
+    for provider in top_providers:
+        # Calculate percentages
+        strengths = {
+            key: round((avg / 5) * 100, 1) for key, avg in dimension_averages(provider).items()
+        }
+        
+        providers.append({
+            'id': provider['id'],
+            'name': provider['name'],
+            'service_type': provider['service_type'],
+            'rating': provider['avg_rating'],
+            'score': provider['score'],
+            'total_reviews': provider['total_reviews'],
+            'location': provider['location'],
+            'phone': provider['phone_number'],
+            'strengths': strengths,
+            'top_strength': max(strengths.items(), key=lambda x: x[1]) if strengths else None
+        })
+    
+    return {
+        'total_found': total_found,
+        'providers': providers
+    }
+
 @app.post("/search_services")
 async def search_local_services(request: SearchRequest):
     """Search for local service providers."""
     try:
-        # Search providers in database
-        result = supabase.table('providers').select('*').eq(
-            'service_type', request.service_type.lower()
-        ).eq('location', request.location.lower()).order('avg_rating', desc=True).execute()
-        
-        if not result.data:
-            return {"message": f"No {request.service_type} found in {request.location}"}
-        
-        # Format response
-        providers = []
-        for provider in result.data[:3]:  # Top 3 results
-            
-            # Get reviews for this provider
-            reviews = supabase.table('reviews').select('*').eq(
-                'provider_id', provider['id']
-            ).execute()
-            
-            # Check for contact reviews
-            contact_reviews = []
-            if request.user_contacts:
-                for review in reviews.data:
-                    if review['reviewer_phone'] in request.user_contacts:
-                        contact_reviews.append({
-                            'reviewer_phone': review['reviewer_phone'],
-                            'text': review['review_text'],
-                            'ratings': review['ratings']
-                        })
-            
-            # Calculate rating breakdown
-            rating_breakdown = {'punctuality': [], 'skill_quality': [], 'politeness': [], 'pricing': []}
-            for review in reviews.data:
-                for key, value in review['ratings'].items():
-                    if key in rating_breakdown:
-                        rating_breakdown[key].append(value)
-            
-            # Calculate percentages
-            strengths = {}
-            for key, values in rating_breakdown.items():
-                if values:
-                    avg = sum(values) / len(values)
-                    strengths[key] = round((avg / 5) * 100, 1)
-            
-            provider_info = {
-                'id': provider['id'],
-                'name': provider['name'],
-                'service_type': provider['service_type'],
-                'rating': provider['avg_rating'],
-                'total_reviews': provider['total_reviews'],
-                'location': provider['location'],
-                'phone': provider['phone_number'],
-                'has_contact_reviews': len(contact_reviews) > 0,
-                'contact_reviews': contact_reviews[:2],  # Show max 2
-                'strengths': strengths,
-                'top_strength': max(strengths.items(), key=lambda x: x[1]) if strengths else None
-            }
-            providers.append(provider_info)
+        service_type, location = await resolve_facet(request.service_type, request.location)
+        if request.latitude is not None and request.longitude is not None:
+            radius_km = min(request.radius_km, MAX_RADIUS_KM)
+            with stage('search'):
+                results = await search_flights.do(
+                    ('nearby', service_type, request.latitude, request.longitude, radius_km),
+                    lambda: load_nearby_results(service_type, request.latitude, request.longitude, radius_km)
+                )
+            ranked_by = 'distance'
+        elif request.rank_by != "score" and request.rank_by not in RANKINGS:
+            return {"error": f"rank_by must be one of score, {', '.join(RANKINGS)}"}
+        elif location and request.rank_by != "score" and current_recent_ratings() is not None:
+            recent = current_recent_ratings()
+            key = (service_type, location, request.rank_by)
+            with stage('search'):
+                results = await search_cache.get_or_load(
+                    key, lambda: search_flights.do(
+                        key, lambda: load_ranked_results(service_type, location, request.rank_by, recent)
+                    )
+                )
+            ranked_by = request.rank_by
+        elif location:
+            # Also the fallback for recent rankings until their first build is done
+            key = (service_type, location)
+            with stage('search'):
+                results = await search_cache.get_or_load(
+                    key, lambda: search_flights.do(key, lambda: load_search_results(service_type, location))
+                )
+            ranked_by = 'score'
+        else:
+            return {"error": "Either location or latitude and longitude are required"}
+        
+        contact_reviews = await load_contact_reviews(
+            request.user_contacts or [], request.hashed_contacts or [], [results]
+        )
+        response = format_search(service_type, location or "your area", results, contact_reviews)
+        response['resolved'] = {'service_type': service_type, 'location': location}
+        response['ranked_by'] = ranked_by
+        return response
+        
+    except Exception as e:
+        logger.exception("Search failed")
+        record_error(e)
+        return {"error": str(e), "details": "Database connection or query failed"}
+
+async def resolve_facet(service_type: str, location: str) -> Tuple[str, str]:
+    """Known service type and location closest to what the user typed."""
+    index = await get_facet_index()
+    with stage('resolve'):
+        return index.resolve(normalize(service_type), normalize(location))
+
+async def load_nearby_results(service_type: str, latitude: float, longitude: float, radius_km: float) -> Dict:
+    """Search results for the providers nearest to a point, with their distance."""
+    index = await get_geo_index()
+    with stage('geo_index'):
+        nearest, total_found = index.nearby(service_type, latitude, longitude, radius_km, SEARCH_TOP_K)
+    distances = dict(nearest)
+    results = await load_results_by_ids(list(distances), total_found)
+    for provider in results['providers']:
+        provider['distance_km'] = round(distances[provider['id']], 2)
+    return results
+
+async def load_ranked_results(service_type: str, location: str, ranking: str, recent: RecentRatings) -> Dict:
+    """Search results ranked by recent form ('30d', '90d' or 'decayed') instead of the all-time score."""
+    index = await get_facet_index()
+    with stage('rank'):
+        candidates = index.provider_ids(service_type, location)
+        scores = {pid: recent.score(pid, ranking) for pid in candidates}
+        top_ids = sorted(scores, key=lambda pid: (-scores[pid], pid))[:SEARCH_TOP_K]
+    results = await load_results_by_ids(top_ids, len(candidates))
+    for provider in results['providers']:
+        provider['ranking_score'] = round(scores[provider['id']], 4)
+    return results
+
+async def load_results_by_ids(provider_ids: List[str], total_found: int) -> Dict:
+    """Search results for providers already picked by an in-memory index, in the given order."""
+    with stage('providers_query'):
+        rows = await search_db.get_providers(provider_ids)
+    by_id = {row['id']: row for row in rows}
+    
+    with stage('aggregate'):
+        return summarize_search(total_found, [by_id[pid] for pid in provider_ids if pid in by_id])
+
+async def fetch_contact_reviews(requests: List[Dict[str, List[str]]]) -> List[Dict[str, List[Dict]]]:
+    """Contact reviews for several searches' provider -> phones maps, in one round trip."""
+    union: Dict[str, set] = {}
+    for reviewer_phones in requests:
+        for provider_id, phones in reviewer_phones.items():
+            union.setdefault(provider_id, set()).update(phones)
+    reviews = await search_db.reviews_by_reviewers_many(
+        {provider_id: sorted(phones) for provider_id, phones in union.items()}, None,
+        'provider_id, review_text, ratings, reviewer_phone'
+    )
+    rows = [review for provider_reviews in reviews.values() for review in provider_reviews]
+    return [newest_by_reviewers(rows, reviewer_phones, MAX_SEARCH_CONTACT_REVIEWS) for reviewer_phones in requests]
+
+async def load_contact_reviews(user_contacts: List[str], hashed_contacts: List[str],
+                               results: List[Dict]) -> Dict[str, List[Dict]]:
+    """Reviews by the user's contacts of the top providers of the given search results.
+    
+    Only providers the contact index says a contact reviewed are queried.
+    Searches waiting at the same time share one query.
+    """
+    if not (user_contacts or hashed_contacts):
+        return {}
+    with stage('contacts'):
+        index = await get_contact_index()
+        contact_phones = index.resolve(user_contacts, hashed_contacts)
+        if not contact_phones:
+            return {}
+        matches = index.match(contact_phones, [p['id'] for r in results for p in r['providers']])
+    if not matches:
+        return {}
+    
+    with stage('contact_reviews_query'):
+        reviews = await contact_review_batches.load(
+            {provider_id: list(index.stored_phones(phones)) for provider_id, phones in matches.items()}
+        )
+    return {
+        provider_id: [{
+            'reviewer_phone': review['reviewer_phone'],
+            'text': review['review_text'],
+            'ratings': review['ratings']
+        } for review in provider_reviews]
+        for provider_id, provider_reviews in reviews.items()
+    }
+
+def format_search(service_type: str, location: str, results: Dict, contact_reviews: Dict[str, List[Dict]]) -> Dict:
+    """Response of one search: cached results plus this user's contact reviews."""
+    if not results['total_found']:
+        return {"message": f"No {service_type} found in {location}"}
+    
+    providers = []
+    for provider in results['providers']:
+        reviews = contact_reviews.get(provider['id'], [])
+        providers.append({
+            **provider,
+            'has_contact_reviews': len(reviews) > 0,
+            'contact_reviews': reviews
+        })
+    
+    return {
+        'service_type': service_type,
+        'location': location,
+        'total_found': results['total_found'],
+        'providers': providers
+    }
+
+async def load_search_results_many(keys: List[tuple]) -> Dict[tuple, Dict]:
+    """load_search_results for several facets in one round trip in total."""
+    with stage('providers_query'):
+        top = await search_db.top_providers_many(keys, SEARCH_TOP_K)
+    
+    with stage('aggregate'):
+        return {key: summarize_search(top[key][1], top[key][0]) for key in keys}
+
+@app.post("/batch_search")
+async def batch_search(request: BatchSearchRequest):
+    """Several searches sharing one contact list, answered in one call.
+    
+    Facets missing from the cache are loaded together (one providers
+    query in total) and the contact list is resolved once.
+    """
+    try:
+        if len(request.queries) > MAX_BATCH_QUERIES:
+            return {"error": f"At most {MAX_BATCH_QUERIES} queries per batch"}
+        
+        keys = [await resolve_facet(q.service_type, q.location) for q in request.queries]
+        with stage('search'):
+            results = await search_cache.get_or_load_many(keys, load_search_results_many)
+        
+        contact_reviews = await load_contact_reviews(
+            request.user_contacts or [], request.hashed_contacts or [], list(results.values())
+        )
+        
+        responses = []
+        for service_type, location in keys:
+            response = format_search(service_type, location, results[(service_type, location)], contact_reviews)
+            response['resolved'] = {'service_type': service_type, 'location': location}
+            if request.whatsapp:
+                response['whatsapp_message'] = whatsapp_message(service_type, location, response)
+            responses.append(response)
+        
+        return {'results': responses}
+        
+    except Exception as e:
+        logger.exception("Batch search failed")
+        record_error(e)
+        return {"error": str(e), "details": "Database connection or query failed"}
+
+@app.post("/providers")
+async def add_provider(request: ProviderRequest):
+    """Register a new service provider."""
+    try:
+        if (request.latitude is None) != (request.longitude is None):
+            return {"error": "latitude and longitude must be given together"}
+        
+        provider_data = {
+            'name': request.name,
+            'service_type': normalize(request.service_type),
+            'location': normalize(request.location),
+            'phone_number': request.phone_number
+        }
+        if request.latitude is not None:
+            provider_data.update(latitude=request.latitude, longitude=request.longitude)
+        
+        provider = await db.insert_provider(provider_data)
+        
+        if not provider:
+            return {"error": "Failed to add provider"}
+        
+        if replica is not None:
+            await replica.upsert_providers([provider])
+        index_write(facet_index, provider, facet_index.add_provider)
+        index_write(geo_index, provider, geo_index.add_provider)
+        rating_store_write(providers=[provider])
+        invalidate_search(provider['service_type'], provider['location'])
         
         return {
-            'service_type': request.service_type,
-            'location': request.location,
-            'total_found': len(result.data),
-            'providers': providers
+            "message": "Provider added successfully!",
+            "provider_id": provider['id']
         }
         
     except Exception as e:
-        return {"error": str(e), "details": "Database connection or query failed"}
+        logger.exception("Adding provider failed")
+        record_error(e)
+        return {"error": str(e), "details": "Failed to add provider"}
 
 @app.post("/submit_review")
 async def submit_review(request: ReviewRequest):
@@ -123,7 +573,6 @@ async def submit_review(request: ReviewRequest):
             if not (1 <= value <= 5):
                 return {"error": f"{key} rating must be between 1 and 5"}
         
-        # Insert review
         review_data = {
             'provider_id': request.provider_id,
             'reviewer_phone': request.reviewer_phone,
@@ -131,77 +580,147 @@ async def submit_review(request: ReviewRequest):
             'review_text': request.review_text
         }
         
-        result = supabase.table('reviews').insert(review_data).execute()
+        if review_queue is not None:
+            # Write-behind: a bad provider id would only fail at flush time. The
+            # facet index misses providers added elsewhere since its last
+            # refresh, so a miss is checked against the database
+            index = await get_facet_index()
+            if not index.has_provider(request.provider_id) and not await db.get_provider(request.provider_id, 'id'):
+                return {"error": "Provider not found"}
+            try:
+                review = review_queue.submit(review_data)
+            except ReviewQueueFull as e:
+                return JSONResponse(status_code=503, content={"error": str(e)}, headers={"Retry-After": "1"})
+            return {
+                "message": "Review submitted successfully!",
+                "review_id": review['id'],
+                "provider_id": request.provider_id,
+                "queued": True
+            }
+        
+        # Insert review
+        review = await db.insert_review(review_data)
         
-        if not result.data:
+        if not review:
             return {"error": "Failed to submit review"}
         
-        # Update provider stats
-        await update_provider_stats(request.provider_id)
+        # Update provider stats and drop the now outdated search results
+        provider = await update_provider_stats(request.provider_id, ratings)
+        await on_reviews_written([review], [provider] if provider else [])
         
         return {
             "message": "Review submitted successfully!",
-            "review_id": result.data[0]['id'],
+            "review_id": review['id'],
             "provider_id": request.provider_id
         }
         
     except Exception as e:
+        logger.exception("Submitting review failed")
+        record_error(e)
         return {"error": str(e), "details": "Failed to submit review"}
 
 @app.get("/provider/{provider_id}")
-async def get_provider_details(provider_id: str, contacts: str = ""):
+async def get_provider_details(provider_id: str, contacts: str = "", limit: int = 3, before: Optional[str] = None):
     """Get detailed provider information."""
+    user_contacts = contacts.split(",") if contacts else []
+    return await provider_details(provider_id, user_contacts, [], limit, before)
+
+@app.post("/provider/{provider_id}")
+async def post_provider_details(provider_id: str, request: ContactsRequest,
+                                limit: int = 3, before: Optional[str] = None):
+    """Provider details with the contact list sent in the body (raw or hashed)."""
+    return await provider_details(
+        provider_id, request.contacts or [], request.hashed_contacts or [], limit, before
+    )
+
+def encode_cursor(review: Dict) -> str:
+    return base64.urlsafe_b64encode(json.dumps([review['timestamp'], review['id']]).encode()).decode()
+
+def decode_cursor(cursor: str) -> tuple:
+    """(timestamp, id) of a cursor; both are parsed, as they end up in a query filter."""
+    timestamp, review_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    if not isinstance(timestamp, str) or not isinstance(review_id, str):
+        raise ValueError("Cursor values must be strings")
+    return datetime.fromisoformat(timestamp).isoformat(), str(uuid.UUID(review_id))
+
+async def load_provider_page(provider_id: str, limit: int,
+                             cursor: Optional[tuple]) -> Tuple[Optional[Dict], List[Dict]]:
+    """Provider row and its newest reviews before cursor, limit + 1 of them to tell if there are more."""
+    with stage('provider_query'):
+        provider = await db.get_provider(provider_id, PROVIDER_DETAIL_COLUMNS)
+    if not provider:
+        return None, []
+    
+    with stage('reviews_query'):
+        page = await db.recent_reviews(
+            provider_id, limit + 1, 'id, review_text, ratings, timestamp', before=cursor
+        )
+    return provider, page
+
+async def provider_details(provider_id: str, user_contacts: List[str], hashed_contacts: List[str],
+                           limit: int = 3, before: Optional[str] = None):
+    """Provider details with one page of recent reviews.
+
+    Rows read are bounded by the page size and the contact review cap no
+    matter how many reviews the provider has; strengths and concerns come
+    from the provider's stored aggregates.
+    """
     try:
-        user_contacts = contacts.split(",") if contacts else []
+        limit = max(1, min(limit, MAX_REVIEW_PAGE_SIZE))
+        try:
+            cursor = decode_cursor(before) if before else None
+        except (ValueError, TypeError):
+            return {"error": "Invalid cursor"}
         
-        # Get provider
-        provider_result = supabase.table('providers').select('*').eq('id', provider_id).execute()
-        if not provider_result.data:
-            return {"error": "Provider not found"}
+        # Contacts of this user that reviewed the provider
+        contact_phones = set()
+        if user_contacts or hashed_contacts:
+            with stage('contacts'):
+                index = await get_contact_index()
+                contact_phones = index.match(
+                    index.resolve(user_contacts, hashed_contacts), [provider_id]
+                ).get(provider_id, set())
         
-        provider = provider_result.data[0]
+        # Provider and one page of reviews, shared with identical requests in flight
+        with stage('provider'):
+            provider, page = await provider_flights.do(
+                (provider_id, limit, cursor), lambda: load_provider_page(provider_id, limit, cursor)
+            )
+        if not provider:
+            return {"error": "Provider not found"}
+        recent = current_recent_ratings()
         
-        # Get reviews
-        reviews_result = supabase.table('reviews').select('*').eq('provider_id', provider_id).execute()
-        reviews = reviews_result.data
+        recent_reviews = [{
+            'text': review['review_text'],
+            'ratings': review['ratings'],
+            'timestamp': review['timestamp']
+        } for review in page[:limit]]
+        next_cursor = encode_cursor(page[limit - 1]) if len(page) > limit else None
         
-        # Analyze reviews
+        # Contact reviews
         contact_reviews = []
-        all_ratings = {'punctuality': [], 'skill_quality': [], 'politeness': [], 'pricing': []}
-        recent_reviews = []
-        
-        for review in reviews:
-            # Contact reviews
-            if review['reviewer_phone'] in user_contacts:
+        if contact_phones:
+            with stage('contact_reviews_query'):
+                reviews = await db.reviews_by_reviewers(
+                    provider_id, list(contact_index.stored_phones(contact_phones)), MAX_CONTACT_REVIEWS,
+                    'review_text, ratings, reviewer_phone'
+                )
+            for review in reviews:
                 contact_reviews.append({
                     'text': review['review_text'],
                     'ratings': review['ratings'],
                     'phone': review['reviewer_phone'][-4:]  # Last 4 digits for privacy
                 })
-            
-            # All ratings for analysis
-            for key, value in review['ratings'].items():
-                if key in all_ratings:
-                    all_ratings[key].append(value)
-            
-            # Recent reviews
-            recent_reviews.append({
-                'text': review['review_text'],
-                'ratings': review['ratings'],
-                'timestamp': review['timestamp']
-            })
         
         # Calculate strengths and concerns
         strengths = {}
         concerns = {}
-        for key, values in all_ratings.items():
-            if values:
-                avg = sum(values) / len(values)
-                percentage = round((avg / 5) * 100, 1)
-                if percentage >= 80:
-                    strengths[key.replace('_', ' ').title()] = percentage
-                elif percentage <= 60:
-                    concerns[key.replace('_', ' ').title()] = percentage
+        for key, avg in dimension_averages(provider).items():
+            percentage = round((avg / 5) * 100, 1)
+            if percentage >= 80:
+                strengths[key.replace('_', ' ').title()] = percentage
+            elif percentage <= 60:
+                concerns[key.replace('_', ' ').title()] = percentage
         
         return {
             'provider': {
@@ -216,9 +735,11 @@ async def get_provider_details(provider_id: str, contacts: str = ""):
             'contact_reviews': contact_reviews,
             'strengths': strengths,
             'concerns': concerns,
-            'recent_reviews': recent_reviews[-3:],  # Last 3 reviews
+            'recent_form': recent.stats(provider_id) if recent else None,  # Last 30/90 days and time-decayed
+            'recent_reviews': recent_reviews,  # Newest first
+            'next_cursor': next_cursor,  # Pass as ?before= for older reviews
             'summary': {
-                'total_reviews': len(reviews),
+                'total_reviews': provider['total_reviews'],
                 'has_contact_reviews': len(contact_reviews) > 0,
                 'top_strength': max(strengths.items(), key=lambda x: x[1]) if strengths else None,
                 'main_concern': max(concerns.items(), key=lambda x: x[1]) if concerns else None
@@ -226,49 +747,288 @@ async def get_provider_details(provider_id: str, contacts: str = ""):
         }
         
     except Exception as e:
+        logger.exception("Provider details failed")
+        record_error(e)
         return {"error": str(e), "details": "Failed to get provider details"}
 
+@app.get("/cache_stats")
+async def get_cache_stats():
+    """Hit/miss counters of the search results cache and executed/coalesced/batched DB fetches."""
+    return {
+        'search': search_cache.stats(),
+        'singleflight': {'search': search_flights.stats(), 'provider': provider_flights.stats()},
+        'batches': {'contact_reviews': contact_review_batches.stats()}
+    }
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Request, stage and DB call metrics in the Prometheus text format."""
+    return PlainTextResponse(expose(), media_type="text/plain; version=0.0.4")
+
+@app.get("/ingest_stats")
+async def get_ingest_stats():
+    """Queue depth and flush latency of the write-behind review queue."""
+    if review_queue is None:
+        return {'mode': REVIEW_INGEST_MODE}
+    return {'mode': REVIEW_INGEST_MODE, **review_queue.stats()}
+
+@app.get("/analytics")
+async def get_analytics(service_type: str = "", location: str = "", days: Optional[int] = None,
+                        top: int = 10, facets: int = 20):
+    """Per-facet leaderboards and per-dimension percentiles and histograms of ratings.
+    
+    Optionally narrowed to a service type and/or location and to the
+    reviews of the last `days` days; leaderboards cover the `facets`
+    facets with the most matching reviews.
+    """
+    try:
+        if service_type or location:
+            service_type, location = await resolve_facet(service_type, location)
+        store = current_rating_store()
+        if store is None:
+            return JSONResponse(status_code=503, content={"error": "Analytics are still being prepared"},
+                                headers={"Retry-After": "5"})
+        with stage('analytics'):
+            result = store.analytics(
+                service_type or None,
+                location or None,
+                since=int(time.time()) - days * 86400 if days else None,
+                top=max(1, min(top, MAX_LEADERBOARD_SIZE)),
+                max_facets=max(1, min(facets, MAX_LEADERBOARD_FACETS))
+            )
+        return {
+            'filters': {'service_type': service_type or None, 'location': location or None, 'days': days},
+            **result,
+            'snapshot_age_seconds': round(time.monotonic() - store.built_at, 1)
+        }
+        
+    except Exception as e:
+        logger.exception("Analytics failed")
+        record_error(e)
+        return {"error": str(e)}
+
+@app.get("/export/{table}")
+async def export_table(table: str, gzip: bool = False, page_size: int = 1000,
+                       authorization: Optional[str] = Header(None)):
+    """Stream providers or reviews as NDJSON (gzip-compressed with ?gzip=true).
+    
+    Pages are read with keyset pagination and sent as they arrive, so
+    memory use does not grow with the table. Rows/sec is logged when done.
+    """
+    if not EXPORT_TOKEN:
+        return JSONResponse(status_code=403, content={"error": "Export is disabled"})
+    if not hmac.compare_digest((authorization or "").encode(), f"Bearer {EXPORT_TOKEN}".encode()):
+        return JSONResponse(status_code=401, content={"error": "Invalid export token"})
+    if table not in TABLE_MODELS:
+        return JSONResponse(status_code=404, content={"error": f"Unknown table: {table}"})
+    
+    filename = f"{table}.ndjson" + (".gz" if gzip else "")
+    return StreamingResponse(
+        export_ndjson(db, table, max(1, min(page_size, MAX_EXPORT_PAGE_SIZE)), compress=gzip),
+        media_type="application/gzip" if gzip else "application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
 @app.get("/services")
 async def get_available_services():
     """Get list of available service types and locations."""
     try:
-        # Get unique service types
-        services_result = supabase.table('providers').select('service_type').execute()
-        service_types = list(set([p['service_type'] for p in services_result.data]))
-        
-        # Get unique locations
-        locations_result = supabase.table('providers').select('location').execute()
-        locations = list(set([p['location'] for p in locations_result.data]))
-        
-        return {
-            'service_types': service_types,
-            'locations': locations,
-            'total_providers': len(services_result.data)
-        }
+        index = await get_facet_index()
+        return index.snapshot()
         
     except Exception as e:
+        logger.exception("Listing services failed")
+        record_error(e)
         return {"error": str(e)}
 
-async def update_provider_stats(provider_id: str):
-    """Update provider's average rating and review count."""
+def refresh_in_background(name: str, rebuild) -> asyncio.Task:
+    """Run rebuild() as a background task unless one under this name is still running."""
+    task = index_refreshes.get(name)
+    if task is None or task.done():
+        task = index_refreshes[name] = asyncio.get_running_loop().create_task(rebuild())
+        task.add_done_callback(log_refresh_failure)
+    return task
+
+def log_refresh_failure(task: asyncio.Task):
+    if not task.cancelled() and task.exception() is not None:
+        logger.error("Background index rebuild failed", exc_info=task.exception())
+
+# Rows written while an index is rebuilt from a scan, per index; replayed into
+# the rebuilt index since the scan may have missed them
+_index_writes: Dict[object, List[Dict]] = {}
+
+def index_write(index, row: Dict, apply: Callable[[Dict], None]):
+    """Apply a newly written row to an index, and record it for a rebuild in progress."""
+    if index.built:
+        apply(row)
+    writes = _index_writes.get(index)
+    if writes is not None:
+        writes.append(row)
+
+async def refresh_index(index, lock: asyncio.Lock, max_age: float, table: str, columns: str,
+                        apply: Callable[[Dict], None]):
+    """An in-memory index built from a table scan, rebuilt in the background once older than max_age.
+    
+    The stale index keeps serving until the rebuild swaps in, so only a
+    request arriving before the first build (started by prepare()) waits
+    for a scan. Rows written through index_write during the scan are
+    applied to the rebuilt index with ``apply``.
+    """
+    def fresh():
+        return index.built and time.monotonic() - index.built_at < max_age
+    
+    async def rebuild():
+        async with lock:
+            if not fresh():
+                writes = _index_writes[index] = []
+                try:
+                    rows = []
+                    async for page in search_db.scan(table, columns):
+                        rows.extend(page)
+                    index.build(rows)
+                    for row in writes:
+                        apply(row)
+                finally:
+                    del _index_writes[index]
+    
+    if not index.built:
+        await rebuild()
+    elif not fresh():
+        refresh_in_background(f"{table}: {columns}", rebuild)
+    return index
+
+def add_contact_review(review: Dict):
+    contact_index.add_review(review['provider_id'], review['reviewer_phone'])
+
+async def get_facet_index() -> FacetIndex:
+    """The facet index, built on first use and refreshed every FACETS_REFRESH_SECONDS."""
+    return await refresh_index(
+        facet_index, _facets_lock, FACETS_REFRESH_SECONDS, 'providers', 'id, service_type, location',
+        facet_index.add_provider
+    )
+
+async def get_geo_index() -> GridIndex:
+    """The spatial index, built on first use and refreshed every GEO_INDEX_REFRESH_SECONDS."""
+    return await refresh_index(
+        geo_index, _geo_lock, GEO_INDEX_REFRESH_SECONDS, 'providers', 'id, service_type, latitude, longitude',
+        geo_index.add_provider
+    )
+
+async def get_contact_index() -> ContactIndex:
+    """The contact index, built on first use and refreshed every CONTACT_INDEX_REFRESH_SECONDS."""
+    return await refresh_index(
+        contact_index, _contacts_lock, CONTACT_INDEX_REFRESH_SECONDS, 'reviews', 'id, provider_id, reviewer_phone',
+        add_contact_review
+    )
+
+def current_recent_ratings() -> Optional[RecentRatings]:
+    """The recent rating aggregates, or None until first built.
+    
+    Never waits for a scan: a missing or stale copy only starts a
+    background rebuild, and the stale one keeps serving meanwhile.
+    """
+    if not recent_ratings.built or time.monotonic() - recent_ratings.built_at >= RECENT_RATINGS_REFRESH_SECONDS:
+        refresh_in_background('recent_ratings', rebuild_recent_ratings)
+    return recent_ratings if recent_ratings.built else None
+
+async def rebuild_recent_ratings():
+    """Stream the reviews table into new aggregates and swap them in.
+    
+    Reviews written during the scan go to the current aggregates as usual
+    and are also recorded, so the ones the scan missed are replayed into
+    the new aggregates before the swap.
+    """
+    global recent_ratings, _recent_written
+    rebuilt = RecentRatings(half_life_days=DECAY_HALF_LIFE_DAYS)
+    _recent_written = {}
     try:
-        reviews = supabase.table('reviews').select('ratings').eq('provider_id', provider_id).execute()
-        
-        if reviews.data:
-            total_ratings = []
-            for review in reviews.data:
-                avg_rating = sum(review['ratings'].values()) / len(review['ratings'])
-                total_ratings.append(avg_rating)
-            
-            new_avg = sum(total_ratings) / len(total_ratings)
-            
-            supabase.table('providers').update({
-                'avg_rating': round(new_avg, 1),
-                'total_reviews': len(reviews.data)
-            }).eq('id', provider_id).execute()
-            
+        async for page in search_db.scan('reviews', 'id, provider_id, ratings, timestamp'):
+            for review in page:
+                _recent_written.pop(review['id'], None)
+                rebuilt.add_review(review)
+        for review in _recent_written.values():
+            rebuilt.add_review(review)
+    finally:
+        _recent_written = None
+    rebuilt.mark_built()
+    recent_ratings = rebuilt
+
+def current_rating_store():
+    """The rating snapshot, or None until first built.
+    
+    Like current_recent_ratings, never waits for a scan: a missing or
+    stale snapshot only starts a background rebuild.
+    """
+    if rating_store is None or time.monotonic() - rating_store.built_at >= RATING_STORE_REFRESH_SECONDS:
+        refresh_in_background('rating_store', rebuild_rating_store)
+    return rating_store
+
+async def rebuild_rating_store():
+    """Stream the providers and reviews tables into a new snapshot and swap it in.
+    
+    Providers and reviews written during the scans are recorded and
+    replayed into the new snapshot, as in rebuild_recent_ratings.
+    """
+    global rating_store, _ratings_written
+    from ratings import RatingStore
+    store = RatingStore()
+    _ratings_written = {'providers': {}, 'reviews': {}}
+    try:
+        async for page in search_db.scan('providers', 'id, name, service_type, location'):
+            store.add_providers(page)
+        async for page in search_db.scan('reviews', 'id, provider_id, ratings, timestamp'):
+            # Providers added since the providers scan, so their reviews are not skipped
+            store.add_providers(_ratings_written['providers'].values())
+            for review in page:
+                _ratings_written['reviews'].pop(review['id'], None)
+            store.add_reviews(page)
+        store.add_providers(_ratings_written['providers'].values())
+        store.add_reviews(_ratings_written['reviews'].values())
+    finally:
+        _ratings_written = None
+    store.mark_built()
+    rating_store = store
+
+def rating_store_write(providers: List[Dict] = (), reviews: List[Dict] = ()):
+    """Apply newly written rows to the rating snapshot, and record them for a rebuild in progress."""
+    if rating_store is not None:
+        rating_store.add_providers(providers)
+        rating_store.add_reviews(reviews)
+    if _ratings_written is not None:
+        _ratings_written['providers'].update((provider['id'], provider) for provider in providers)
+        _ratings_written['reviews'].update((review['id'], review) for review in reviews)
+
+async def on_reviews_written(reviews: List[Dict], providers: List[Dict]):
+    """Keep the replica, in-memory indexes and caches in step with newly stored reviews."""
+    if replica is not None:
+        await replica.upsert_providers(providers)
+        await replica.insert_reviews(reviews)
+    for provider in providers:
+        invalidate_search(provider['service_type'], provider['location'])
+    for review in reviews:
+        index_write(contact_index, review, add_contact_review)
+    rating_store_write(reviews=reviews)
+    if recent_ratings.built:
+        for review in reviews:
+            recent_ratings.add_review(review)
+    if _recent_written is not None:
+        _recent_written.update((review['id'], review) for review in reviews)
+
+def invalidate_search(service_type: str, location: str):
+    """Drop the cached results of a facet under every ranking."""
+    search_cache.invalidate((service_type, location))
+    for ranking in RANKINGS:
+        search_cache.invalidate((service_type, location, ranking))
+
+async def update_provider_stats(provider_id: str, ratings: Dict[str, int]) -> Optional[Dict]:
+    """Apply one review to the provider's running rating aggregates."""
+    try:
+        return await db.increment_provider_stats(provider_id, review_delta(ratings))
+        
     except Exception as e:
-        print(f"Error updating provider stats: {e}")
+        logger.exception("Error updating stats of provider %s", provider_id)
+        record_error(e)
+        return None
 
 # WhatsApp-style formatted responses
 @app.post("/whatsapp_search")
@@ -276,34 +1036,44 @@ async def whatsapp_search_format(request: SearchRequest):
     """Search with WhatsApp-friendly response format."""
     try:
         search_result = await search_local_services(request)
+        resolved = search_result.get('resolved', {})
+        return {"whatsapp_message": whatsapp_message(
+            resolved.get('service_type', request.service_type),
+            resolved.get('location') or request.location or "your area",
+            search_result
+        )}
         
-        if 'error' in search_result:
-            return {"whatsapp_message": f"❌ {search_result['error']}"}
-        
-        if 'message' in search_result:  # No providers found
-            return {"whatsapp_message": f"🔍 {search_result['message']}\n\nWould you like to add a new {request.service_type}?"}
-        
-        # Format for WhatsApp
-        message = f"🔍 **{request.service_type.title()} in {request.location.title()}**\n\n"
+    except Exception as e:
+        logger.exception("WhatsApp search failed")
+        record_error(e)
+        return {"whatsapp_message": f"❌ Sorry, search failed: {str(e)}"}
+
+def whatsapp_message(service_type: str, location: str, search_result: Dict) -> str:
+    """A search response formatted as a WhatsApp message."""
+    if 'error' in search_result:
+        return f"❌ {search_result['error']}"
+    
+    if 'message' in search_result:  # No providers found
+        return f"🔍 {search_result['message']}\n\nWould you like to add a new {service_type}?"
+    
+    # Format for WhatsApp
+    message = f"🔍 **{service_type.title()} in {location.title()}**\n\n"
+    
+    for i, provider in enumerate(search_result['providers'], 1):
+        message += f"**{i}. {provider['name']}** ⭐ {provider['rating']}/5\n"
+        message += f"📍 {provider['location']} | 📞 {provider['phone']}\n"
         
-        for i, provider in enumerate(search_result['providers'], 1):
-            message += f"**{i}. {provider['name']}** ⭐ {provider['rating']}/5\n"
-            message += f"📍 {provider['location']} | 📞 {provider['phone']}\n"
-            
-            if provider['has_contact_reviews']:
-                message += f"👥 **From your contacts:** {len(provider['contact_reviews'])} review(s)\n"
-                message += f"💭 *\"{provider['contact_reviews'][0]['text'][:50]}...\"*\n"
-            
-            if provider['top_strength']:
-                strength_name, strength_pct = provider['top_strength']
-                message += f"✅ **Strong in:** {strength_name.replace('_', ' ').title()} ({strength_pct}%)\n"
-            
-            message += f"📱 **View Details:** /provider_{provider['id']}\n\n"
+        if provider['has_contact_reviews']:
+            message += f"👥 **From your contacts:** {len(provider['contact_reviews'])} review(s)\n"
+            message += f"💭 *\"{provider['contact_reviews'][0]['text'][:50]}...\"*\n"
         
-        return {"whatsapp_message": message}
+        if provider['top_strength']:
+            strength_name, strength_pct = provider['top_strength']
+            message += f"✅ **Strong in:** {strength_name.replace('_', ' ').title()} ({strength_pct}%)\n"
         
-    except Exception as e:
-        return {"whatsapp_message": f"❌ Sorry, search failed: {str(e)}"}
+        message += f"📱 **View Details:** /provider_{provider['id']}\n\n"
+    
+    return message
 
 if __name__ == "__main__":
     import uvicorn
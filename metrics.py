@@ -0,0 +1,216 @@
+"""Request tracing and Prometheus metrics.
+
+``MetricsMiddleware`` opens a ``RequestTrace`` per HTTP request and keeps
+it in a context variable. ``Repository.run`` charges every DB round trip
+to it and ``stage`` times named sections of a handler, so each request
+ends with its latency, DB calls, rows fetched and a per-stage breakdown.
+Requests slower than SLOW_REQUEST_SECONDS are logged as one JSON line.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger("puch.requests")
+
+SLOW_REQUEST_SECONDS = float(os.getenv("SLOW_REQUEST_SECONDS", "0.5"))
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _format_labels(labels: Labels, extra: str = '') -> str:
+    parts = [f'{name}="{value}"' for name, value in labels]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help_text = help_text
+        self._values: Dict[Labels, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def expose(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(labels)} {value:g}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts..., +Inf count, sum]
+        self._values: Dict[Labels, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            row = self._values.get(key)
+            if row is None:
+                row = self._values[key] = [0] * (len(self.buckets) + 2)
+            row[bisect_left(self.buckets, value)] += 1
+            row[-1] += value
+
+    def expose(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, row in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float('inf'),), row):
+                    cumulative += count
+                    le = 'le="%s"' % ('+Inf' if bound == float('inf') else f'{bound:g}')
+                    lines.append(f"{self.name}_bucket{_format_labels(labels, le)} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(labels)} {row[-1]:g}")
+                lines.append(f"{self.name}_count{_format_labels(labels)} {cumulative}")
+        return lines
+
+
+REQUESTS = Counter("http_requests_total", "HTTP requests by endpoint and status code.")
+ERRORS = Counter("app_errors_total", "Requests answered with an error body, by endpoint.")
+REQUEST_SECONDS = Histogram("http_request_duration_seconds", "HTTP request latency.")
+REQUEST_DB_CALLS = Histogram("http_request_db_round_trips", "DB round trips per request.", COUNT_BUCKETS)
+DB_ROWS = Counter("db_rows_fetched_total", "Rows returned by DB calls, by endpoint.")
+DB_SECONDS = Histogram("db_call_duration_seconds", "Latency of single DB round trips.")
+STAGE_SECONDS = Histogram("request_stage_duration_seconds", "Time per request spent in named stages.")
+REGISTRY = [REQUESTS, ERRORS, REQUEST_SECONDS, REQUEST_DB_CALLS, DB_ROWS, DB_SECONDS, STAGE_SECONDS]
+
+
+class RequestTrace:
+    """What one request spent its time on."""
+
+    def __init__(self, method: str, path: str):
+        self.method = method
+        self.path = path
+        self.endpoint = path
+        self.start = time.perf_counter()
+        self.db_calls = 0
+        self.db_rows = 0
+        self.db_seconds = 0.0
+        self.stages: Dict[str, float] = {}
+        self.error: Optional[str] = None
+
+    def as_log(self, status: int, seconds: float) -> Dict:
+        return {
+            'method': self.method,
+            'endpoint': self.endpoint,
+            'path': self.path,
+            'status': status,
+            'duration_ms': round(seconds * 1000, 2),
+            'db_calls': self.db_calls,
+            'db_rows': self.db_rows,
+            'db_ms': round(self.db_seconds * 1000, 2),
+            'stages_ms': {name: round(value * 1000, 2) for name, value in self.stages.items()},
+            'error': self.error
+        }
+
+
+_current: ContextVar[Optional[RequestTrace]] = ContextVar("request_trace", default=None)
+
+
+def current_trace() -> Optional[RequestTrace]:
+    return _current.get()
+
+
+def record_db_call(seconds: float, rows: int):
+    """Charge one DB round trip to the current request, if any."""
+    DB_SECONDS.observe(seconds)
+    trace = _current.get()
+    if trace is not None:
+        trace.db_calls += 1
+        trace.db_rows += rows
+        trace.db_seconds += seconds
+
+
+def record_error(error: Exception):
+    """Note that the current request failed even though it answers 200."""
+    trace = _current.get()
+    if trace is not None:
+        trace.error = f"{type(error).__name__}: {error}"
+
+
+@contextmanager
+def stage(name: str):
+    """Time a named section of the current request."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace = _current.get()
+        if trace is not None:
+            trace.stages[name] = trace.stages.get(name, 0.0) + time.perf_counter() - start
+
+
+def expose() -> str:
+    """All metrics in the Prometheus text format."""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.expose())
+    return '\n'.join(lines) + '\n'
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording a RequestTrace for every HTTP request."""
+
+    def __init__(self, app):
+        self.app = app
+        self._route_paths: Optional[Dict] = None
+
+    def _endpoint(self, scope) -> str:
+        """Route template of the matched endpoint, e.g. /provider/{provider_id}."""
+        if self._route_paths is None:
+            self._route_paths = {
+                getattr(route, 'endpoint', None): route.path for route in scope['app'].routes
+            }
+        return self._route_paths.get(scope.get('endpoint'), 'unmatched')
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+
+        trace = RequestTrace(scope['method'], scope['path'])
+        token = _current.set(trace)
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            elapsed = time.perf_counter() - trace.start
+            trace.endpoint = self._endpoint(scope)
+            REQUESTS.inc(endpoint=trace.endpoint, method=trace.method, status=str(status))
+            REQUEST_SECONDS.observe(elapsed, endpoint=trace.endpoint)
+            REQUEST_DB_CALLS.observe(trace.db_calls, endpoint=trace.endpoint)
+            for name, seconds in trace.stages.items():
+                STAGE_SECONDS.observe(seconds, endpoint=trace.endpoint, stage=name)
+            if trace.db_rows:
+                DB_ROWS.inc(trace.db_rows, endpoint=trace.endpoint)
+            if trace.error:
+                ERRORS.inc(endpoint=trace.endpoint)
+            if elapsed >= SLOW_REQUEST_SECONDS:
+                logger.warning("slow request %s", json.dumps(trace.as_log(status, elapsed)))
@@ -0,0 +1,78 @@
+-- Running rating aggregates on providers, maintained by increment_provider_stats.
+
+alter table providers
+    add column if not exists rating_sum double precision not null default 0,
+    add column if not exists punctuality_sum integer not null default 0,
+    add column if not exists punctuality_count integer not null default 0,
+    add column if not exists skill_quality_sum integer not null default 0,
+    add column if not exists skill_quality_count integer not null default 0,
+    add column if not exists politeness_sum integer not null default 0,
+    add column if not exists politeness_count integer not null default 0,
+    add column if not exists pricing_sum integer not null default 0,
+    add column if not exists pricing_count integer not null default 0;
+
+-- Applies a (possibly coalesced) delta in one atomic row update.
+create or replace function increment_provider_stats(
+    p_provider_id uuid,
+    p_total_reviews integer,
+    p_rating_sum double precision,
+    p_punctuality_sum integer,
+    p_punctuality_count integer,
+    p_skill_quality_sum integer,
+    p_skill_quality_count integer,
+    p_politeness_sum integer,
+    p_politeness_count integer,
+    p_pricing_sum integer,
+    p_pricing_count integer
+) returns setof providers
+language sql
+as $$
+    update providers set
+        total_reviews = total_reviews + p_total_reviews,
+        rating_sum = rating_sum + p_rating_sum,
+        punctuality_sum = punctuality_sum + p_punctuality_sum,
+        punctuality_count = punctuality_count + p_punctuality_count,
+        skill_quality_sum = skill_quality_sum + p_skill_quality_sum,
+        skill_quality_count = skill_quality_count + p_skill_quality_count,
+        politeness_sum = politeness_sum + p_politeness_sum,
+        politeness_count = politeness_count + p_politeness_count,
+        pricing_sum = pricing_sum + p_pricing_sum,
+        pricing_count = pricing_count + p_pricing_count,
+        avg_rating = coalesce(round(
+            ((rating_sum + p_rating_sum) / nullif(total_reviews + p_total_reviews, 0))::numeric, 1
+        ), 0)
+    where id = p_provider_id
+    returning *;
+$$;
+
+-- Backfill from existing reviews (same result as `python update_stats.py`).
+with review_stats as (
+    select
+        provider_id,
+        count(*) as total_reviews,
+        sum((select avg(value::numeric) from jsonb_each_text(ratings))) as rating_sum,
+        coalesce(sum((ratings->>'punctuality')::int), 0) as punctuality_sum,
+        count(ratings->'punctuality') as punctuality_count,
+        coalesce(sum((ratings->>'skill_quality')::int), 0) as skill_quality_sum,
+        count(ratings->'skill_quality') as skill_quality_count,
+        coalesce(sum((ratings->>'politeness')::int), 0) as politeness_sum,
+        count(ratings->'politeness') as politeness_count,
+        coalesce(sum((ratings->>'pricing')::int), 0) as pricing_sum,
+        count(ratings->'pricing') as pricing_count
+    from reviews
+    group by provider_id
+)
+update providers p set
+    total_reviews = s.total_reviews,
+    rating_sum = s.rating_sum,
+    punctuality_sum = s.punctuality_sum,
+    punctuality_count = s.punctuality_count,
+    skill_quality_sum = s.skill_quality_sum,
+    skill_quality_count = s.skill_quality_count,
+    politeness_sum = s.politeness_sum,
+    politeness_count = s.politeness_count,
+    pricing_sum = s.pricing_sum,
+    pricing_count = s.pricing_count,
+    avg_rating = round((s.rating_sum / s.total_reviews)::numeric, 1)
+from review_stats s
+where s.provider_id = p.id;
@@ -0,0 +1,9 @@
+-- Ordered, bounded review reads for /provider/{id}.
+
+-- Newest-first pages with a (timestamp, id) keyset cursor
+create index if not exists reviews_provider_timestamp_idx
+    on reviews (provider_id, "timestamp" desc, id desc);
+
+-- Contact reviews of one provider
+create index if not exists reviews_provider_reviewer_idx
+    on reviews (provider_id, reviewer_phone);
@@ -0,0 +1,17 @@
+-- Pending-review queue for the insights worker (ai_processor.py).
+
+create table if not exists ai_insights (
+    provider_id uuid primary key references providers (id),
+    top_praise jsonb not null default '{}',
+    top_concerns jsonb not null default '{}',
+    emerging_mentions jsonb not null default '{}'
+);
+
+-- Bulk upserts conflict on provider_id
+create unique index if not exists ai_insights_provider_idx on ai_insights (provider_id);
+
+alter table reviews
+    add column if not exists insights_processed boolean not null default false;
+
+create index if not exists reviews_insights_pending_idx
+    on reviews (id) where not insights_processed;
@@ -0,0 +1,3 @@
+-- Facet search: providers of one (service_type, location), best rated first
+create index if not exists providers_search_idx
+    on providers (service_type, location, avg_rating desc);
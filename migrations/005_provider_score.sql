@@ -0,0 +1,69 @@
+-- Confidence-weighted ranking score (Bayesian average), maintained with the
+-- other aggregates. Prior: 10 virtual reviews at 3.5 (stats.SCORE_PRIOR_*).
+
+alter table providers
+    add column if not exists score double precision not null default 3.5;
+
+update providers set score = round(((35 + rating_sum) / (10 + total_reviews))::numeric, 4);
+
+-- Top-k per facet straight off the index
+create index if not exists providers_score_idx
+    on providers (service_type, location, score desc, id);
+
+create or replace function increment_provider_stats(
+    p_provider_id uuid,
+    p_total_reviews integer,
+    p_rating_sum double precision,
+    p_punctuality_sum integer,
+    p_punctuality_count integer,
+    p_skill_quality_sum integer,
+    p_skill_quality_count integer,
+    p_politeness_sum integer,
+    p_politeness_count integer,
+    p_pricing_sum integer,
+    p_pricing_count integer
+) returns setof providers
+language sql
+as $$
+    update providers set
+        total_reviews = total_reviews + p_total_reviews,
+        rating_sum = rating_sum + p_rating_sum,
+        punctuality_sum = punctuality_sum + p_punctuality_sum,
+        punctuality_count = punctuality_count + p_punctuality_count,
+        skill_quality_sum = skill_quality_sum + p_skill_quality_sum,
+        skill_quality_count = skill_quality_count + p_skill_quality_count,
+        politeness_sum = politeness_sum + p_politeness_sum,
+        politeness_count = politeness_count + p_politeness_count,
+        pricing_sum = pricing_sum + p_pricing_sum,
+        pricing_count = pricing_count + p_pricing_count,
+        avg_rating = coalesce(round(
+            ((rating_sum + p_rating_sum) / nullif(total_reviews + p_total_reviews, 0))::numeric, 1
+        ), 0),
+        score = round(((35 + rating_sum + p_rating_sum) / (10 + total_reviews + p_total_reviews))::numeric, 4)
+    where id = p_provider_id
+    returning *;
+$$;
+
+-- Top p_limit providers of each (p_service_types[i], p_locations[i]) facet,
+-- each row carrying its facet's total as facet_total
+create or replace function top_providers(
+    p_service_types text[],
+    p_locations text[],
+    p_limit integer
+) returns setof jsonb
+language sql
+stable
+as $$
+    select to_jsonb(ranked) - 'rank'
+    from (
+        select
+            p.*,
+            row_number() over (partition by p.service_type, p.location order by p.score desc, p.id) as rank,
+            count(*) over (partition by p.service_type, p.location) as facet_total
+        from providers p
+        join unnest(p_service_types, p_locations) as f(service_type, location)
+            on p.service_type = f.service_type and p.location = f.location
+    ) ranked
+    where rank <= p_limit
+    order by service_type, location, rank;
+$$;
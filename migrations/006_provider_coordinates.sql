@@ -0,0 +1,6 @@
+-- Provider coordinates for proximity search. The spatial index lives in the
+-- API process (geo.GridIndex); the database only stores the points.
+
+alter table providers
+    add column if not exists latitude double precision,
+    add column if not exists longitude double precision;
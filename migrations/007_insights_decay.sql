@@ -0,0 +1,12 @@
+-- Time-based decay of ai_insights.emerging_mentions (ai_processor.py).
+-- The stored mentions are decayed to mentions_as_of, the time of the newest
+-- review folded into them; rows written before this migration have none
+-- and are taken as current when next updated.
+
+alter table ai_insights
+    add column if not exists mentions_as_of timestamptz;
+
+-- The worker takes pending reviews oldest first
+create index if not exists reviews_insights_pending_time_idx
+    on reviews (timestamp, id) where not insights_processed;
+drop index if exists reviews_insights_pending_idx;
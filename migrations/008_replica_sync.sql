@@ -0,0 +1,25 @@
+-- Incremental replica sync (sqlite_db.ReplicaSync): providers changed since
+-- the last sync are found by updated_at, new reviews by timestamp.
+
+alter table providers
+    add column if not exists updated_at timestamptz not null default now();
+
+create or replace function touch_updated_at() returns trigger
+language plpgsql
+as $$
+begin
+    new.updated_at = now();
+    return new;
+end;
+$$;
+
+-- Covers edits, upserts and increment_provider_stats alike
+drop trigger if exists providers_touch_updated_at on providers;
+create trigger providers_touch_updated_at
+    before update on providers
+    for each row execute function touch_updated_at();
+
+create index if not exists providers_updated_at_idx
+    on providers (updated_at, id);
+create index if not exists reviews_timestamp_idx
+    on reviews (timestamp, id);
@@ -9,6 +9,8 @@ class Provider(BaseModel):
     service_type: str
     location: str
     phone_number: Optional[str]
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
     avg_rating: float
     total_reviews: int
 
@@ -23,3 +25,4 @@ class AIInsight(BaseModel):
     top_praise: Dict[str, float]
     top_concerns: Dict[str, float]
     emerging_mentions: Dict[str, float]
+    mentions_as_of: Optional[datetime] = None  # Time emerging_mentions are decayed to
@@ -0,0 +1,197 @@
+"""Columnar in-memory snapshot of review ratings for analytics.
+
+Every review is a row across a few NumPy columns: the index of its
+provider, the four ratings as int8 (0 where a dimension was not rated),
+its overall rating and its time in epoch seconds. Leaderboards,
+percentiles and histograms are then a handful of vectorized passes
+instead of a Python loop over review dicts, and stay in the milliseconds
+for millions of reviews. Columns grow by doubling, so appending newly written reviews
+is cheap and the snapshot is kept current between full rebuilds.
+"""
+import math
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from stats import RATING_KEYS, SCORE_PRIOR_MEAN, SCORE_PRIOR_REVIEWS, epoch_seconds, review_average
+
+FacetKey = Tuple[str, str]
+
+PERCENTILES = (10, 25, 50, 75, 90)
+
+
+class RatingStore:
+    """Reviews as columns, with providers and their facets as small lookup tables.
+
+    Fill it with ``add_providers`` and then ``add_reviews`` page by page;
+    reviews of providers it does not know are skipped (and counted) until
+    the next rebuild.
+    """
+
+    def __init__(self, capacity: int = 4096):
+        self.providers: List[Dict] = []  # id, name, service_type, location by provider index
+        self.facets: List[FacetKey] = []
+        self._provider_index: Dict[str, int] = {}
+        self._facet_index: Dict[FacetKey, int] = {}
+        self._provider_facet = np.empty(256, dtype=np.int32)
+        self._provider = np.empty(capacity, dtype=np.int32)
+        self._ratings = {key: np.empty(capacity, dtype=np.int8) for key in RATING_KEYS}
+        self._average = np.empty(capacity, dtype=np.float64)
+        self._timestamp = np.empty(capacity, dtype=np.int64)
+        self.size = 0
+        self.skipped = 0
+        self.built_at: Optional[float] = None
+
+    @property
+    def built(self) -> bool:
+        return self.built_at is not None
+
+    def __len__(self):
+        return self.size
+
+    def mark_built(self):
+        self.built_at = time.monotonic()
+
+    def add_providers(self, providers: Iterable[Dict]):
+        for provider in providers:
+            facet = (provider['service_type'], provider['location'])
+            facet_index = self._facet_index.get(facet)
+            if facet_index is None:
+                facet_index = self._facet_index[facet] = len(self.facets)
+                self.facets.append(facet)
+            row = {key: provider.get(key) for key in ('id', 'name', 'service_type', 'location')}
+            index = self._provider_index.get(provider['id'])
+            if index is None:
+                index = self._provider_index[provider['id']] = len(self.providers)
+                self.providers.append(row)
+                if index == len(self._provider_facet):
+                    self._provider_facet = np.resize(self._provider_facet, 2 * index)
+            else:
+                self.providers[index] = row
+            self._provider_facet[index] = facet_index
+
+    def add_reviews(self, reviews: Iterable[Dict]):
+        providers, averages, timestamps = [], [], []
+        ratings = {key: [] for key in RATING_KEYS}
+        for review in reviews:
+            index = self._provider_index.get(review['provider_id'])
+            if index is None:
+                self.skipped += 1
+                continue
+            providers.append(index)
+            averages.append(review_average(review['ratings']))
+            timestamps.append(epoch_seconds(review.get('timestamp')))
+            for key in RATING_KEYS:
+                ratings[key].append(review['ratings'].get(key, 0))
+        if not providers:
+            return
+        start, end = self.size, self.size + len(providers)
+        self._reserve(end)
+        self._provider[start:end] = providers
+        self._average[start:end] = averages
+        self._timestamp[start:end] = timestamps
+        for key in RATING_KEYS:
+            self._ratings[key][start:end] = ratings[key]
+        self.size = end
+
+    def _reserve(self, size: int):
+        capacity = len(self._provider)
+        if size <= capacity:
+            return
+        while capacity < size:
+            capacity *= 2
+        self._provider = np.resize(self._provider, capacity)
+        self._average = np.resize(self._average, capacity)
+        self._timestamp = np.resize(self._timestamp, capacity)
+        self._ratings = {key: np.resize(column, capacity) for key, column in self._ratings.items()}
+
+    def analytics(self, service_type: Optional[str] = None, location: Optional[str] = None,
+                  since: Optional[int] = None, top: int = 10, max_facets: int = 20) -> Dict:
+        """Leaderboards, percentiles and histograms over the matching reviews.
+
+        Leaderboards rank providers by the same Bayesian score as search,
+        computed from the matching reviews only (so ``since`` ranks recent
+        form), for the max_facets facets with the most matching reviews.
+        """
+        n = self.size
+        provider_facet = self._provider_facet[:len(self.providers)]
+        mask = None
+        if service_type or location:
+            facet_matches = np.array([
+                (not service_type or facet[0] == service_type) and (not location or facet[1] == location)
+                for facet in self.facets
+            ], dtype=bool)
+            mask = facet_matches[provider_facet][self._provider[:n]]
+        if since is not None:
+            recent = self._timestamp[:n] >= since
+            mask = recent if mask is None else mask & recent
+
+        def column(values):
+            return values[:n] if mask is None else values[:n][mask]
+
+        provider = column(self._provider)
+        ratings = {key: column(self._ratings[key]) for key in RATING_KEYS}
+
+        # Per-dimension distributions; 0 means not rated and is left out. Five
+        # comparisons on int8 beat bincount, which first widens to int64
+        dimensions = {}
+        for key, values in ratings.items():
+            histogram = np.array([np.count_nonzero(values == stars) for stars in range(1, 6)])
+            dimensions[key] = self._distribution(histogram)
+
+        counts = np.bincount(provider, minlength=len(self.providers))
+        sums = np.bincount(provider, weights=column(self._average), minlength=len(self.providers))
+        scores = (SCORE_PRIOR_MEAN * SCORE_PRIOR_REVIEWS + sums) / (SCORE_PRIOR_REVIEWS + counts)
+
+        return {
+            'reviews': int(len(provider)),
+            'providers': int(np.count_nonzero(counts)),
+            'dimensions': dimensions,
+            'leaderboards': self._leaderboards(provider_facet, counts, sums, scores, top, max_facets)
+        }
+
+    @staticmethod
+    def _distribution(histogram) -> Dict:
+        """Mean, nearest-rank percentiles and counts of 1-5 ratings from their histogram."""
+        total = int(histogram.sum())
+        if not total:
+            return {'count': 0, 'mean': None, 'percentiles': {}, 'histogram': {}}
+        cumulative = np.cumsum(histogram)
+        return {
+            'count': total,
+            'mean': round(float((histogram * np.arange(1, 6)).sum()) / total, 3),
+            'percentiles': {
+                f"p{p}": int(np.searchsorted(cumulative, math.ceil(p / 100 * total))) + 1 for p in PERCENTILES
+            },
+            'histogram': {str(stars): int(count) for stars, count in enumerate(histogram, 1)}
+        }
+
+    def _leaderboards(self, provider_facet, counts, sums, scores, top: int, max_facets: int) -> List[Dict]:
+        reviewed = np.flatnonzero(counts)
+        if not len(reviewed):
+            return []
+        facet = provider_facet[reviewed]
+        facet_reviews = np.bincount(facet, weights=counts[reviewed], minlength=len(self.facets))
+        busiest = np.argsort(-facet_reviews, kind='stable')[:max_facets]
+        busiest = busiest[facet_reviews[busiest] > 0]
+
+        # Sort by facet, then score descending, and keep the first `top` of each facet
+        order = np.lexsort((reviewed, -scores[reviewed], facet))
+        ranked, ranked_facet = reviewed[order], facet[order]
+        starts = np.flatnonzero(np.r_[True, ranked_facet[1:] != ranked_facet[:-1]])
+        rank = np.arange(len(ranked)) - np.repeat(starts, np.diff(np.r_[starts, len(ranked)]))
+        leaders: Dict[int, List[Dict]] = {}
+        for index in ranked[rank < top]:
+            leaders.setdefault(int(provider_facet[index]), []).append({
+                **self.providers[index],
+                'reviews': int(counts[index]),
+                'avg_rating': round(float(sums[index] / counts[index]), 2),
+                'score': round(float(scores[index]), 4)
+            })
+        return [{
+            'service_type': self.facets[facet_index][0],
+            'location': self.facets[facet_index][1],
+            'reviews': int(facet_reviews[facet_index]),
+            'providers': leaders[int(facet_index)]
+        } for facet_index in busiest]
@@ -1,103 +1,282 @@
-from supabase import create_client
-import random
+import argparse
+import asyncio
+import csv
+import json
 import os
+import random
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
 from dotenv import load_dotenv
 
+from db import create_database
+from stats import aggregate_reviews, provider_stats
+
 load_dotenv()
 
-# Supabase setup
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_ANON_KEY")
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+# Storage backend (created on first use so file output works without credentials)
+db = None
+
+def get_db():
+    global db
+    if db is None:
+        db = create_database()
+    return db
+
+# Sample review texts by service type
+REVIEW_TEMPLATES = {
+    'electrician': [
+        "Very punctual and skilled electrician. Fixed all wiring issues perfectly!",
+        "Great work! Professional behavior and reasonable pricing.",
+        "Came on time, very polite, and excellent quality work.",
+        "Skilled electrician but slightly expensive. Worth it for the quality.",
+        "Amazing service! Cleaned up after work and explained everything."
+    ],
+    'plumber': [
+        "Excellent plumber! Fixed the leak permanently and fair pricing.",
+        "Very skilled and punctual. Highly recommend for any plumbing work.",
+        "Good work but could improve on cleanliness after completing job.",
+        "Professional service and polite behavior. Will call again.",
+        "Quick and efficient work. Solved the problem in no time."
+    ],
+    'cleaning': [
+        "Best cleaning service! Very thorough and trustworthy.",
+        "Always punctual and does amazing work. House looks brand new!",
+        "Good cleaning but sometimes rushes. Overall satisfied with service.",
+        "Excellent work and very reasonable pricing. Highly recommended!",
+        "Professional and reliable. Uses good quality cleaning supplies."
+    ]
+}
+
+DEFAULT_CITIES = ['mumbai', 'delhi', 'bangalore', 'hyderabad', 'chennai', 'kolkata', 'pune', 'ahmedabad']
+DEFAULT_SERVICE_TYPES = ['electrician', 'plumber', 'cleaning', 'carpenter', 'painter', 'ac repair']
+FIRST_NAMES = ['Rajesh', 'Amit', 'Suresh', 'Kiran', 'Deepak', 'Manoj', 'Kavita', 'Sunita', 'Geeta',
+               'Ravi', 'Anil', 'Pooja', 'Neha', 'Vijay', 'Sanjay', 'Priya', 'Arjun', 'Meena']
+LAST_NAMES = ['Kumar', 'Sharma', 'Yadav', 'Singh', 'Gupta', 'Tiwari', 'Devi', 'Kumari',
+              'Patel', 'Reddy', 'Nair', 'Iyer', 'Das', 'Joshi', 'Mehta', 'Khan']
 
-def seed_data():
+def seed_data(seed: int = 42):
     """Add dummy data to database."""
-    
+    rng = random.Random(seed)
+
     # Sample providers data
     providers = [
         # Electricians in Mumbai
         {'name': 'Rajesh Kumar', 'service_type': 'electrician', 'location': 'mumbai', 'phone_number': '+919876543210'},
         {'name': 'Amit Sharma', 'service_type': 'electrician', 'location': 'mumbai', 'phone_number': '+919876543211'},
         {'name': 'Suresh Yadav', 'service_type': 'electrician', 'location': 'mumbai', 'phone_number': '+919876543212'},
-        
-        # Plumbers in Mumbai  
+
+        # Plumbers in Mumbai
         {'name': 'Kiran Singh', 'service_type': 'plumber', 'location': 'mumbai', 'phone_number': '+919876543213'},
         {'name': 'Deepak Gupta', 'service_type': 'plumber', 'location': 'mumbai', 'phone_number': '+919876543214'},
         {'name': 'Manoj Tiwari', 'service_type': 'plumber', 'location': 'mumbai', 'phone_number': '+919876543215'},
-        
+
         # Cleaning services in Mumbai
         {'name': 'Kavita Devi', 'service_type': 'cleaning', 'location': 'mumbai', 'phone_number': '+919876543216'},
         {'name': 'Sunita Kumari', 'service_type': 'cleaning', 'location': 'mumbai', 'phone_number': '+919876543217'},
         {'name': 'Geeta Sharma', 'service_type': 'cleaning', 'location': 'mumbai', 'phone_number': '+919876543218'},
     ]
-    
+
     # Insert providers and create reviews
     for provider_data in providers:
         print(f"Creating provider: {provider_data['name']}")
-        
+
         # Insert provider
-        result = supabase.table('providers').insert(provider_data).execute()
-        provider_id = result.data[0]['id']
-        
+        provider_id = asyncio.run(get_db().insert_provider(provider_data))['id']
+
         # Create sample reviews
-        create_reviews(provider_id, provider_data['service_type'])
-    
+        create_reviews(provider_id, provider_data['service_type'], rng)
+
     print("✅ All dummy data created successfully!")
 
-def create_reviews(provider_id, service_type):
+def create_reviews(provider_id, service_type, rng=random):
     """Create sample reviews for a provider."""
-    
-    # Sample review texts by service type
-    review_templates = {
-        'electrician': [
-            "Very punctual and skilled electrician. Fixed all wiring issues perfectly!",
-            "Great work! Professional behavior and reasonable pricing.",
-            "Came on time, very polite, and excellent quality work.",
-            "Skilled electrician but slightly expensive. Worth it for the quality.",
-            "Amazing service! Cleaned up after work and explained everything."
-        ],
-        'plumber': [
-            "Excellent plumber! Fixed the leak permanently and fair pricing.",
-            "Very skilled and punctual. Highly recommend for any plumbing work.",
-            "Good work but could improve on cleanliness after completing job.",
-            "Professional service and polite behavior. Will call again.",
-            "Quick and efficient work. Solved the problem in no time."
-        ],
-        'cleaning': [
-            "Best cleaning service! Very thorough and trustworthy.",
-            "Always punctual and does amazing work. House looks brand new!",
-            "Good cleaning but sometimes rushes. Overall satisfied with service.",
-            "Excellent work and very reasonable pricing. Highly recommended!",
-            "Professional and reliable. Uses good quality cleaning supplies."
-        ]
-    }
-    
+
     # Sample reviewer phone numbers
     sample_phones = [
         '+919123456789', '+919123456790', '+919123456791',
         '+919123456792', '+919123456793', '+919123456794',
         '+919123456795', '+919123456796', '+919123456797'
     ]
-    
-    templates = review_templates.get(service_type, review_templates['electrician'])
-    
+
+    templates = REVIEW_TEMPLATES.get(service_type, REVIEW_TEMPLATES['electrician'])
+
     # Create 8-12 reviews per provider
-    num_reviews = random.randint(8, 12)
-    
+    num_reviews = rng.randint(8, 12)
+
+    reviews = []
     for i in range(num_reviews):
-        review_data = {
+        reviews.append({
             'provider_id': provider_id,
-            'reviewer_phone': random.choice(sample_phones),
+            'reviewer_phone': rng.choice(sample_phones),
             'ratings': {
-                'punctuality': random.randint(3, 5),
-                'skill_quality': random.randint(4, 5),
-                'politeness': random.randint(3, 5),
-                'pricing': random.randint(3, 5)
+                'punctuality': rng.randint(3, 5),
+                'skill_quality': rng.randint(4, 5),
+                'politeness': rng.randint(3, 5),
+                'pricing': rng.randint(3, 5)
             },
-            'review_text': random.choice(templates)
+            'review_text': rng.choice(templates)
+        })
+
+    # One insert for all reviews, then store the provider's aggregates
+    asyncio.run(get_db().insert_reviews(reviews))
+    asyncio.run(get_db().update_provider(provider_id, provider_stats(aggregate_reviews(reviews))))
+
+def _weighted_index(rng, size: int, skew: float) -> int:
+    """Pick an index in [0, size) with low indices favoured (power-law skew)."""
+    return min(size - 1, int(size * rng.random() ** skew))
+
+def _rating(rng, quality: float) -> int:
+    return max(1, min(5, round(3.6 + quality + rng.gauss(0, 0.9))))
+
+def generate(providers: int, avg_reviews: float = 20, reviewers: int = 0,
+             cities=DEFAULT_CITIES, service_types=DEFAULT_SERVICE_TYPES,
+             days: int = 730, seed: int = 42):
+    """Yield (provider, reviews) pairs of deterministic synthetic data.
+
+    The same arguments always produce the same rows. Cities and service
+    types are skewed towards the front of their lists, review counts per
+    provider follow a Pareto distribution (a few very popular providers)
+    and reviewers are drawn with a power-law skew so heavy reviewers
+    review many providers.
+    """
+    rng = random.Random(seed)
+    reviewers = reviewers or max(100, int(providers * avg_reviews / 5))
+    end = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    span = days * 86400
+    alpha = 2.0  # Pareto shape; mean of paretovariate(2) is 2
+
+    for n in range(providers):
+        service_type = service_types[_weighted_index(rng, len(service_types), 1.5)]
+        provider = {
+            'id': str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+            'name': f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+            'service_type': service_type,
+            'location': cities[_weighted_index(rng, len(cities), 1.8)],
+            'phone_number': f"+91{9000000000 + n % 1000000000}"
         }
-        
-        supabase.table('reviews').insert(review_data).execute()
+
+        quality = rng.gauss(0, 0.7)
+        count = min(int(avg_reviews * 50), int(avg_reviews * rng.paretovariate(alpha) / 2))
+        templates = REVIEW_TEMPLATES.get(service_type, REVIEW_TEMPLATES['electrician'])
+        reviews = []
+        for _ in range(count):
+            reviews.append({
+                'id': str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+                'provider_id': provider['id'],
+                'reviewer_phone': f"+91{8000000000 + _weighted_index(rng, reviewers, 2.5)}",
+                'ratings': {
+                    'punctuality': _rating(rng, quality),
+                    'skill_quality': _rating(rng, quality),
+                    'politeness': _rating(rng, quality),
+                    'pricing': _rating(rng, quality)
+                },
+                'review_text': rng.choice(templates),
+                'timestamp': (end - timedelta(seconds=rng.randrange(span))).isoformat()
+            })
+
+        provider.update(provider_stats(aggregate_reviews(reviews)))
+        yield provider, reviews
+
+class FileSink:
+    """Writes providers and reviews as NDJSON or CSV files for offline loading."""
+
+    def __init__(self, directory: str, fmt: str):
+        os.makedirs(directory, exist_ok=True)
+        self.fmt = fmt
+        self.files = {}
+        self.writers = {}
+        for table in ('providers', 'reviews'):
+            self.files[table] = open(os.path.join(directory, f"{table}.{fmt}"), 'w', newline='')
+
+    def write(self, table: str, rows):
+        out = self.files[table]
+        if self.fmt == 'ndjson':
+            out.writelines(json.dumps(row) + '\n' for row in rows)
+            return
+        writer = self.writers.get(table)
+        for row in rows:
+            if writer is None:
+                writer = self.writers[table] = csv.DictWriter(out, fieldnames=list(row))
+                writer.writeheader()
+            writer.writerow({k: json.dumps(v) if isinstance(v, dict) else v for k, v in row.items()})
+
+    def close(self):
+        for out in self.files.values():
+            out.close()
+
+class DatabaseSink:
+    """Bulk-inserts rows into the configured database in batches, timing the load."""
+
+    def __init__(self, batch_size: int):
+        self.batch_size = batch_size
+        self.load_seconds = 0.0
+
+    def write(self, table: str, rows):
+        start = time.perf_counter()
+        insert = get_db().upsert_providers if table == 'providers' else get_db().insert_reviews
+        for i in range(0, len(rows), self.batch_size):
+            asyncio.run(insert(rows[i:i + self.batch_size]))
+        self.load_seconds += time.perf_counter() - start
+
+    def close(self):
+        pass
+
+def seed_synthetic(sink, providers: int, batch_size: int = 1000, **options):
+    """Generate synthetic data into a sink and report throughput."""
+    start = time.perf_counter()
+    provider_batch, review_batch = [], []
+    provider_total = review_total = 0
+
+    def flush():
+        # Providers first so the reviews' foreign keys resolve
+        sink.write('providers', provider_batch)
+        sink.write('reviews', review_batch)
+        provider_batch.clear()
+        review_batch.clear()
+
+    for provider, reviews in generate(providers, **options):
+        provider_batch.append(provider)
+        review_batch.extend(reviews)
+        provider_total += 1
+        review_total += len(reviews)
+        if len(review_batch) >= batch_size or len(provider_batch) >= batch_size:
+            flush()
+    flush()
+    sink.close()
+
+    elapsed = time.perf_counter() - start
+    rows = provider_total + review_total
+    load_seconds = getattr(sink, 'load_seconds', 0.0)
+    generate_seconds = elapsed - load_seconds
+    print(f"Generated {provider_total} providers and {review_total} reviews "
+          f"({rows / max(generate_seconds, 1e-9):.0f} rows/sec generation)")
+    if load_seconds:
+        print(f"Loaded {rows} rows in {load_seconds:.1f}s ({rows / load_seconds:.0f} rows/sec load)")
+    return provider_total, review_total
 
 if __name__ == "__main__":
-    seed_data()
+    parser = argparse.ArgumentParser(description="Seed demo data or generate synthetic load-test data.")
+    parser.add_argument("--providers", type=int, default=0,
+                        help="generate this many synthetic providers (default: 9 demo providers)")
+    parser.add_argument("--avg-reviews", type=float, default=20, help="mean reviews per provider")
+    parser.add_argument("--reviewers", type=int, default=0, help="size of the reviewer pool")
+    parser.add_argument("--cities", default=','.join(DEFAULT_CITIES))
+    parser.add_argument("--service-types", default=','.join(DEFAULT_SERVICE_TYPES))
+    parser.add_argument("--days", type=int, default=730, help="spread review timestamps over this many days")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--batch-size", type=int, default=1000, help="rows per bulk insert")
+    parser.add_argument("--format", choices=['db', 'ndjson', 'csv'], default='db')
+    parser.add_argument("--out", default="seed_output", help="output directory for ndjson/csv")
+    args = parser.parse_args()
+
+    if not args.providers:
+        seed_data(args.seed)
+    else:
+        sink = DatabaseSink(args.batch_size) if args.format == 'db' else FileSink(args.out, args.format)
+        seed_synthetic(
+            sink, args.providers, batch_size=args.batch_size,
+            avg_reviews=args.avg_reviews, reviewers=args.reviewers,
+            cities=args.cities.split(','), service_types=args.service_types.split(','),
+            days=args.days, seed=args.seed
+        )
@@ -1,39 +1,35 @@
-from supabase import Client
 from typing import List, Dict, Any
 import uuid
 from datetime import datetime
 
+from db import Repository
+from stats import review_delta
+
 class ServiceManager:
-    def __init__(self, supabase: Client):
-        self.supabase = supabase
+    def __init__(self, db: Repository):
+        self.db = db
     
     async def search_providers(self, service_type: str, location: str) -> List[Dict]:
         """Search for providers by service type and location."""
-        result = self.supabase.table('providers').select('*').eq(
-            'service_type', service_type.lower()
-        ).eq('location', location.lower()).order('avg_rating', desc=True).execute()
-        
-        return result.data
+        return await self.db.search_providers(service_type.lower(), location.lower())
     
     async def get_provider_summary(self, provider_id: str, user_contacts: List[str]) -> Dict:
         """Get provider summary with AI insights and contact highlights."""
         # Get provider info
-        provider = self.supabase.table('providers').select('*').eq('id', provider_id).execute()
-        if not provider.data:
+        provider = await self.db.get_provider(provider_id)
+        if not provider:
             raise Exception("Provider not found")
         
-        provider = provider.data[0]
-        
         # Get reviews
-        reviews = self.supabase.table('reviews').select('*').eq('provider_id', provider_id).execute()
+        reviews = await self.db.reviews_for_provider(provider_id)
         
         # Get AI insights
-        insights = self.supabase.table('ai_insights').select('*').eq('provider_id', provider_id).execute()
+        insights = await self.db.get_insights(provider_id) or {}
         
         # Find reviews from user contacts
         contact_reviews = []
-        if user_contacts and reviews.data:
-            for review in reviews.data:
+        if user_contacts and reviews:
+            for review in reviews:
                 if review['reviewer_phone'] in user_contacts:
                     contact_reviews.append({
                         'reviewer_name': self._get_contact_name(review['reviewer_phone'], user_contacts),
@@ -50,9 +46,9 @@ class ServiceManager:
             'rating': provider['avg_rating'],
             'total_reviews': provider['total_reviews'],
             'contact_reviews': contact_reviews,
-            'top_praise': insights.data[0]['top_praise'] if insights.data else {},
-            'concerns': insights.data[0]['top_concerns'] if insights.data else {},
-            'emerging_mentions': insights.data[0]['emerging_mentions'] if insights.data else {}
+            'top_praise': insights.get('top_praise') or {},
+            'concerns': insights.get('top_concerns') or {},
+            'emerging_mentions': insights.get('emerging_mentions') or {}
         }
         
         return summary
@@ -67,29 +63,16 @@ class ServiceManager:
         }
         
         # Insert review
-        result = self.supabase.table('reviews').insert(review_data).execute()
+        review = await self.db.insert_review(review_data)
         
         # Update provider stats
-        await self._update_provider_stats(provider_id)
+        await self._update_provider_stats(provider_id, ratings)
         
-        return result.data[0]['id']
+        return review['id']
     
-    async def _update_provider_stats(self, provider_id: str):
-        """Update provider's average rating and review count."""
-        reviews = self.supabase.table('reviews').select('ratings').eq('provider_id', provider_id).execute()
-        
-        if reviews.data:
-            total_ratings = []
-            for review in reviews.data:
-                avg_rating = sum(review['ratings'].values()) / len(review['ratings'])
-                total_ratings.append(avg_rating)
-            
-            new_avg = sum(total_ratings) / len(total_ratings)
-            
-            self.supabase.table('providers').update({
-                'avg_rating': round(new_avg, 1),
-                'total_reviews': len(reviews.data)
-            }).eq('id', provider_id).execute()
+    async def _update_provider_stats(self, provider_id: str, ratings: Dict):
+        """Apply one review to the provider's running rating aggregates."""
+        await self.db.increment_provider_stats(provider_id, review_delta(ratings))
     
     def _get_contact_name(self, phone: str, contacts: List[str]) -> str:
         """Get contact name from phone number (placeholder - would integrate with WhatsApp)."""
@@ -0,0 +1,173 @@
+"""Streaming NDJSON export and import of the providers and reviews tables.
+
+Export reads a table with keyset pagination (``Repository.scan``) and
+yields it one page of JSON lines at a time, optionally gzip-compressed as
+it goes, so memory stays at one page whatever the table size. Import reads
+lines one at a time, validates them against ``models.Provider`` and
+``models.Review`` and writes them in batches: providers are upserted on
+id, and reviews are inserted with duplicate ids ignored, since reviews
+never change once written. Import providers before reviews.
+
+    python snapshot.py export providers -o providers.ndjson.gz
+    python snapshot.py import providers providers.ndjson.gz
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import logging
+import sys
+import time
+import zlib
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Union
+
+from dotenv import load_dotenv
+from pydantic import ValidationError
+
+from db import Repository, create_database
+from models import Provider, Review
+
+logger = logging.getLogger(__name__)
+
+TABLE_MODELS = {'providers': Provider, 'reviews': Review}
+
+# Rejected rows whose errors are kept for the report
+MAX_REPORTED_ERRORS = 20
+
+
+def _finish(stats: Dict, rows: int, start: float) -> Dict:
+    seconds = time.perf_counter() - start
+    stats.update(rows=rows, seconds=round(seconds, 3), rows_per_sec=round(rows / max(seconds, 1e-9)))
+    return stats
+
+
+async def export_ndjson(db: Repository, table: str, page_size: int = 1000, compress: bool = False,
+                        stats: Optional[Dict] = None) -> AsyncIterator[bytes]:
+    """Yield a whole table as NDJSON, one chunk per keyset page; fills stats when done."""
+    if table not in TABLE_MODELS:
+        raise ValueError(f"Unknown table: {table}")
+    stats = {} if stats is None else stats
+    compressor = zlib.compressobj(wbits=31) if compress else None  # wbits=31 writes a gzip stream
+    start = time.perf_counter()
+    rows = 0
+    async for page in db.scan(table, '*', page_size):
+        chunk = ''.join(json.dumps(row, default=str) + '\n' for row in page).encode()
+        rows += len(page)
+        if compressor is not None:
+            chunk = compressor.compress(chunk)
+        if chunk:
+            yield chunk
+    if compressor is not None:
+        yield compressor.flush()
+    _finish(stats, rows, start)
+    logger.info("Exported %d %s in %.1f s (%d rows/sec)", rows, table, stats['seconds'], stats['rows_per_sec'])
+
+
+def _describe(error: Exception) -> str:
+    if isinstance(error, ValidationError):
+        return '; '.join(f"{'.'.join(map(str, e['loc'])) or 'row'}: {e['msg']}" for e in error.errors())
+    return str(error)
+
+
+def validate_row(table: str, row: Dict) -> Dict:
+    """The row with its model's fields validated and normalized; other columns are kept as they are."""
+    if table == 'reviews' and not row.get('id'):
+        raise ValueError("missing id")  # Without it a re-import would duplicate the review
+    validated = TABLE_MODELS[table].model_validate(row).model_dump(mode='json')
+    return {**row, **validated}
+
+
+async def import_ndjson(db: Repository, table: str, lines: Iterable[Union[str, bytes]],
+                        batch_size: int = 500) -> Dict:
+    """Validate NDJSON lines and write them in batches; returns counts and rows/sec.
+
+    ``rows`` counts the valid rows written; for reviews, ``duplicates``
+    counts those already in the database, which are left as they are.
+    """
+    if table not in TABLE_MODELS:
+        raise ValueError(f"Unknown table: {table}")
+    write = db.upsert_providers if table == 'providers' else db.insert_reviews
+    stats = {'rejected': 0, 'duplicates': 0, 'errors': []}
+    start = time.perf_counter()
+    rows = 0
+    batch: List[Dict] = []
+
+    async def flush():
+        written = await write(batch)
+        stats['duplicates'] += len(batch) - len(written)
+        return len(batch)
+
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            batch.append(validate_row(table, json.loads(line)))
+        except (ValueError, ValidationError) as e:  # JSONDecodeError is a ValueError
+            stats['rejected'] += 1
+            if len(stats['errors']) < MAX_REPORTED_ERRORS:
+                stats['errors'].append(f"line {number}: {_describe(e)}")
+            continue
+        if len(batch) >= batch_size:
+            rows += await flush()
+            batch = []
+    if batch:
+        rows += await flush()
+    _finish(stats, rows, start)
+    logger.info("Imported %d %s (%d already present, %d rejected) in %.1f s (%d rows/sec)",
+                rows, table, stats['duplicates'], stats['rejected'], stats['seconds'], stats['rows_per_sec'])
+    return stats
+
+
+def open_ndjson(path: str):
+    """Lines of an NDJSON file, gzip-compressed or not."""
+    with open(path, 'rb') as f:
+        compressed = f.read(2) == b'\x1f\x8b'
+    return gzip.open(path, 'rb') if compressed else open(path, 'rb')
+
+
+async def export_file(db: Repository, table: str, path: str, page_size: int, compress: bool) -> Dict:
+    stats = {}
+    out = sys.stdout.buffer if path == '-' else open(path, 'wb')
+    try:
+        async for chunk in export_ndjson(db, table, page_size, compress, stats):
+            out.write(chunk)
+    finally:
+        if out is not sys.stdout.buffer:
+            out.close()
+    return stats
+
+
+async def import_file(db: Repository, table: str, path: str, batch_size: int) -> Dict:
+    with open_ndjson(path) as lines:
+        return await import_ndjson(db, table, lines, batch_size)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export or import providers and reviews as NDJSON.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export_parser = commands.add_parser("export", help="write a table as NDJSON")
+    export_parser.add_argument("table", choices=list(TABLE_MODELS))
+    export_parser.add_argument("-o", "--output", default="-", help="file to write, - for stdout")
+    export_parser.add_argument("--gzip", action="store_true", help="compress (default for .gz outputs)")
+    export_parser.add_argument("--page-size", type=int, default=1000, help="rows per keyset page")
+    import_parser = commands.add_parser("import", help="validate and write an NDJSON file (.gz or not)")
+    import_parser.add_argument("table", choices=list(TABLE_MODELS))
+    import_parser.add_argument("input")
+    import_parser.add_argument("--batch-size", type=int, default=500, help="rows per upsert")
+    args = parser.parse_args()
+
+    load_dotenv()
+    db = create_database()
+    if args.command == "export":
+        stats = asyncio.run(export_file(
+            db, args.table, args.output, args.page_size, args.gzip or args.output.endswith('.gz')
+        ))
+        print(f"Exported {stats['rows']} {args.table} in {stats['seconds']:.1f}s "
+              f"({stats['rows_per_sec']} rows/sec)", file=sys.stderr)
+    else:
+        stats = asyncio.run(import_file(db, args.table, args.input, args.batch_size))
+        for error in stats['errors']:
+            print(f"Rejected {error}", file=sys.stderr)
+        print(f"Imported {stats['rows']} {args.table} in {stats['seconds']:.1f}s "
+              f"({stats['rows_per_sec']} rows/sec), {stats['duplicates']} already present, "
+              f"{stats['rejected']} rejected", file=sys.stderr)
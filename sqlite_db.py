@@ -0,0 +1,481 @@
+"""Embedded SQLite repository.
+
+Runs the service, scripts and benchmarks without a Supabase project, and
+doubles as a local read replica for the search paths (see
+``sync_replica``). Every pool thread gets its own connection; the
+database runs in WAL mode so reads never wait for a writer.
+"""
+import json
+import sqlite3
+import threading
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from db import Repository, newest_by_reviewers
+from stats import AGGREGATE_COLUMNS, SCORE_PRIOR_MEAN, SCORE_PRIOR_REVIEWS, rpc_params
+
+PROVIDER_COLUMNS = ['id', 'name', 'service_type', 'location', 'phone_number', 'latitude', 'longitude',
+                    'avg_rating', 'score'] + AGGREGATE_COLUMNS + ['updated_at']
+REVIEW_COLUMNS = ['id', 'provider_id', 'reviewer_phone', 'ratings', 'review_text', 'timestamp',
+                  'insights_processed']
+INSIGHT_COLUMNS = ['provider_id', 'top_praise', 'top_concerns', 'emerging_mentions', 'mentions_as_of']
+TABLE_COLUMNS = {'providers': PROVIDER_COLUMNS, 'reviews': REVIEW_COLUMNS, 'ai_insights': INSIGHT_COLUMNS}
+JSON_COLUMNS = {'ratings', 'top_praise', 'top_concerns', 'emerging_mentions'}
+# The current time in the isoformat() shape the other timestamps are stored in
+NOW = "strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now')"
+
+SCHEMA = f"""
+create table if not exists providers (
+    id text primary key,
+    name text not null,
+    service_type text not null,
+    location text not null,
+    phone_number text,
+    latitude real,
+    longitude real,
+    avg_rating real not null default 0,
+    score real not null default {SCORE_PRIOR_MEAN},
+    total_reviews integer not null default 0,
+    rating_sum real not null default 0,
+    {', '.join(f'{column} integer not null default 0' for column in AGGREGATE_COLUMNS[2:])},
+    updated_at text
+);
+create index if not exists providers_search_idx
+    on providers (service_type, location, avg_rating desc);
+create index if not exists providers_score_idx
+    on providers (service_type, location, score desc, id);
+create index if not exists providers_updated_at_idx
+    on providers (updated_at, id);
+
+-- Stamp every insert and update, as migration 008's trigger does, unless the
+-- writer sets updated_at itself (a replica copying the source's value)
+create trigger if not exists providers_inserted after insert on providers
+when new.updated_at is null
+begin
+    update providers set updated_at = {NOW} where id = new.id;
+end;
+create trigger if not exists providers_updated after update on providers
+when new.updated_at is old.updated_at
+begin
+    update providers set updated_at = {NOW} where id = new.id;
+end;
+
+create table if not exists reviews (
+    id text primary key,
+    provider_id text not null references providers (id),
+    reviewer_phone text not null,
+    ratings text not null,
+    review_text text,
+    timestamp text not null,
+    insights_processed integer not null default 0
+);
+create index if not exists reviews_provider_timestamp_idx
+    on reviews (provider_id, timestamp desc, id desc);
+create index if not exists reviews_provider_reviewer_idx
+    on reviews (provider_id, reviewer_phone);
+create index if not exists reviews_timestamp_idx
+    on reviews (timestamp, id);
+
+create table if not exists ai_insights (
+    provider_id text primary key references providers (id),
+    top_praise text,
+    top_concerns text,
+    emerging_mentions text,
+    mentions_as_of text
+);
+create index if not exists reviews_insights_pending_idx
+    on reviews (timestamp, id) where insights_processed = 0;
+"""
+
+# Columns added after the first release, per table: (name, definition, backfill statement)
+ADDED_COLUMNS = {
+    'providers': [
+        ('score', f"real not null default {SCORE_PRIOR_MEAN}",
+         f"update providers set score = round(({SCORE_PRIOR_MEAN * SCORE_PRIOR_REVIEWS} + rating_sum) / "
+         f"({SCORE_PRIOR_REVIEWS} + total_reviews), 4)"),  # As migration 005
+        ('latitude', "real", None),
+        ('longitude', "real", None),
+        ('updated_at', "text", f"update providers set updated_at = {NOW}"),  # As migration 008
+    ],
+    'ai_insights': [
+        ('mentions_as_of', "text", None),  # As migration 007
+    ],
+}
+
+
+def _select(table: str, columns: str) -> str:
+    """SQL column list for a PostgREST style column string."""
+    if columns.strip() == '*':
+        return ', '.join(TABLE_COLUMNS[table])
+    names = [name.strip() for name in columns.split(',')]
+    unknown = set(names) - set(TABLE_COLUMNS[table])
+    if unknown:
+        raise ValueError(f"Unknown {table} column(s): {', '.join(sorted(unknown))}")
+    return ', '.join(names)
+
+
+def _decode(row: sqlite3.Row) -> Dict:
+    data = dict(row)
+    for column in JSON_COLUMNS.intersection(data):
+        if data[column] is not None:
+            data[column] = json.loads(data[column])
+    if 'insights_processed' in data:
+        data['insights_processed'] = bool(data['insights_processed'])
+    return data
+
+
+def _encode(table: str, row: Dict) -> Dict:
+    """Known columns of a row, JSON values serialized; unknown keys are dropped."""
+    return {
+        column: json.dumps(row[column]) if column in JSON_COLUMNS and row[column] is not None else row[column]
+        for column in TABLE_COLUMNS[table] if column in row
+    }
+
+
+class SQLiteDatabase(Repository):
+    """SQLite repository; ``path`` may be ':memory:' for a throwaway database."""
+
+    def __init__(self, path: str, max_workers: Optional[int] = None):
+        # An in-memory database only exists on its own connection
+        super().__init__(1 if path == ':memory:' else max_workers)
+        self.path = path
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        self._shared = None
+        self._shared = self._connect() if path == ':memory:' else None
+        self._migrate(self._connect())
+
+    def _migrate(self, conn: sqlite3.Connection):
+        """Create the schema, adding columns missing from databases made by older versions."""
+        for table, added in ADDED_COLUMNS.items():
+            existing = {row[1] for row in conn.execute(f"pragma table_info({table})")}
+            if existing:
+                for column, definition, backfill in added:
+                    if column not in existing:
+                        conn.execute(f"alter table {table} add column {column} {definition}")
+                        if backfill:
+                            conn.execute(backfill)
+        conn.executescript(SCHEMA)
+
+    def rejected_row_errors(self) -> tuple:
+        return (sqlite3.IntegrityError,)  # Unknown provider_id, missing not null column
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._shared is not None:
+            return self._shared
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute('pragma journal_mode=wal')
+            conn.execute('pragma synchronous=normal')
+            conn.execute('pragma foreign_keys=on')
+            self._local.conn = conn
+        return conn
+
+    def _query(self, sql: str, params=()) -> List[Dict]:
+        return [_decode(row) for row in self._connect().execute(sql, params)]
+
+    def _write(self, fn):
+        """Run fn(conn) in one transaction; writers are serialized per process."""
+        conn = self._connect()
+        with self._write_lock, conn:
+            return fn(conn)
+
+    async def scan(self, table: str, columns: str = '*', page_size: int = 1000) -> AsyncIterator[List[Dict]]:
+        key = 'provider_id' if table == 'ai_insights' else 'id'
+        sql = f"select {_select(table, columns)} from {table} where {key} > ? order by {key} limit ?"
+        last_id = ''
+        while True:
+            page = await self.run(self._query, sql, (last_id, page_size))
+            if page:
+                yield page
+            if len(page) < page_size:
+                break
+            last_id = page[-1][key]
+
+    async def scan_since(self, table: str, column: str, since: Optional[str], columns: str = '*',
+                         page_size: int = 1000) -> AsyncIterator[List[Dict]]:
+        select = f"select {_select(table, columns)} from {table}"
+        params = (since or '',)
+        where = f"{column} >= ?"
+        while True:
+            page = await self.run(
+                self._query, f"{select} where {where} order by {column}, id limit ?", (*params, page_size)
+            )
+            if page:
+                yield page
+            if len(page) < page_size:
+                break
+            params, where = (page[-1][column], page[-1]['id']), f"({column}, id) > (?, ?)"
+
+    # Providers
+    async def search_providers(self, service_type: str, location: str) -> List[Dict]:
+        return await self.run(
+            self._query,
+            f"select {_select('providers', '*')} from providers "
+            "where service_type = ? and location = ? order by avg_rating desc",
+            (service_type, location)
+        )
+
+    async def top_providers(self, service_type: str, location: str, limit: int) -> Tuple[List[Dict], int]:
+        # The window count is taken before the limit, so it is the facet's total
+        rows = await self.run(
+            self._query,
+            f"select {_select('providers', '*')}, count(*) over () as facet_total from providers "
+            "where service_type = ? and location = ? order by score desc, id limit ?",
+            (service_type, location, limit)
+        )
+        total = rows[0]['facet_total'] if rows else 0
+        for row in rows:
+            del row['facet_total']
+        return rows, total
+
+    async def top_providers_many(self, facets: List[Tuple[str, str]],
+                                 limit: int) -> Dict[Tuple[str, str], Tuple[List[Dict], int]]:
+        top = {facet: ([], 0) for facet in facets}
+        if not facets:
+            return top
+        pairs = sorted(set(facets))
+        rows = await self.run(
+            self._query,
+            f"select * from (select {_select('providers', '*')}, "
+            "row_number() over (partition by service_type, location order by score desc, id) as rank, "
+            "count(*) over (partition by service_type, location) as facet_total from providers "
+            f"where (service_type, location) in ({', '.join(['(?, ?)'] * len(pairs))})) "
+            "where rank <= ? order by service_type, location, rank",
+            [value for pair in pairs for value in pair] + [limit]
+        )
+        for row in rows:
+            del row['rank']
+            facet = (row['service_type'], row['location'])
+            top[facet][0].append(row)
+            top[facet] = (top[facet][0], row.pop('facet_total'))
+        return top
+
+    async def get_provider(self, provider_id: str, columns: str = '*') -> Optional[Dict]:
+        rows = await self.run(
+            self._query, f"select {_select('providers', columns)} from providers where id = ?", (provider_id,)
+        )
+        return rows[0] if rows else None
+
+    async def get_providers(self, provider_ids: List[str], columns: str = '*') -> List[Dict]:
+        if not provider_ids:
+            return []
+        return await self.run(
+            self._query,
+            f"select {_select('providers', columns)} from providers "
+            f"where id in ({', '.join('?' * len(provider_ids))})",
+            provider_ids
+        )
+
+    async def insert_provider(self, provider_data: Dict) -> Optional[Dict]:
+        provider = {'id': str(uuid.uuid4()), **provider_data}
+        await self.upsert_providers([provider])
+        return await self.get_provider(provider['id'])
+
+    async def upsert_providers(self, providers: List[Dict]) -> List[Dict]:
+        def write(conn):
+            for provider in providers:
+                row = _encode('providers', provider)
+                columns = ', '.join(row)
+                updates = ', '.join(f"{column} = excluded.{column}" for column in row if column != 'id')
+                conn.execute(
+                    f"insert into providers ({columns}) values ({', '.join('?' * len(row))}) "
+                    f"on conflict (id) do update set {updates}",
+                    list(row.values())
+                )
+        if not providers:
+            return []
+        await self.run(self._write, write)
+        return providers
+
+    async def update_provider(self, provider_id: str, values: Dict) -> List[Dict]:
+        row = _encode('providers', values)
+        await self.run(self._write, lambda conn: conn.execute(
+            f"update providers set {', '.join(f'{column} = ?' for column in row)} where id = ?",
+            [*row.values(), provider_id]
+        ))
+        provider = await self.get_provider(provider_id)
+        return [provider] if provider else []
+
+    async def increment_provider_stats(self, provider_id: str, delta: Dict) -> Optional[Dict]:
+        params = rpc_params(provider_id, delta)
+        assignments = ', '.join(f"{column} = {column} + :p_{column}" for column in AGGREGATE_COLUMNS)
+        await self.run(self._write, lambda conn: conn.execute(
+            f"update providers set {assignments}, avg_rating = coalesce(round("
+            "(rating_sum + :p_rating_sum) / nullif(total_reviews + :p_total_reviews, 0), 1), 0), "
+            f"score = round(({SCORE_PRIOR_MEAN * SCORE_PRIOR_REVIEWS} + rating_sum + :p_rating_sum) "
+            f"/ ({SCORE_PRIOR_REVIEWS} + total_reviews + :p_total_reviews), 4) "
+            "where id = :p_provider_id",
+            params
+        ))
+        return await self.get_provider(provider_id)
+
+    # Reviews
+    async def reviews_for_provider(self, provider_id: str, columns: str = '*') -> List[Dict]:
+        return await self.run(
+            self._query, f"select {_select('reviews', columns)} from reviews where provider_id = ?",
+            (provider_id,)
+        )
+
+    async def reviews_for_providers(self, provider_ids: List[str], columns: str = '*') -> List[Dict]:
+        if not provider_ids:
+            return []
+        return await self.run(
+            self._query,
+            f"select {_select('reviews', columns)} from reviews "
+            f"where provider_id in ({', '.join('?' * len(provider_ids))})",
+            provider_ids
+        )
+
+    async def recent_reviews(self, provider_id: str, limit: int, columns: str = '*',
+                             before: Optional[tuple] = None) -> List[Dict]:
+        sql = f"select {_select('reviews', columns)} from reviews where provider_id = ?"
+        params = [provider_id]
+        if before is not None:
+            timestamp, review_id = before
+            sql += " and (timestamp < ? or (timestamp = ? and id < ?))"
+            params += [timestamp, timestamp, review_id]
+        sql += " order by timestamp desc, id desc limit ?"
+        return await self.run(self._query, sql, params + [limit])
+
+    async def reviews_by_reviewers(self, provider_id: str, reviewer_phones: List[str], limit: int,
+                                   columns: str = '*') -> List[Dict]:
+        if not reviewer_phones:
+            return []
+        return await self.run(
+            self._query,
+            f"select {_select('reviews', columns)} from reviews where provider_id = ? "
+            f"and reviewer_phone in ({', '.join('?' * len(reviewer_phones))}) "
+            "order by timestamp desc limit ?",
+            [provider_id, *reviewer_phones, limit]
+        )
+
+    async def reviews_by_reviewers_many(self, reviewer_phones: Dict[str, List[str]], limit: Optional[int],
+                                        columns: str = '*') -> Dict[str, List[Dict]]:
+        if not reviewer_phones:
+            return {}
+        phones = sorted({phone for provider_phones in reviewer_phones.values() for phone in provider_phones})
+        rows = await self.run(
+            self._query,
+            f"select {_select('reviews', columns)} from reviews "
+            f"where provider_id in ({', '.join('?' * len(reviewer_phones))}) "
+            f"and reviewer_phone in ({', '.join('?' * len(phones))}) "
+            "order by timestamp desc",
+            [*reviewer_phones, *phones]
+        )
+        return newest_by_reviewers(rows, reviewer_phones, limit)
+
+    async def insert_reviews(self, reviews: List[Dict]) -> List[Dict]:
+        now = datetime.now(timezone.utc).isoformat()
+
+        def write(conn):
+            inserted = []
+            for review in reviews:
+                review = {'id': str(uuid.uuid4()), 'timestamp': now, 'insights_processed': False, **review}
+                row = _encode('reviews', review)
+                cursor = conn.execute(
+                    f"insert or ignore into reviews ({', '.join(row)}) values ({', '.join('?' * len(row))})",
+                    list(row.values())
+                )
+                if cursor.rowcount:
+                    inserted.append(review)
+            return inserted
+        if not reviews:
+            return []
+        return await self.run(self._write, write)
+
+    async def insert_review(self, review_data: Dict) -> Optional[Dict]:
+        inserted = await self.insert_reviews([review_data])
+        return inserted[0] if inserted else None
+
+    # AI insights
+    async def get_insights(self, provider_id: str) -> Optional[Dict]:
+        rows = await self.run(
+            self._query, f"select {_select('ai_insights', '*')} from ai_insights where provider_id = ?",
+            (provider_id,)
+        )
+        return rows[0] if rows else None
+
+    async def get_insights_many(self, provider_ids: List[str]) -> List[Dict]:
+        if not provider_ids:
+            return []
+        return await self.run(
+            self._query,
+            f"select {_select('ai_insights', '*')} from ai_insights "
+            f"where provider_id in ({', '.join('?' * len(provider_ids))})",
+            provider_ids
+        )
+
+    async def upsert_insights(self, insights: List[Dict]) -> List[Dict]:
+        def write(conn):
+            for insight in insights:
+                row = _encode('ai_insights', insight)
+                updates = ', '.join(f"{column} = excluded.{column}" for column in row if column != 'provider_id')
+                conn.execute(
+                    f"insert into ai_insights ({', '.join(row)}) values ({', '.join('?' * len(row))}) "
+                    f"on conflict (provider_id) do update set {updates}",
+                    list(row.values())
+                )
+        if not insights:
+            return []
+        await self.run(self._write, write)
+        return insights
+
+    async def pending_insight_reviews(self, limit: int, provider_id: Optional[str] = None) -> List[Dict]:
+        sql = "select id, provider_id, review_text, timestamp from reviews where insights_processed = 0"
+        params = []
+        if provider_id is not None:
+            sql += " and provider_id = ?"
+            params.append(provider_id)
+        return await self.run(self._query, sql + " order by timestamp, id limit ?", params + [limit])
+
+    async def mark_insights_processed(self, review_ids: List[str]):
+        if review_ids:
+            await self.run(self._write, lambda conn: conn.execute(
+                f"update reviews set insights_processed = 1 where id in ({', '.join('?' * len(review_ids))})",
+                review_ids
+            ))
+
+
+class ReplicaSync:
+    """Keeps a local replica in step with source, copying only what changed since the last sync.
+
+    Providers are overwritten when their updated_at moves, so their
+    aggregates are current; reviews are immutable and found by timestamp.
+    Both watermarks trail the newest value seen by ``overlap`` seconds: a
+    review's timestamp is taken when it is submitted, and a queued writer may
+    commit it a while later. The first sync copies everything.
+    """
+
+    def __init__(self, source: Repository, replica: "SQLiteDatabase", page_size: int = 1000,
+                 overlap: float = 600.0):
+        self.source = source
+        self.replica = replica
+        self.page_size = page_size
+        self.overlap = timedelta(seconds=overlap)
+        self.since: Dict[str, Optional[str]] = {'providers': None, 'reviews': None}
+
+    async def sync(self) -> Dict[str, int]:
+        copied = {'providers': 0, 'reviews': 0}
+        newest = {}
+        async for page in self.source.scan_since('providers', 'updated_at', self.since['providers'],
+                                                 '*', self.page_size):
+            await self.replica.upsert_providers(page)
+            copied['providers'] += len(page)
+            newest['providers'] = page[-1]['updated_at']
+        async for page in self.source.scan_since(
+                'reviews', 'timestamp', self.since['reviews'],
+                'id, provider_id, reviewer_phone, ratings, review_text, timestamp', self.page_size):
+            copied['reviews'] += len(await self.replica.insert_reviews(page))
+            newest['reviews'] = page[-1]['timestamp']
+        for table, value in newest.items():
+            self.since[table] = (datetime.fromisoformat(value) - self.overlap).isoformat()
+        return copied
+
+
+async def sync_replica(source: Repository, replica: SQLiteDatabase, page_size: int = 1000) -> Dict[str, int]:
+    """Copy every provider and review from source into a local replica."""
+    return await ReplicaSync(source, replica, page_size).sync()
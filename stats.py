@@ -0,0 +1,112 @@
+"""Running rating aggregates stored on each provider row.
+
+A provider keeps per-dimension sums and counts plus the sum of per-review
+averages, so a new review is applied with a constant-size delta instead of
+re-reading every review. ``aggregate_reviews`` does the full recompute and
+is only meant for repairing or verifying the stored values.
+"""
+import time
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Optional
+
+RATING_KEYS = ['punctuality', 'skill_quality', 'politeness', 'pricing']
+
+AGGREGATE_COLUMNS = ['total_reviews', 'rating_sum'] + [
+    f"{key}_{part}" for key in RATING_KEYS for part in ('sum', 'count')
+]
+
+# Ranking score is a Bayesian average: every provider starts with
+# SCORE_PRIOR_REVIEWS virtual reviews at SCORE_PRIOR_MEAN, so a single
+# 5-star review cannot outrank hundreds of 4.8s. Keep in sync with
+# migrations/005_provider_score.sql.
+SCORE_PRIOR_MEAN = 3.5
+SCORE_PRIOR_REVIEWS = 10
+
+
+def review_average(ratings: Dict[str, int]) -> float:
+    """Overall rating of a single review."""
+    return sum(ratings.values()) / len(ratings) if ratings else 0.0
+
+
+def epoch_seconds(timestamp: Optional[str]) -> int:
+    """ISO review timestamp as epoch seconds; naive times are taken as UTC, missing ones as now."""
+    if not timestamp:
+        return int(time.time())
+    parsed = datetime.fromisoformat(timestamp)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return int(parsed.timestamp())
+
+
+def empty_delta() -> Dict:
+    return {column: 0 for column in AGGREGATE_COLUMNS}
+
+
+def review_delta(ratings: Dict[str, int]) -> Dict:
+    """Aggregate change caused by one review."""
+    delta = empty_delta()
+    add_review(delta, ratings)
+    return delta
+
+
+def add_review(delta: Dict, ratings: Dict[str, int]):
+    """Fold one review's ratings into a delta in place."""
+    delta['total_reviews'] += 1
+    delta['rating_sum'] += review_average(ratings)
+    for key in RATING_KEYS:
+        if key in ratings:
+            delta[f"{key}_sum"] += ratings[key]
+            delta[f"{key}_count"] += 1
+
+
+def merge_deltas(target: Dict, delta: Dict):
+    """Add one delta into another in place."""
+    for column in AGGREGATE_COLUMNS:
+        target[column] += delta[column]
+
+
+def aggregate_reviews(reviews: Iterable[Dict]) -> Dict:
+    """Full recompute of a provider's aggregates from its reviews."""
+    delta = empty_delta()
+    for review in reviews:
+        add_review(delta, review['ratings'])
+    return delta
+
+
+def avg_rating(aggregates: Dict) -> float:
+    if not aggregates.get('total_reviews'):
+        return 0.0
+    return round(aggregates['rating_sum'] / aggregates['total_reviews'], 1)
+
+
+def score(aggregates: Dict) -> float:
+    """Confidence-weighted rating used to rank providers."""
+    return round(
+        (SCORE_PRIOR_MEAN * SCORE_PRIOR_REVIEWS + (aggregates.get('rating_sum') or 0))
+        / (SCORE_PRIOR_REVIEWS + (aggregates.get('total_reviews') or 0)), 4
+    )
+
+
+def provider_stats(aggregates: Dict) -> Dict:
+    """Provider columns to write for a set of absolute aggregates."""
+    stats = {column: aggregates[column] for column in AGGREGATE_COLUMNS}
+    stats['avg_rating'] = avg_rating(aggregates)
+    stats['score'] = score(aggregates)
+    return stats
+
+
+def dimension_averages(provider: Dict) -> Dict[str, float]:
+    """Mean rating per dimension from a provider's stored aggregates."""
+    averages = {}
+    for key in RATING_KEYS:
+        count = provider.get(f"{key}_count") or 0
+        if count:
+            averages[key] = provider[f"{key}_sum"] / count
+    return averages
+
+
+def rpc_params(provider_id: str, delta: Dict) -> Dict:
+    """Arguments for the increment_provider_stats database function."""
+    params = {'p_provider_id': provider_id}
+    params.update({f"p_{column}": delta[column] for column in AGGREGATE_COLUMNS})
+    return params
@@ -1,42 +1,141 @@
-from supabase import create_client
-import os
+import argparse
+import asyncio
+import time
+from array import array
 from dotenv import load_dotenv
 
+from db import Repository, create_database
+from stats import AGGREGATE_COLUMNS, RATING_KEYS, aggregate_reviews, provider_stats, review_average
+
 load_dotenv()
 
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_ANON_KEY")
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
-
-def update_all_provider_stats():
-    """Update stats for all providers based on their reviews."""
-    
-    # Get all providers
-    providers = supabase.table('providers').select('id').execute()
-    
-    for provider in providers.data:
+async def update_all_provider_stats(db: Repository, verify_only: bool = False):
+    """Recompute every provider's aggregates from its reviews.
+
+    /submit_review keeps the aggregates up to date incrementally; this full
+    recompute is only for repairing drift or verifying the stored values.
+    """
+
+    # Get all providers with their stored aggregates
+    providers = []
+    async for page in db.scan('providers', ', '.join(['id', 'avg_rating', 'score'] + AGGREGATE_COLUMNS)):
+        providers.extend(page)
+
+    mismatched = 0
+    for provider in providers:
         provider_id = provider['id']
-        
+
         # Get reviews for this provider
-        reviews = supabase.table('reviews').select('ratings').eq('provider_id', provider_id).execute()
-        
-        if reviews.data:
-            # Calculate average rating
-            total_ratings = []
-            for review in reviews.data:
-                avg_rating = sum(review['ratings'].values()) / len(review['ratings'])
-                total_ratings.append(avg_rating)
-            
-            new_avg = sum(total_ratings) / len(total_ratings)
-            
+        reviews = await db.reviews_for_provider(provider_id, 'ratings')
+
+        stats = provider_stats(aggregate_reviews(reviews))
+        drift = {
+            column: (provider.get(column), value) for column, value in stats.items()
+            if abs((provider.get(column) or 0) - value) > 1e-6
+        }
+        if not drift:
+            continue
+
+        mismatched += 1
+        print(f"Provider {provider_id} drifted: {drift}")
+
+        if not verify_only:
             # Update provider
-            supabase.table('providers').update({
-                'avg_rating': round(new_avg, 1),
-                'total_reviews': len(reviews.data)
-            }).eq('id', provider_id).execute()
-            
-            print(f"Updated provider {provider_id}: {round(new_avg, 1)}/5 ({len(reviews.data)} reviews)")
+            await db.update_provider(provider_id, stats)
+            print(f"Repaired provider {provider_id}: {stats['avg_rating']}/5 ({stats['total_reviews']} reviews)")
+
+    return mismatched
+
+async def iter_rows(db: Repository, table: str, columns: str, page_size: int):
+    """Stream a table in id order using keyset pagination."""
+    async for page in db.scan(table, columns, page_size):
+        for row in page:
+            yield row
+
+async def rebuild_provider_stats(db: Repository, page_size: int = 1000, workers: int = 8, dry_run: bool = False):
+    """Rebuild every provider's aggregates from a single pass over reviews.
+
+    Reviews are streamed once and folded into one compact array per
+    provider, then only the stats columns of changed providers are updated.
+    """
+    start = time.perf_counter()
+
+    # Single pass over reviews, aggregated per provider
+    column_index = {column: i for i, column in enumerate(AGGREGATE_COLUMNS)}
+    aggregates = {}
+    review_count = 0
+    async for review in iter_rows(db, 'reviews', 'id, provider_id, ratings', page_size):
+        review_count += 1
+        row = aggregates.get(review['provider_id'])
+        if row is None:
+            row = aggregates[review['provider_id']] = array('d', bytes(8 * len(AGGREGATE_COLUMNS)))
+        ratings = review['ratings']
+        row[column_index['total_reviews']] += 1
+        row[column_index['rating_sum']] += review_average(ratings)
+        for key in RATING_KEYS:
+            if key in ratings:
+                row[column_index[f"{key}_sum"]] += ratings[key]
+                row[column_index[f"{key}_count"]] += 1
+
+    read_elapsed = time.perf_counter() - start
+    print(f"Read {review_count} reviews for {len(aggregates)} providers in {read_elapsed:.1f}s "
+          f"({review_count / max(read_elapsed, 1e-9):.0f} rows/sec)")
+
+    # Diff against stored values
+    changed = []
+    provider_count = 0
+    stats_columns = ', '.join(['id', 'avg_rating', 'score'] + AGGREGATE_COLUMNS)
+    async for provider in iter_rows(db, 'providers', stats_columns, page_size):
+        provider_count += 1
+        row = aggregates.get(provider['id'])
+        totals = {
+            column: (row[i] if row else 0) if column == 'rating_sum' else int(row[i] if row else 0)
+            for i, column in enumerate(AGGREGATE_COLUMNS)
+        }
+        stats = provider_stats(totals)
+        drift = {
+            column: (provider.get(column), value) for column, value in stats.items()
+            if abs((provider.get(column) or 0) - value) > 1e-6
+        }
+        if drift:
+            if dry_run:
+                print(f"Provider {provider['id']}: {drift}")
+            changed.append((provider['id'], stats))
+
+    # Only the stats columns are written, so edits to other columns made since
+    # the scan are kept; several updates in flight
+    if not dry_run and changed:
+        in_flight = asyncio.Semaphore(workers)
+
+        async def update(provider_id, stats):
+            async with in_flight:
+                await db.update_provider(provider_id, stats)
+
+        await asyncio.gather(*(update(provider_id, stats) for provider_id, stats in changed))
+
+    elapsed = time.perf_counter() - start
+    total_rows = review_count + provider_count
+    print(f"Processed {total_rows} rows in {elapsed:.1f}s ({total_rows / max(elapsed, 1e-9):.0f} rows/sec)")
+    action = "would change" if dry_run else "changed"
+    print(f"{len(changed)} of {provider_count} provider(s) {action}")
+    return len(changed)
 
 if __name__ == "__main__":
-    update_all_provider_stats()
-    print("✅ All provider stats updated!")
+    parser = argparse.ArgumentParser(description="Repair or verify provider rating aggregates.")
+    parser.add_argument("--verify", action="store_true", help="only report drifted providers")
+    parser.add_argument("--rebuild", action="store_true",
+                        help="single-pass rebuild over the whole reviews table")
+    parser.add_argument("--dry-run", action="store_true", help="with --rebuild, only print the diff")
+    parser.add_argument("--page-size", type=int, default=1000, help="rows per keyset page")
+    parser.add_argument("--workers", type=int, default=8, help="concurrent provider updates")
+    args = parser.parse_args()
+
+    db = create_database()
+    if args.rebuild:
+        asyncio.run(rebuild_provider_stats(db, args.page_size, args.workers, args.dry_run))
+    else:
+        mismatched = asyncio.run(update_all_provider_stats(db, verify_only=args.verify))
+        if args.verify:
+            print(f"{mismatched} provider(s) with drifted stats")
+        else:
+            print(f"✅ All provider stats updated! ({mismatched} repaired)")
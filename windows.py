@@ -0,0 +1,148 @@
+"""Rolling-window and time-decayed rating aggregates per provider."""
+import math
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from stats import SCORE_PRIOR_MEAN, SCORE_PRIOR_REVIEWS, epoch_seconds, review_average
+
+DAY_SECONDS = 86400
+
+# Search rankings other than the stored all-time score
+RANKINGS = ('30d', '90d', 'decayed')
+
+
+def bayesian_score(count: float, rating_sum: float) -> float:
+    """Same prior as stats.score, so window scores are comparable to the all-time one."""
+    return (SCORE_PRIOR_MEAN * SCORE_PRIOR_REVIEWS + rating_sum) / (SCORE_PRIOR_REVIEWS + count)
+
+
+class RecentRatings:
+    """Review counts and rating sums per provider over the last 30 and 90
+    days, plus an exponentially decayed average.
+
+    Reviews are bucketed by UTC day. Each window keeps running totals per
+    provider, so a new review is O(1) per window. When the day changes,
+    ``expire`` subtracts only the day buckets that just left a window, so
+    no review is ever read twice. The decayed totals of a provider are
+    kept as of its latest review and decayed to the current time when
+    read.
+    """
+
+    def __init__(self, windows_days: Tuple[int, ...] = (30, 90), half_life_days: float = 30.0):
+        self.windows_days = tuple(sorted(windows_days))
+        self.half_life_days = half_life_days
+        self._decay_rate = math.log(2) / (half_life_days * DAY_SECONDS)
+        self._reset()
+        self.built_at: Optional[float] = None
+
+    def _reset(self):
+        self._today = int(time.time() // DAY_SECONDS)
+        # day -> provider -> [reviews, rating sum], for the days still in the longest window
+        self._buckets: Dict[int, Dict[str, List[float]]] = {}
+        # window days -> provider -> [reviews, rating sum]
+        self._totals: Dict[int, Dict[str, List[float]]] = {days: {} for days in self.windows_days}
+        # provider -> [decayed reviews, decayed rating sum, as of epoch seconds]
+        self._decayed: Dict[str, List[float]] = {}
+
+    @property
+    def built(self) -> bool:
+        return self.built_at is not None
+
+    def __len__(self):
+        return len(self._decayed)
+
+    def build(self, reviews: Iterable[Dict]):
+        """Replace the aggregates with the given (provider_id, ratings, timestamp) rows."""
+        self._reset()
+        for review in reviews:
+            self.add_review(review)
+        self.mark_built()
+
+    def mark_built(self):
+        self.built_at = time.monotonic()
+
+    def add_review(self, review: Dict):
+        self.add(review['provider_id'], review_average(review['ratings']), epoch_seconds(review.get('timestamp')))
+
+    def add(self, provider_id: str, rating: float, at: float):
+        self.expire()
+        # Reviews stamped in the future (clock skew) count as today
+        age_days = max(0, self._today - int(at // DAY_SECONDS))
+        if age_days < self.windows_days[-1]:
+            bucket = self._buckets.setdefault(self._today - age_days, {}).setdefault(provider_id, [0, 0.0])
+            bucket[0] += 1
+            bucket[1] += rating
+            for days in self.windows_days:
+                if age_days < days:
+                    totals = self._totals[days].setdefault(provider_id, [0, 0.0])
+                    totals[0] += 1
+                    totals[1] += rating
+
+        decayed = self._decayed.get(provider_id)
+        if decayed is None:
+            self._decayed[provider_id] = [1.0, rating, at]
+        elif at >= decayed[2]:
+            factor = math.exp(-self._decay_rate * (at - decayed[2]))
+            decayed[:] = [decayed[0] * factor + 1.0, decayed[1] * factor + rating, at]
+        else:
+            weight = math.exp(-self._decay_rate * (decayed[2] - at))
+            decayed[0] += weight
+            decayed[1] += rating * weight
+
+    def expire(self, now: Optional[float] = None):
+        """Move the windows to the current day, dropping the buckets that fell out of them."""
+        today = int((time.time() if now is None else now) // DAY_SECONDS)
+        if today <= self._today:
+            return
+        previous, self._today = self._today, today
+        for days in self.windows_days:
+            totals = self._totals[days]
+            # Buckets in the window on the previous day but not any more
+            for day in [day for day in self._buckets if previous - days < day <= today - days]:
+                for provider_id, (count, rating_sum) in self._buckets[day].items():
+                    remaining = totals[provider_id]
+                    remaining[0] -= count
+                    remaining[1] -= rating_sum
+                    if remaining[0] <= 0:
+                        del totals[provider_id]
+        for day in [day for day in self._buckets if today - day >= self.windows_days[-1]]:
+            del self._buckets[day]
+
+    def window(self, provider_id: str, days: int) -> Tuple[int, float]:
+        """(reviews, rating sum) of the provider in the last `days` days."""
+        self.expire()
+        count, rating_sum = self._totals[days].get(provider_id, (0, 0.0))
+        return int(count), rating_sum
+
+    def decayed(self, provider_id: str, now: Optional[float] = None) -> Tuple[float, float]:
+        """(decayed review weight, decayed rating sum) of the provider as of now."""
+        entry = self._decayed.get(provider_id)
+        if entry is None:
+            return 0.0, 0.0
+        factor = math.exp(-self._decay_rate * max(0.0, (time.time() if now is None else now) - entry[2]))
+        return entry[0] * factor, entry[1] * factor
+
+    def score(self, provider_id: str, ranking: str) -> float:
+        """Ranking score of the provider: '30d', '90d' or 'decayed'."""
+        if ranking == 'decayed':
+            return bayesian_score(*self.decayed(provider_id))
+        return bayesian_score(*self.window(provider_id, int(ranking.rstrip('d'))))
+
+    def stats(self, provider_id: str) -> Dict:
+        """Recent form of a provider for the provider details response."""
+        stats = {}
+        for days in self.windows_days:
+            count, rating_sum = self.window(provider_id, days)
+            stats[f"{days}d"] = {
+                'reviews': count,
+                'avg_rating': round(rating_sum / count, 1) if count else None,
+                'score': round(bayesian_score(count, rating_sum), 4)
+            }
+        weight, rating_sum = self.decayed(provider_id)
+        stats['decayed'] = {
+            'half_life_days': self.half_life_days,
+            'weight': round(weight, 2),
+            'avg_rating': round(rating_sum / weight, 1) if weight else None,
+            'score': round(bayesian_score(weight, rating_sum), 4)
+        }
+        return stats